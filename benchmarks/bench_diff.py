@@ -0,0 +1,122 @@
+"""
+Times the word-level edit diff in bot/diff.py on long messages for several
+kinds of edit, against running difflib over every word of both versions,
+and shows how many embed characters the rendered diff takes compared with
+the full before and after text.
+
+Results are printed as JSON (and written with --output).
+
+Usage: python -m benchmarks.bench_diff [--length CHARS] [--count N] [--output FILE]
+"""
+
+import argparse
+import json
+import platform
+import random
+import time
+from difflib import SequenceMatcher
+
+from bot.diff import TOKEN_PATTERN, diff_words, render_diff
+
+WORDS = (
+    "the quick brown fox jumps over lazy dog lorem ipsum dolor sit amet server "
+    "message channel role voice raid spam hello world pog lol gg tomorrow meeting "
+    "everyone please remember update patch notes release"
+).split()
+
+def make_text(rng, length):
+    words = []
+    size = 0
+    while size < length:
+        word = rng.choice(WORDS)
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)
+
+def typo(word):
+    return word[:-1] if len(word) > 2 else word + word[-1]
+
+def append(rng, text):
+    return text + " " + make_text(rng, 40)
+
+def fix_typo(rng, text):
+    words = text.split(" ")
+    index = rng.randrange(len(words))
+    words[index] = typo(words[index])
+    return " ".join(words)
+
+def scattered(rng, text):
+    words = text.split(" ")
+    for index in rng.sample(range(len(words)), 5):
+        words[index] = rng.choice(WORDS)
+    return " ".join(words)
+
+def rewrite(rng, text):
+    words = text.split(" ")
+    for index in range(len(words)):
+        if rng.random() < 0.5:
+            words[index] = rng.choice(WORDS)
+    return " ".join(words)
+
+EDITS = {
+    "append": append,
+    "typo": fix_typo,
+    "scattered": scattered,
+    "rewrite": rewrite
+}
+
+def baseline(before, after):
+    # Every word of both versions through difflib, no trimming.
+    matcher = SequenceMatcher(None, TOKEN_PATTERN.findall(before), TOKEN_PATTERN.findall(after), autojunk=False)
+    return matcher.get_opcodes()
+
+def time_calls(function, pairs):
+    start = time.perf_counter()
+    for before, after in pairs:
+        function(before, after)
+    return (time.perf_counter() - start) / len(pairs) * 1e6
+
+def run_edit(name, args):
+    rng = random.Random(args.seed)
+    pairs = []
+    for _ in range(args.count):
+        before = make_text(rng, args.length)
+        pairs.append((before, EDITS[name](rng, before)))
+    
+    rendered = [render_diff(diff_words(before, after)) for before, after in pairs]
+    full = [min(len(before), 1024) + min(len(after), 1024) for before, after in pairs]
+    
+    return {
+        "diff_us": round(time_calls(diff_words, pairs), 1),
+        "diff_and_render_us": round(time_calls(lambda a, b: render_diff(diff_words(a, b)), pairs), 1),
+        "difflib_all_words_us": round(time_calls(baseline, pairs), 1),
+        "rendered_chars": round(sum(len(text) for text in rendered) / len(rendered)),
+        "before_after_chars": round(sum(full) / len(full)),
+        "over_field_limit": sum(1 for text in rendered if len(text) > 1024)
+    }
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the message edit diff")
+    parser.add_argument("--length", type=int, default=2000, help="characters per message")
+    parser.add_argument("--count", type=int, default=500, help="edits per kind")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    results = {
+        "python": platform.python_version(),
+        "settings": {"length": args.length, "count": args.count},
+        "edits": {name: run_edit(name, args) for name in EDITS}
+    }
+    
+    output = json.dumps(results, indent=2)
+    print(output)
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + "\n")
+
+if __name__ == "__main__":
+    main()
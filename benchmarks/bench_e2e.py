@@ -0,0 +1,158 @@
+"""
+End-to-end load test: runs an unmodified DiscordBot against the local mock
+gateway and REST server in benchmarks/mock_discord.py, dispatches events at
+a fixed rate across many fake guilds, and measures what the bot sent back:
+throughput, 429s and the delay from dispatch to the log embed arriving.
+
+Results are printed as JSON (and written with --output).
+
+Usage: python -m benchmarks.bench_e2e [--guilds N] [--rate EVENTS_PER_S]
+       [--duration S] [--skew ALPHA] [--rate-limit N/S|none] [--delivery channel|webhook]
+       [--output FILE]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import tempfile
+import time
+
+from benchmarks.mock_discord import MockDiscord, use_mock_discord
+from bot.core import DiscordBot
+from bot.metrics import SEND_FAILURES
+
+LOG_TYPES = ('messages', 'edits', 'deletions', 'joins', 'leaves', 'roles', 'voice')
+
+def percentile(values, quantile):
+    if not values:
+        return None
+    return values[min(int(quantile * len(values)), len(values) - 1)]
+
+def write_guild_configs(mock, config_dir, delivery):
+    os.makedirs(config_dir, exist_ok=True)
+    
+    for guild in mock.guilds:
+        config = {
+            "prefix": "!",
+            "logging_enabled": True,
+            "log_delivery": delivery,
+            "log_channels": {log_type: int(guild["log_channel"]["id"]) for log_type in LOG_TYPES}
+        }
+        with open(os.path.join(config_dir, f"{guild['id']}.json"), 'w') as f:
+            json.dump(config, f)
+
+async def wait_for_quiet(mock, quiet_period, timeout):
+    # The bot is done once nothing new has arrived for quiet_period.
+    deadline = time.perf_counter() + timeout
+    count = len(mock.received)
+    quiet_since = time.perf_counter()
+    
+    while time.perf_counter() < deadline:
+        await asyncio.sleep(0.25)
+        if len(mock.received) != count:
+            count = len(mock.received)
+            quiet_since = time.perf_counter()
+        elif time.perf_counter() - quiet_since >= quiet_period:
+            break
+
+def summarize(mock, args, elapsed, failed, dead_lettered):
+    delays = sorted(delay for _, _, delay in mock.received if delay is not None)
+    channels = {}
+    for channel_id, _, _ in mock.received:
+        channels[channel_id] = channels.get(channel_id, 0) + 1
+    
+    return {
+        "python": platform.python_version(),
+        "settings": {
+            "guilds": args.guilds,
+            "rate": args.rate,
+            "duration_s": args.duration,
+            "skew": args.skew,
+            "rate_limit": args.rate_limit,
+            "delivery": args.delivery
+        },
+        "dispatched": mock.dispatched,
+        "embeds_received": len(mock.received),
+        "rate_limited": mock.rate_limited,
+        # 429s are retried by discord.py, so these should stay at zero.
+        "send_failures": failed,
+        "dead_lettered": dead_lettered,
+        "log_channels_used": len(channels),
+        "events_per_s": round(mock.dispatched / args.duration, 1),
+        "embeds_per_s": round(len(mock.received) / elapsed, 1),
+        "elapsed_s": round(elapsed, 2),
+        "delay_p50_ms": round(percentile(delays, 0.5) * 1000, 1) if delays else None,
+        "delay_p95_ms": round(percentile(delays, 0.95) * 1000, 1) if delays else None,
+        "delay_p99_ms": round(percentile(delays, 0.99) * 1000, 1) if delays else None,
+        "delay_max_ms": round(delays[-1] * 1000, 1) if delays else None
+    }
+
+async def run(args):
+    rate_limit = None
+    if args.rate_limit != "none":
+        limit, period = args.rate_limit.split("/")
+        rate_limit = (int(limit), float(period))
+    
+    mock = MockDiscord(guild_count=args.guilds, rate_limit=rate_limit, seed=args.seed)
+    await mock.start()
+    use_mock_discord(mock.host, mock.port)
+    
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as work_dir:
+        # The bot reads its config and writes its snapshot relative to the
+        # working directory.
+        os.chdir(work_dir)
+        try:
+            write_guild_configs(mock, "config", args.delivery)
+            
+            bot = DiscordBot()
+            bot_task = asyncio.create_task(bot.start("mock-token"))
+            await asyncio.wait_for(bot.wait_until_ready(), timeout=60 + args.guilds / 100)
+            
+            start = time.perf_counter()
+            await mock.generate(args.rate, args.duration, skew=args.skew)
+            quiet = args.quiet if args.quiet is not None else (rate_limit[1] if rate_limit else 0) + 2
+            await wait_for_quiet(mock, quiet, args.timeout)
+            elapsed = time.perf_counter() - start
+            failed = sum(child.value for child in SEND_FAILURES.children.values())
+            dead_lettered = bot.dead_letters.get_stats()["queued"]
+            
+            await bot.close()
+            await asyncio.gather(bot_task, return_exceptions=True)
+        finally:
+            os.chdir(cwd)
+            await mock.stop()
+    
+    return summarize(mock, args, elapsed, failed, dead_lettered)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="End-to-end load test against a mock Discord")
+    parser.add_argument("--guilds", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=200.0, help="events dispatched per second")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of event generation")
+    parser.add_argument("--skew", type=float, default=1.2, help="Pareto alpha for guild activity (0 for uniform)")
+    parser.add_argument("--rate-limit", default="5/5", help="per-channel message limit as N/seconds, or none")
+    parser.add_argument("--delivery", choices=("channel", "webhook"), default="channel",
+                        help="log_delivery for every guild")
+    parser.add_argument("--quiet", type=float, help="seconds without new embeds that end the run "
+                        "(default: the rate limit period plus 2)")
+    parser.add_argument("--timeout", type=float, default=300.0, help="seconds to wait for the bot to catch up")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    results = asyncio.run(run(args))
+    
+    output = json.dumps(results, indent=2)
+    print(output)
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + "\n")
+
+if __name__ == "__main__":
+    main()
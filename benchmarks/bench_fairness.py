@@ -0,0 +1,177 @@
+"""
+Feeds skewed log traffic (a few very busy guilds and many quiet ones)
+through bot.fairqueue.FairSendQueue and through a plain FIFO queue with the
+same number of senders, against a stub send that is limited to a fixed
+number of sends per second like the bot's shared HTTP client, and reports
+the delay from submitting a log to it being delivered per kind of guild.
+
+One of the busy guilds has send_weight set, to show weights at work.
+
+Results are printed as JSON (and written with --output).
+
+Usage: python -m benchmarks.bench_fairness [--seconds N] [--capacity PER_SECOND]
+       [--busy-rate PER_SECOND] [--quiet-guilds N] [--quiet-rate PER_SECOND] [--output FILE]
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import time
+
+from bot.fairqueue import FairSendQueue
+
+class StubConfigManager:
+    def __init__(self):
+        self.guild_configs = {}
+    
+    def get_guild_config(self, guild_id):
+        return self.guild_configs.get(guild_id, {})
+
+class StubBot:
+    def __init__(self):
+        self.config_manager = StubConfigManager()
+
+class SendCapacity:
+    # Spaces sends out to capacity per second, plus a fixed round trip.
+    def __init__(self, capacity, latency):
+        self.interval = 1 / capacity
+        self.latency = latency
+        self.next_time = 0.0
+    
+    async def send(self):
+        now = time.monotonic()
+        start = max(now, self.next_time)
+        self.next_time = start + self.interval
+        await asyncio.sleep(start - now + self.latency)
+
+class FifoQueue:
+    # One queue for every guild, as if senders took logs in arrival order.
+    def __init__(self, concurrency):
+        self.concurrency = concurrency
+        self.queue = None
+        self.workers = []
+    
+    def start(self):
+        self.queue = asyncio.Queue()
+        self.workers = [asyncio.create_task(self.run_sender()) for _ in range(self.concurrency)]
+    
+    async def submit(self, guild_id, event_name, send, *args):
+        self.queue.put_nowait((send, args))
+    
+    async def run_sender(self):
+        while True:
+            send, args = await self.queue.get()
+            await send(*args)
+            self.queue.task_done()
+    
+    async def flush(self, timeout):
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        remaining = self.queue.qsize()
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        return remaining
+
+def percentile(values, quantile):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(quantile * len(values)))], 3)
+
+async def run(queue_name, args):
+    rng = random.Random(args.seed)
+    bot = StubBot()
+    capacity = SendCapacity(args.capacity, args.latency / 1000)
+    
+    busy = {1: "busy", 2: "busy_weighted"}
+    bot.config_manager.guild_configs[2] = {"send_weight": args.weight}
+    quiet = list(range(100, 100 + args.quiet_guilds))
+    
+    if queue_name == "fair":
+        queue = FairSendQueue(bot, concurrency=args.concurrency, max_pending=args.backlog)
+    else:
+        queue = FifoQueue(args.concurrency)
+    queue.start()
+    
+    delays = {"busy": [], "busy_weighted": [], "quiet": []}
+    submitted = {kind: 0 for kind in delays}
+    
+    async def send(kind, submitted_at):
+        await capacity.send()
+        delays[kind].append(time.monotonic() - submitted_at)
+    
+    busy_rate = args.busy_rate * len(busy)
+    quiet_rate = args.quiet_rate * len(quiet)
+    total_rate = busy_rate + quiet_rate
+    
+    start = time.monotonic()
+    next_arrival = start
+    while next_arrival - start < args.seconds:
+        next_arrival += rng.expovariate(total_rate)
+        delay = next_arrival - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        
+        if rng.random() < busy_rate / total_rate:
+            guild_id = rng.choice(list(busy))
+            kind = busy[guild_id]
+        else:
+            guild_id = rng.choice(quiet)
+            kind = "quiet"
+        
+        submitted[kind] += 1
+        await queue.submit(guild_id, "message", send, kind, time.monotonic())
+    
+    left = await queue.flush(args.drain)
+    
+    results = {
+        kind: {
+            "submitted": submitted[kind],
+            "delivered": len(values),
+            "p50_delay_s": percentile(values, 0.5),
+            "p99_delay_s": percentile(values, 0.99),
+            "max_delay_s": percentile(values, 1.0)
+        }
+        for kind, values in delays.items()
+    }
+    results["left_after_drain"] = left
+    return results
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark per-guild fair queueing of log sends")
+    parser.add_argument("--seconds", type=float, default=20, help="how long traffic arrives for")
+    parser.add_argument("--capacity", type=float, default=50, help="sends per second the stub allows")
+    parser.add_argument("--latency", type=float, default=50, help="round trip per send in milliseconds")
+    parser.add_argument("--concurrency", type=int, default=8, help="senders")
+    parser.add_argument("--backlog", type=int, default=500, help="fair queue sends kept per guild")
+    parser.add_argument("--busy-rate", type=float, default=60, help="logs per second from each busy guild")
+    parser.add_argument("--weight", type=float, default=3, help="send_weight of the weighted busy guild")
+    parser.add_argument("--quiet-guilds", type=int, default=1000)
+    parser.add_argument("--quiet-rate", type=float, default=0.01, help="logs per second from each quiet guild")
+    parser.add_argument("--drain", type=float, default=60, help="seconds to wait for the queue to empty")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    results = {
+        "python": platform.python_version(),
+        "settings": {key: value for key, value in vars(args).items() if key != "output"},
+        "queues": {name: asyncio.run(run(name, args)) for name in ("fifo", "fair")}
+    }
+    
+    output = json.dumps(results, indent=2)
+    print(output)
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + "\n")
+
+if __name__ == "__main__":
+    main()
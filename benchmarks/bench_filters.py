@@ -0,0 +1,133 @@
+"""
+Checks messages from a busy server against a large set of ignore rules
+(channel, category, user and role ids plus regex patterns) with the
+compiled per-guild predicate in bot/filters.py, and with a naive check that
+walks the rule lists and searches each pattern in turn, as a handler would
+without compiling them. Both must agree on every message.
+
+Results are printed as JSON (and written with --output).
+
+Usage: python -m benchmarks.bench_filters [--rules N] [--patterns N] [--messages N] [--output FILE]
+"""
+
+import argparse
+import json
+import platform
+import random
+import re
+import time
+from types import SimpleNamespace
+
+from bot.filters import compile_filter
+
+from .fakes import FakeRole, FakeUser
+
+WORDS = (
+    "the quick brown fox jumps over lazy dog lorem ipsum dolor sit amet server "
+    "message channel role voice raid hello world pog lol gg tomorrow meeting "
+    "everyone please remember update patch notes release"
+).split()
+
+def make_rules(rng, count, patterns):
+    # Ids are drawn from the same ranges as the traffic, so some hit.
+    ids = lambda low, high: rng.sample(range(low, high), count // 3)
+    return {
+        "channels": ids(1000, 5000),
+        "users": ids(100000, 200000),
+        "roles": ids(500, 1500),
+        "patterns": [
+            rng.choice((r"\b{0}\d+\b", r"{0}\.gg/\w+", r"^!{0}", r"\b{0}(?:ing|ed)?\b")).format(
+                f"{rng.choice(WORDS)}{index}"
+            )
+            for index in range(patterns)
+        ]
+    }
+
+def make_messages(rng, count):
+    messages = []
+    for index in range(count):
+        channel = SimpleNamespace(
+            id=rng.randrange(1000, 20000),
+            category_id=rng.randrange(1000, 20000),
+            parent_id=None
+        )
+        roles = [FakeRole(rng.randrange(500, 5000), "role") for _ in range(rng.randrange(0, 6))]
+        author = FakeUser(rng.randrange(100000, 1000000), "user", roles=roles)
+        content = " ".join(rng.choice(WORDS) for _ in range(rng.randrange(3, 40)))
+        if rng.random() < 0.01:
+            content += f" {rng.choice(WORDS)}{rng.randrange(100)}.gg/invite"
+        messages.append((channel, author, content))
+    return messages
+
+def naive_check(rules, patterns, channel, member, content):
+    for channel_id in rules["channels"]:
+        if channel.id == channel_id or channel.category_id == channel_id or channel.parent_id == channel_id:
+            return True
+    for user_id in rules["users"]:
+        if member.id == user_id:
+            return True
+    for role_id in rules["roles"]:
+        if any(role.id == role_id for role in member.roles):
+            return True
+    for pattern in patterns:
+        if pattern.search(content):
+            return True
+    return False
+
+def run(args):
+    rng = random.Random(args.seed)
+    rules = make_rules(rng, args.rules, args.patterns)
+    messages = make_messages(rng, args.messages)
+    
+    start = time.perf_counter()
+    compiled = compile_filter(rules)
+    compile_ms = (time.perf_counter() - start) * 1000
+    
+    # Even the naive check gets its patterns compiled once up front.
+    patterns = [re.compile(pattern, re.IGNORECASE) for pattern in rules["patterns"]]
+    
+    start = time.perf_counter()
+    naive = [naive_check(rules, patterns, *message) for message in messages]
+    naive_time = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    fast = [compiled.matches(*message) for message in messages]
+    compiled_time = time.perf_counter() - start
+    
+    mismatches = sum(1 for a, b in zip(naive, fast) if a != b)
+    return {
+        "rules": sum(len(values) for values in rules.values()),
+        "ignored": sum(fast),
+        "mismatches": mismatches,
+        "compile_ms": round(compile_ms, 2),
+        "naive_us_per_event": round(naive_time / len(messages) * 1e6, 2),
+        "compiled_us_per_event": round(compiled_time / len(messages) * 1e6, 2),
+        "speedup": round(naive_time / compiled_time, 1)
+    }
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark compiled ignore rules against per-rule checks")
+    parser.add_argument("--rules", type=int, default=600, help="channel, user and role ids, split evenly")
+    parser.add_argument("--patterns", type=int, default=200, help="regex patterns")
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    results = {
+        "python": platform.python_version(),
+        "settings": {key: value for key, value in vars(args).items() if key != "output"},
+        "results": run(args)
+    }
+    
+    output = json.dumps(results, indent=2)
+    print(output)
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + "\n")
+
+if __name__ == "__main__":
+    main()
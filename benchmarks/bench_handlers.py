@@ -0,0 +1,272 @@
+"""
+Drives the EventHandler methods through a real DiscordBot's dispatcher with
+fake discord objects and a stubbed REST side, and reports events/s, CPU
+and memory per event and handler latency for each traffic scenario.
+
+Results are printed as JSON (and written with --output) so runs can be
+compared; --compare prints the change against an earlier result file.
+
+Usage: python -m benchmarks.bench_handlers [--events N] [--scenario NAME ...]
+       [--latency MS] [--rate-limit SHARE] [--output FILE] [--compare FILE]
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from benchmarks.fakes import (
+    FakeAttachment, FakeGuild, FakeMessage, FakeRole, FakeTextChannel, FakeUser, FakeVoiceState, StubSender
+)
+from bot.config import ConfigManager
+from bot.core import DiscordBot
+from bot.metrics import PIPELINE
+
+LOG_TYPES = ('messages', 'edits', 'deletions', 'joins', 'leaves', 'roles', 'voice')
+
+WORDS = (
+    "the quick brown fox jumps over lazy dog lorem ipsum dolor sit amet server "
+    "message channel role voice raid spam hello world pog lol gg"
+).split()
+
+class World:
+    def __init__(self, bot, sender, guild_count, seed):
+        self.random = random.Random(seed)
+        self.guilds = []
+        self.text_channels = {}
+        self.voice_channels = {}
+        self.roles = {}
+        self.members = {}
+        self.next_id = 1000000000000000000
+        
+        channels = {}
+        for index in range(guild_count):
+            guild = FakeGuild(self.new_id(), f"Guild {index}", sender)
+            self.guilds.append(guild)
+            
+            log_channel = FakeTextChannel(self.new_id(), "logs", guild, sender)
+            channels[log_channel.id] = log_channel
+            self.text_channels[guild.id] = [FakeTextChannel(self.new_id(), f"chat-{n}", guild, sender) for n in range(5)]
+            self.voice_channels[guild.id] = [FakeTextChannel(self.new_id(), f"voice-{n}", guild, sender) for n in range(3)]
+            self.roles[guild.id] = [FakeRole(self.new_id(), f"role-{n}") for n in range(10)]
+            self.members[guild.id] = [self.new_member(guild) for _ in range(50)]
+            
+            config = bot.config_manager.default_config.copy()
+            config['log_channels'] = {log_type: log_channel.id for log_type in LOG_TYPES}
+            bot.config_manager.guild_configs[guild.id] = config
+        
+        bot.get_channel = channels.get
+    
+    def new_id(self):
+        self.next_id += self.random.randrange(1 << 22, 1 << 30)
+        return self.next_id
+    
+    def new_member(self, guild):
+        member_id = self.new_id()
+        return FakeUser(member_id, f"user{member_id % 100000}", guild=guild, roles=[self.roles[guild.id][0]])
+    
+    def text(self, word_count):
+        return " ".join(self.random.choice(WORDS) for _ in range(word_count))
+    
+    def message(self, guild, author=None, attachments=0, words=12):
+        channel = self.random.choice(self.text_channels[guild.id])
+        author = author or self.random.choice(self.members[guild.id])
+        files = [FakeAttachment(self.new_id(), f"image{n}.png") for n in range(attachments)]
+        return FakeMessage(self.new_id(), author, channel, self.text(words), files)
+    
+    def pick_guild(self):
+        # A few busy guilds and a long tail of quiet ones.
+        return self.guilds[min(int(self.random.paretovariate(1.2)) - 1, len(self.guilds) - 1)]
+
+def chatty(world, handler, count):
+    # Ordinary conversation spread over many guilds: mostly new messages,
+    # some edits and deletions.
+    for _ in range(count):
+        guild = world.pick_guild()
+        roll = world.random.random()
+        message = world.message(guild)
+        
+        if roll < 0.8:
+            yield guild, handler.on_message, (message,)
+        elif roll < 0.95:
+            after = FakeMessage(message.id, message.author, message.channel, message.content + " (edited)",
+                                edited_at=datetime.now(timezone.utc))
+            yield guild, handler.on_message_edit, (message, after)
+        else:
+            yield guild, handler.on_message_delete, (message,)
+
+def purge(world, handler, count):
+    # A moderator bulk-deleting a channel in one guild.
+    guild = world.guilds[0]
+    for _ in range(count):
+        yield guild, handler.on_message_delete, (world.message(guild, words=30),)
+
+def raid(world, handler, count):
+    # Fresh accounts flooding one guild with pings and images, and piling
+    # into voice channels.
+    guild = world.guilds[0]
+    for _ in range(count):
+        raider = world.new_member(guild)
+        if world.random.random() < 0.85:
+            message = world.message(guild, author=raider, attachments=world.random.randrange(3), words=40)
+            message.content = " ".join(member.mention for member in world.members[guild.id][:10]) + message.content
+            yield guild, handler.on_message, (message,)
+        else:
+            channel = world.random.choice(world.voice_channels[guild.id])
+            yield guild, handler.on_voice_state_update, (raider, FakeVoiceState(), FakeVoiceState(channel))
+
+def role_churn(world, handler, count):
+    # Bots and moderators reassigning roles across many guilds, with voice
+    # channel switching mixed in.
+    for _ in range(count):
+        guild = world.pick_guild()
+        member = world.random.choice(world.members[guild.id])
+        
+        if world.random.random() < 0.8:
+            roles = world.roles[guild.id]
+            before = FakeUser(member.id, member.name, guild=guild, roles=list(member.roles))
+            after = FakeUser(member.id, member.name, guild=guild, roles=[roles[0]] + world.random.sample(roles[1:], 3))
+            member.roles = after.roles
+            yield guild, handler.on_member_update, (before, after)
+        else:
+            channels = world.voice_channels[guild.id]
+            yield guild, handler.on_voice_state_update, (
+                member, FakeVoiceState(channels[0]), FakeVoiceState(world.random.choice(channels[1:]))
+            )
+
+SCENARIOS = {
+    "chatty": chatty,
+    "purge": purge,
+    "raid": raid,
+    "role_churn": role_churn
+}
+
+def reset_pipeline_stats():
+    PIPELINE.reset()
+
+async def drive(bot, events, timeout):
+    for guild, handler, args in events:
+        await bot.submit_event(guild, handler, *args)
+    await bot.dispatcher.drain(timeout)
+
+async def run_scenario(name, args, config_dir):
+    sender = StubSender(latency=args.latency / 1000, rate_limit_rate=args.rate_limit, seed=args.seed)
+    bot = DiscordBot()
+    bot.config_manager = ConfigManager(config_dir)
+    bot.config_manager.default_config['event_flood_limit'] = args.flood_limit
+    bot.config_manager.default_config['digest_mode'] = args.digest_mode
+    world = World(bot, sender, args.guilds, args.seed)
+    events = list(SCENARIOS[name](world, bot.event_handler, args.events))
+    
+    bot.dispatcher.start()
+    reset_pipeline_stats()
+    
+    start_wall = time.perf_counter()
+    start_cpu = time.process_time()
+    await drive(bot, events, args.timeout)
+    wall = time.perf_counter() - start_wall
+    cpu = time.process_time() - start_cpu
+    
+    PIPELINE.fold()
+    handler_p50, handler_p99 = PIPELINE.total.handler_latency.percentiles((0.5, 0.99))
+    dispatcher_stats = bot.dispatcher.get_stats()
+    sent = sender.sent
+    
+    # A second, smaller pass under tracemalloc, which slows everything down
+    # too much to share the timed run.
+    memory_events = list(SCENARIOS[name](world, bot.event_handler, min(args.events, 2000)))
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    await drive(bot, memory_events, args.timeout)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    await bot.dispatcher.stop()
+    
+    return {
+        "events": len(events),
+        "processed": dispatcher_stats["processed"],
+        "embeds_sent": sent,
+        "rate_limited": sender.rate_limited,
+        "events_per_s": round(len(events) / wall, 1),
+        "wall_s": round(wall, 3),
+        "cpu_us_per_event": round(cpu / len(events) * 1e6, 1),
+        "handler_p50_ms": round(handler_p50 * 1000, 3) if handler_p50 is not None else None,
+        "handler_p99_ms": round(handler_p99 * 1000, 3) if handler_p99 is not None else None,
+        "peak_memory_kb": round((peak - baseline) / 1024, 1),
+        "retained_bytes_per_event": round((current - baseline) / len(memory_events), 1)
+    }
+
+def compare(results, baseline_path):
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)
+    
+    for name, result in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        
+        changes = []
+        for key in ("events_per_s", "cpu_us_per_event", "handler_p99_ms", "peak_memory_kb"):
+            if previous.get(key) and result.get(key) is not None:
+                changes.append(f"{key} {(result[key] - previous[key]) / previous[key]:+.1%}")
+        print(f"{name}: {', '.join(changes)}", file=sys.stderr)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Synthetic load benchmark for the event handlers")
+    parser.add_argument("--events", type=int, default=20000, help="events per scenario")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="scenario to run (repeatable)")
+    parser.add_argument("--guilds", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.0, help="mean simulated send latency in ms")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="share of sends that hit a 429 first")
+    parser.add_argument("--flood-limit", type=int, default=0, help="event_flood_limit for every guild (0 disables)")
+    parser.add_argument("--digest-mode", choices=("auto", "always", "off"), default="off",
+                        help="digest_mode for every guild")
+    parser.add_argument("--timeout", type=float, default=300.0, help="seconds to wait for the queues to drain")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    return parser.parse_args()
+
+async def run(args):
+    results = {
+        "python": platform.python_version(),
+        "settings": {
+            "events": args.events,
+            "guilds": args.guilds,
+            "latency_ms": args.latency,
+            "rate_limit": args.rate_limit,
+            "flood_limit": args.flood_limit,
+            "digest_mode": args.digest_mode
+        },
+        "scenarios": {}
+    }
+    
+    with tempfile.TemporaryDirectory() as config_dir:
+        for name in args.scenario or SCENARIOS:
+            results["scenarios"][name] = await run_scenario(name, args, config_dir)
+    
+    return results
+
+def main():
+    args = parse_args()
+    results = asyncio.run(run(args))
+    
+    output = json.dumps(results, indent=2)
+    print(output)
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + "\n")
+    
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Compares the per-call cost of BotLogger.log_command against the previous
+eager f-string implementation, with the level enabled and filtered out.
+
+Usage: python -m benchmarks.bench_log_records [iterations]
+"""
+
+import logging
+import queue
+import sys
+import tempfile
+import timeit
+from types import SimpleNamespace
+
+from bot.logger import BotLogger
+
+def eager_log_command(ctx, command_name, success=True):
+    command_logger = logging.getLogger("commands")
+    
+    status = "SUCCESS" if success else "FAILED"
+    message = (
+        f"{status} - Command: {command_name} | "
+        f"User: {ctx.author} ({ctx.author.id}) | "
+        f"Guild: {ctx.guild.name if ctx.guild else 'DM'} ({ctx.guild.id if ctx.guild else 'N/A'}) | "
+        f"Channel: {ctx.channel.name if hasattr(ctx.channel, 'name') else 'DM'} ({ctx.channel.id})"
+    )
+    
+    command_logger.info(message)
+
+class FakeUser:
+    def __init__(self, user_id, name):
+        self.id = user_id
+        self.name = name
+    
+    def __str__(self):
+        return self.name
+
+def make_context():
+    return SimpleNamespace(
+        author=FakeUser(800000000000000001, "someone"),
+        guild=SimpleNamespace(id=900000000000000001, name="A Fairly Busy Server"),
+        channel=SimpleNamespace(id=910000000000000001, name="general")
+    )
+
+def time_call(func, iterations):
+    return min(timeit.repeat(func, number=iterations, repeat=5)) / iterations * 1e9
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    ctx = make_context()
+    
+    with tempfile.TemporaryDirectory() as log_dir:
+        bot_logger = BotLogger(log_dir=log_dir)
+        # Measure only the calling side: stop the listener so the writer
+        # thread does not compete for the GIL, and discard the queue.
+        bot_logger.listener.stop()
+        bot_logger.queue = bot_logger.queue_handler.queue = queue.SimpleQueue()
+        
+        for level, label in ((logging.INFO, "enabled"), (logging.WARNING, "filtered")):
+            logging.getLogger("commands").setLevel(level)
+            
+            eager = time_call(lambda: eager_log_command(ctx, "log status", True), iterations)
+            deferred = time_call(lambda: bot_logger.log_command(ctx, "log status", True, 1.5), iterations)
+            print(f"{label:<9} eager={eager:7.0f}ns/call  deferred={deferred:7.0f}ns/call  saved={eager - deferred:7.0f}ns")
+            
+            bot_logger.queue_handler.queue = queue.SimpleQueue()
+        
+        logging.getLogger().removeHandler(bot_logger.queue_handler)
+
+if __name__ == "__main__":
+    main()
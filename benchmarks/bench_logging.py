@@ -0,0 +1,102 @@
+"""
+Measures event-loop latency while the bot logs heavily, with file handlers
+called inline on the loop versus BotLogger's queue-backed listener thread.
+
+Usage: python -m benchmarks.bench_logging [records_per_second] [seconds]
+"""
+
+import asyncio
+import logging
+import statistics
+import sys
+import tempfile
+import time
+from logging.handlers import RotatingFileHandler
+
+from bot.logger import BotLogger
+
+TICK_INTERVAL = 0.001
+
+async def measure_lag(duration):
+    loop = asyncio.get_running_loop()
+    lags = []
+    end = loop.time() + duration
+    
+    while loop.time() < end:
+        start = time.perf_counter()
+        await asyncio.sleep(TICK_INTERVAL)
+        lags.append(time.perf_counter() - start - TICK_INTERVAL)
+    
+    return lags
+
+async def produce(rate, duration):
+    loggers = [logging.getLogger(name) for name in ("bot.events", "commands", "events")]
+    batch = max(1, rate // 1000)
+    end = asyncio.get_running_loop().time() + duration
+    count = 0
+    
+    while asyncio.get_running_loop().time() < end:
+        for _ in range(batch):
+            loggers[count % len(loggers)].info("Message Sent - guild %s channel %s author %s", 123, 456, count)
+            count += 1
+        await asyncio.sleep(0.001)
+    
+    return count
+
+def install_inline_handlers(log_dir):
+    # Mirrors the previous setup: rotating file handlers attached directly
+    # to the loggers, with rotation happening on the calling thread.
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    handlers = []
+    
+    for filename, logger_name in (("bot.log", None), ("commands.log", "commands"), ("events.log", "events")):
+        handler = RotatingFileHandler(f"{log_dir}/{filename}", maxBytes=1024 * 1024, backupCount=5)
+        handler.setFormatter(formatter)
+        logging.getLogger(logger_name).addHandler(handler)
+        handlers.append((logger_name, handler))
+    
+    logging.getLogger().setLevel(logging.INFO)
+    return handlers
+
+def remove_inline_handlers(handlers):
+    for logger_name, handler in handlers:
+        logging.getLogger(logger_name).removeHandler(handler)
+        handler.close()
+
+async def run_scenario(rate, duration):
+    lag_task = asyncio.create_task(measure_lag(duration))
+    produced = await produce(rate, duration)
+    lags = sorted(await lag_task)
+    
+    return {
+        "records": produced,
+        "p50_ms": statistics.median(lags) * 1000,
+        "p99_ms": lags[int(len(lags) * 0.99)] * 1000,
+        "max_ms": lags[-1] * 1000
+    }
+
+def report(name, result):
+    print(
+        f"{name:<8} records={result['records']:<8} lag p50={result['p50_ms']:.2f}ms "
+        f"p99={result['p99_ms']:.2f}ms max={result['max_ms']:.2f}ms"
+    )
+
+def main():
+    rate = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    
+    with tempfile.TemporaryDirectory() as log_dir:
+        handlers = install_inline_handlers(log_dir)
+        report("inline", asyncio.run(run_scenario(rate, duration)))
+        remove_inline_handlers(handlers)
+    
+    with tempfile.TemporaryDirectory() as log_dir:
+        bot_logger = BotLogger(log_dir=log_dir, max_file_size=1024 * 1024)
+        for handler in bot_logger.handlers:
+            if type(handler) is logging.StreamHandler:
+                handler.setLevel(logging.CRITICAL)
+        report("queued", asyncio.run(run_scenario(rate, duration)))
+        bot_logger.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Measures RateLimiter call cost and memory at a large number of distinct
+keys, and how quickly idle keys are evicted afterwards.
+
+Usage: python -m benchmarks.bench_ratelimit [key_count]
+"""
+
+import sys
+import time
+import tracemalloc
+
+from bot.ratelimit import RateLimiter
+
+def fill(limiter, key_count, now):
+    for key in range(key_count):
+        limiter.is_rate_limited(("user", key), now=now)
+
+def run(key_count):
+    now = 1000.0
+    
+    limiter = RateLimiter(max_requests=5, time_window=60)
+    start = time.perf_counter()
+    fill(limiter, key_count, now)
+    insert_time = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    fill(limiter, key_count, now + 1)
+    hit_time = time.perf_counter() - start
+    
+    # Two windows later every key is idle; count the calls (on one active
+    # key) needed to evict them and the worst single call.
+    calls = 0
+    worst = 0.0
+    start = time.perf_counter()
+    while len(limiter) > 1:
+        call_start = time.perf_counter()
+        limiter.is_rate_limited(("user", -1), now=now + 180)
+        worst = max(worst, time.perf_counter() - call_start)
+        calls += 1
+    evict_time = time.perf_counter() - start
+    
+    tracemalloc.start()
+    limiter = RateLimiter(max_requests=5, time_window=60)
+    fill(limiter, key_count, now)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    
+    print(f"keys:           {key_count}")
+    print(f"new key:        {insert_time / key_count * 1e9:.0f} ns/call")
+    print(f"existing key:   {hit_time / key_count * 1e9:.0f} ns/call")
+    print(f"memory:         {memory / key_count:.0f} B/key ({memory / 1024 / 1024:.0f} MB)")
+    print(f"eviction:       {calls} calls, {evict_time:.2f}s total, worst call {worst * 1e6:.0f} us")
+
+def main():
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
+
+if __name__ == "__main__":
+    main()
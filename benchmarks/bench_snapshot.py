@@ -0,0 +1,68 @@
+"""
+Measures warm-restart snapshot write and load times.
+
+Usage: python -m benchmarks.bench_snapshot [message_count]
+"""
+
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+from bot.snapshot import MessageSnapshot
+
+def make_messages(count):
+    message_type = SimpleNamespace(value=0)
+    channels = [SimpleNamespace(id=900000000000000000 + i) for i in range(50)]
+    authors = [
+        SimpleNamespace(
+            id=800000000000000000 + i,
+            name=f"user{i}",
+            discriminator="0",
+            avatar=None,
+            bot=False,
+            global_name=f"User {i}"
+        )
+        for i in range(1000)
+    ]
+    
+    return [
+        SimpleNamespace(
+            id=1000000000000000000 + i,
+            channel=channels[i % len(channels)],
+            author=authors[i % len(authors)],
+            content=f"message number {i} with some typical chat content",
+            edited_at=None,
+            attachments=[],
+            type=message_type,
+            pinned=False
+        )
+        for i in range(count)
+    ]
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    messages = make_messages(count)
+    
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "state.snapshot")
+        
+        snapshot = MessageSnapshot(path=path, max_messages=count)
+        start = time.perf_counter()
+        snapshot.save(messages, [])
+        save_time = time.perf_counter() - start
+        size = os.path.getsize(path)
+        
+        snapshot = MessageSnapshot(path=path, max_messages=count)
+        start = time.perf_counter()
+        snapshot.load()
+        load_time = time.perf_counter() - start
+    
+    print(f"messages:      {count}")
+    print(f"snapshot size: {size / 1024 / 1024:.1f} MB ({size / count:.1f} B/message)")
+    print(f"save:          {save_time:.2f}s")
+    print(f"load:          {load_time:.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Lightweight stand-ins for the discord.py objects the event handlers read,
+and a stub for the REST side of sending a log embed.
+"""
+
+import asyncio
+import random
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import discord
+
+class FakeAsset:
+    def __init__(self, url):
+        self.url = url
+
+class FakeRole:
+    def __init__(self, role_id, name):
+        self.id = role_id
+        self.name = name
+
+class FakeUser:
+    def __init__(self, user_id, name, bot=False, guild=None, roles=None):
+        self.id = user_id
+        self.name = name
+        self.bot = bot
+        self.mention = f"<@{user_id}>"
+        self.avatar = None
+        self.default_avatar = FakeAsset(f"https://cdn.discordapp.com/embed/avatars/{user_id % 6}.png")
+        self.created_at = datetime(2020, 1, 1, tzinfo=timezone.utc)
+        self.joined_at = datetime(2023, 1, 1, tzinfo=timezone.utc)
+        self.guild = guild
+        self.roles = roles or []
+    
+    def __str__(self):
+        return self.name
+
+class StubSender:
+    # Stands in for the HTTP request behind channel.send. A configurable
+    # share of requests is rate limited first; like discord.py, they wait
+    # for retry_after and then succeed.
+    def __init__(self, latency=0.0, rate_limit_rate=0.0, retry_after=0.25, failure_rate=0.0, seed=0):
+        self.latency = latency
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.sent = 0
+        self.rate_limited = 0
+        self.failed = 0
+        self.requests = 0
+    
+    async def request(self):
+        self.requests += 1
+        
+        if self.rate_limit_rate and self.random.random() < self.rate_limit_rate:
+            self.rate_limited += 1
+            await asyncio.sleep(self.retry_after)
+        
+        if self.latency:
+            await asyncio.sleep(self.random.uniform(0.5, 1.5) * self.latency)
+        else:
+            await asyncio.sleep(0)
+        
+        if self.failure_rate and self.random.random() < self.failure_rate:
+            self.failed += 1
+            raise discord.HTTPException(SimpleNamespace(status=500, reason="Internal Server Error"), "stub failure")
+    
+    async def send(self, channel, embed=None, **kwargs):
+        await self.request()
+        self.sent += 1
+
+class FakeGuild:
+    def __init__(self, guild_id, name, sender):
+        self.id = guild_id
+        self.name = name
+        self.member_count = 1000
+        self.sender = sender
+        self.me = FakeUser(1, "Logger", bot=True, guild=self)
+        self.public_updates_channel = None
+        self.system_channel = None
+    
+    async def audit_logs(self, action=None, limit=1):
+        # One REST request that finds no matching entry.
+        await self.sender.request()
+        return
+        yield
+
+class FakeTextChannel:
+    def __init__(self, channel_id, name, guild, sender):
+        self.id = channel_id
+        self.name = name
+        self.guild = guild
+        self.mention = f"<#{channel_id}>"
+        self.sender = sender
+    
+    def permissions_for(self, member):
+        return discord.Permissions.all()
+    
+    async def send(self, content=None, embed=None, **kwargs):
+        await self.sender.send(self, embed=embed, **kwargs)
+
+class FakeAttachment:
+    def __init__(self, attachment_id, filename):
+        self.id = attachment_id
+        self.filename = filename
+        self.url = f"https://cdn.discordapp.com/attachments/{attachment_id}/{filename}"
+
+class FakeMessage:
+    def __init__(self, message_id, author, channel, content, attachments=(), edited_at=None):
+        self.id = message_id
+        self.author = author
+        self.channel = channel
+        self.guild = channel.guild
+        self.content = content
+        self.attachments = list(attachments)
+        self.mentions = []
+        self.mention_everyone = False
+        self.created_at = datetime.now(timezone.utc)
+        self.edited_at = edited_at
+        self.jump_url = f"https://discord.com/channels/{channel.guild.id}/{channel.id}/{message_id}"
+
+class FakeVoiceState:
+    def __init__(self, channel=None):
+        self.channel = channel
@@ -0,0 +1,502 @@
+"""
+A local stand-in for the parts of Discord the bot talks to: the gateway
+(hello, identify, heartbeat, READY, GUILD_CREATE and event dispatch over
+plain JSON text frames) and the REST routes for the bot user, application,
+gateway lookup, channel messages, webhooks and audit logs, with
+per-channel and per-webhook rate limit headers and 429s.
+
+Point discord.py at it with use_mock_discord(); see bench_e2e for a full run.
+"""
+
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timezone
+
+import yarl
+from aiohttp import WSMsgType, web
+
+import discord.gateway
+import discord.http
+
+DISCORD_EPOCH = 1420070400000
+
+GATEWAY_HELLO = 10
+GATEWAY_HEARTBEAT = 1
+GATEWAY_HEARTBEAT_ACK = 11
+GATEWAY_IDENTIFY = 2
+GATEWAY_RESUME = 6
+GATEWAY_REQUEST_MEMBERS = 8
+GATEWAY_DISPATCH = 0
+
+def use_mock_discord(host, port):
+    # discord.py connects to its default gateway URL unless it is
+    # resuming, so both base URLs have to be redirected.
+    discord.http.Route.BASE = f"http://{host}:{port}/api/v10"
+    discord.gateway.DiscordWebSocket.DEFAULT_GATEWAY = yarl.URL(f"ws://{host}:{port}/gateway")
+
+def isoformat(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+def json_response(data, status=200, headers=None):
+    # discord.py only decodes bodies whose content type is exactly
+    # application/json, without a charset.
+    headers = dict(headers or {})
+    headers["Content-Type"] = "application/json"
+    return web.Response(body=json.dumps(data).encode("utf-8"), status=status, headers=headers)
+
+class Snowflakes:
+    def __init__(self):
+        self.increment = 0
+    
+    def next(self):
+        self.increment = (self.increment + 1) & 0xFFF
+        return ((int(time.time() * 1000) - DISCORD_EPOCH) << 22) | (1 << 17) | self.increment
+
+class ChannelBucket:
+    __slots__ = ("remaining", "reset_at")
+    
+    def __init__(self):
+        self.remaining = 0
+        self.reset_at = 0.0
+
+class MockDiscord:
+    def __init__(self, guild_count=100, members_per_guild=20, channels_per_guild=4,
+                 rate_limit=(5, 5.0), seed=1):
+        self.random = random.Random(seed)
+        self.snowflakes = Snowflakes()
+        self.rate_limit = rate_limit
+        self.host = None
+        self.port = None
+        self.runner = None
+        self.sockets = set()
+        self.sequence = 0
+        self.connected = asyncio.Event()
+        
+        self.bot_user = self.make_user("mock-bot", bot=True)
+        self.owner = self.make_user("mock-owner")
+        self.guilds = [
+            self.make_guild(index, members_per_guild, channels_per_guild)
+            for index in range(guild_count)
+        ]
+        self.guilds_by_id = {guild["id"]: guild for guild in self.guilds}
+        
+        # What the bot sent back, and when each generated event was dispatched.
+        self.buckets = {}
+        self.received = []
+        self.rate_limited = 0
+        self.dispatched = 0
+        self.dispatch_times = {}
+        self.recent_messages = {}
+        self.webhooks = {}
+    
+    def make_user(self, name, bot=False):
+        user_id = str(self.snowflakes.next())
+        return {
+            "id": user_id,
+            "username": f"{name}{user_id[-4:]}",
+            "discriminator": "0",
+            "global_name": None,
+            "avatar": None,
+            "bot": bot
+        }
+    
+    def make_guild(self, index, member_count, channel_count):
+        guild_id = str(self.snowflakes.next())
+        text_channels = [
+            {"id": str(self.snowflakes.next()), "type": 0, "name": f"chat-{n}", "position": n,
+             "permission_overwrites": [], "guild_id": guild_id}
+            for n in range(channel_count)
+        ]
+        log_channel = {"id": str(self.snowflakes.next()), "type": 0, "name": "logs", "position": channel_count,
+                       "permission_overwrites": [], "guild_id": guild_id}
+        voice_channels = [
+            {"id": str(self.snowflakes.next()), "type": 2, "name": f"voice-{n}", "position": n,
+             "permission_overwrites": [], "guild_id": guild_id, "bitrate": 64000, "user_limit": 0}
+            for n in range(2)
+        ]
+        # The defaults plus Manage Webhooks.
+        roles = [{"id": guild_id, "name": "@everyone", "permissions": str(277025770560 | 1 << 29), "position": 0,
+                  "color": 0, "hoist": False, "managed": False, "mentionable": False}]
+        roles.extend(
+            {"id": str(self.snowflakes.next()), "name": f"role-{n}", "permissions": "0", "position": n + 1,
+             "color": 0, "hoist": False, "managed": False, "mentionable": False}
+            for n in range(5)
+        )
+        users = [self.bot_user] + [self.make_user(f"user{index}-") for _ in range(member_count)]
+        
+        return {
+            "id": guild_id,
+            "name": f"Mock Guild {index}",
+            "owner_id": self.owner["id"],
+            "text_channels": text_channels,
+            "log_channel": log_channel,
+            "voice_channels": voice_channels,
+            "roles": roles,
+            "members": [self.make_member(user) for user in users],
+            "voice": {}
+        }
+    
+    def make_member(self, user, roles=()):
+        return {"user": user, "roles": list(roles), "joined_at": isoformat(time.time() - 86400),
+                "deaf": False, "mute": False, "flags": 0}
+    
+    def guild_create_payload(self, guild):
+        return {
+            "id": guild["id"],
+            "name": guild["name"],
+            "owner_id": guild["owner_id"],
+            "unavailable": False,
+            "large": False,
+            "member_count": len(guild["members"]),
+            "channels": guild["text_channels"] + [guild["log_channel"]] + guild["voice_channels"],
+            "roles": guild["roles"],
+            "members": guild["members"],
+            "features": [],
+            "emojis": [],
+            "stickers": [],
+            "voice_states": [],
+            "presences": [],
+            "threads": [],
+            "stage_instances": [],
+            "guild_scheduled_events": [],
+            "verification_level": 0,
+            "default_message_notifications": 0,
+            "explicit_content_filter": 0,
+            "mfa_level": 0,
+            "premium_tier": 0,
+            "nsfw_level": 0,
+            "preferred_locale": "en-US",
+            "joined_at": isoformat(time.time() - 86400)
+        }
+    
+    async def start(self, host="127.0.0.1", port=0):
+        app = web.Application()
+        app.router.add_get("/gateway", self.handle_gateway)
+        app.router.add_get("/api/v10/gateway/bot", self.handle_gateway_bot)
+        app.router.add_get("/api/v10/users/@me", self.handle_current_user)
+        app.router.add_get("/api/v10/oauth2/applications/@me", self.handle_application)
+        app.router.add_post("/api/v10/channels/{channel_id}/messages", self.handle_create_message)
+        app.router.add_post("/api/v10/channels/{channel_id}/webhooks", self.handle_create_webhook)
+        app.router.add_post("/api/v10/webhooks/{webhook_id}/{token}", self.handle_execute_webhook)
+        app.router.add_get("/api/v10/guilds/{guild_id}/audit-logs", self.handle_audit_logs)
+        app.router.add_route("*", "/api/v10/{tail:.*}", self.handle_other)
+        
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        
+        self.host = host
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self.port
+    
+    async def stop(self):
+        for socket in list(self.sockets):
+            await socket.close()
+        if self.runner:
+            await self.runner.cleanup()
+    
+    # REST
+    
+    async def handle_gateway_bot(self, request):
+        return json_response({
+            "url": f"ws://{self.host}:{self.port}/gateway",
+            "shards": 1,
+            "session_start_limit": {"total": 1000, "remaining": 1000, "reset_after": 0, "max_concurrency": 1}
+        })
+    
+    async def handle_current_user(self, request):
+        return json_response(self.bot_user)
+    
+    async def handle_application(self, request):
+        return json_response({
+            "id": self.bot_user["id"],
+            "name": "mock-bot",
+            "description": "",
+            "icon": None,
+            "bot_public": False,
+            "bot_require_code_grant": False,
+            "owner": self.owner,
+            "team": None,
+            "verify_key": "0" * 64,
+            "flags": 0
+        })
+    
+    async def handle_audit_logs(self, request):
+        return json_response({"audit_log_entries": [], "users": [], "webhooks": [], "threads": [],
+                                  "integrations": [], "application_commands": [], "auto_moderation_rules": [],
+                                  "guild_scheduled_events": []})
+    
+    async def handle_other(self, request):
+        return json_response({"message": "404: Not Found", "code": 0}, status=404)
+    
+    def take_rate_limit(self, bucket_key):
+        limit, period = self.rate_limit
+        now = time.time()
+        
+        bucket = self.buckets.get(bucket_key)
+        if bucket is None:
+            bucket = self.buckets[bucket_key] = ChannelBucket()
+        if now >= bucket.reset_at:
+            bucket.remaining = limit
+            bucket.reset_at = now + period
+        
+        headers = {
+            "X-RateLimit-Limit": str(limit),
+            "X-RateLimit-Reset": f"{bucket.reset_at:.3f}",
+            "X-RateLimit-Reset-After": f"{bucket.reset_at - now:.3f}",
+            "X-RateLimit-Bucket": bucket_key
+        }
+        
+        if bucket.remaining <= 0:
+            headers["X-RateLimit-Remaining"] = "0"
+            # Discord reports per-channel message limits as shared.
+            headers["X-RateLimit-Scope"] = "shared" if bucket_key.startswith("channel-") else "user"
+            return False, headers
+        
+        bucket.remaining -= 1
+        headers["X-RateLimit-Remaining"] = str(bucket.remaining)
+        return True, headers
+    
+    def check_rate_limit(self, bucket_key):
+        # Returns the 429 response to send, or the headers for a success.
+        if not self.rate_limit:
+            return None, {}
+        
+        allowed, headers = self.take_rate_limit(bucket_key)
+        if allowed:
+            return None, headers
+        
+        self.rate_limited += 1
+        retry_after = float(headers["X-RateLimit-Reset-After"])
+        # discord.py takes a 429 without Via for a Cloudflare ban and fails
+        # the request instead of retrying; real API responses carry it.
+        headers["Via"] = "1.1 google"
+        return json_response(
+            {"message": "You are being rate limited.", "retry_after": retry_after, "global": False},
+            status=429, headers=headers
+        ), headers
+    
+    def record_embeds(self, channel_id, embeds):
+        now = time.perf_counter()
+        for embed in embeds:
+            footer = (embed.get("footer") or {}).get("text", "")
+            source_id = footer.rsplit(" ", 1)[-1] if footer.startswith(("Message ID:", "User ID:")) else None
+            dispatched_at = self.dispatch_times.pop(source_id, None)
+            self.received.append((channel_id, now, now - dispatched_at if dispatched_at is not None else None))
+    
+    async def handle_create_message(self, request):
+        channel_id = request.match_info["channel_id"]
+        data = await request.json()
+        
+        limited, headers = self.check_rate_limit(f"channel-{channel_id}")
+        if limited:
+            return limited
+        
+        embeds = data.get("embeds") or []
+        self.record_embeds(channel_id, embeds)
+        
+        message = {
+            "id": str(self.snowflakes.next()),
+            "channel_id": channel_id,
+            "author": self.bot_user,
+            "content": data.get("content") or "",
+            "timestamp": isoformat(time.time()),
+            "edited_timestamp": None,
+            "tts": False,
+            "mention_everyone": False,
+            "mentions": [],
+            "mention_roles": [],
+            "attachments": [],
+            "embeds": embeds,
+            "pinned": False,
+            "type": 0
+        }
+        return json_response(message, headers=headers)
+    
+    async def handle_create_webhook(self, request):
+        channel_id = request.match_info["channel_id"]
+        data = await request.json()
+        
+        webhook = {
+            "id": str(self.snowflakes.next()),
+            "type": 1,
+            "channel_id": channel_id,
+            "guild_id": None,
+            "name": data.get("name"),
+            "avatar": None,
+            "token": f"token{self.random.getrandbits(64):016x}",
+            "application_id": None,
+            "user": self.bot_user
+        }
+        self.webhooks[webhook["id"]] = webhook
+        return json_response(webhook)
+    
+    async def handle_execute_webhook(self, request):
+        webhook = self.webhooks.get(request.match_info["webhook_id"])
+        if webhook is None or webhook["token"] != request.match_info["token"]:
+            return json_response({"message": "Unknown Webhook", "code": 10015}, status=404)
+        
+        limited, headers = self.check_rate_limit(f"webhook-{webhook['id']}")
+        if limited:
+            return limited
+        
+        data = await request.json()
+        self.record_embeds(webhook["channel_id"], data.get("embeds") or [])
+        return web.Response(status=204, headers=headers)
+    
+    # Gateway
+    
+    async def handle_gateway(self, request):
+        socket = web.WebSocketResponse(max_msg_size=0)
+        await socket.prepare(request)
+        self.sockets.add(socket)
+        
+        await socket.send_str(json.dumps({"op": GATEWAY_HELLO, "d": {"heartbeat_interval": 41250}, "s": None, "t": None}))
+        
+        try:
+            async for message in socket:
+                if message.type != WSMsgType.TEXT:
+                    continue
+                
+                payload = json.loads(message.data)
+                op = payload.get("op")
+                
+                if op == GATEWAY_HEARTBEAT:
+                    await socket.send_str(json.dumps({"op": GATEWAY_HEARTBEAT_ACK, "d": None}))
+                elif op in (GATEWAY_IDENTIFY, GATEWAY_RESUME):
+                    await self.send_ready(socket)
+                elif op == GATEWAY_REQUEST_MEMBERS:
+                    await self.send_member_chunks(socket, payload["d"])
+        finally:
+            self.sockets.discard(socket)
+        
+        return socket
+    
+    async def send_dispatch(self, socket, event, data):
+        self.sequence += 1
+        await socket.send_str(json.dumps({"op": GATEWAY_DISPATCH, "t": event, "s": self.sequence, "d": data}))
+    
+    async def send_ready(self, socket):
+        await self.send_dispatch(socket, "READY", {
+            "v": 10,
+            "user": self.bot_user,
+            "guilds": [{"id": guild["id"], "unavailable": True} for guild in self.guilds],
+            "session_id": "mock-session",
+            "resume_gateway_url": f"ws://{self.host}:{self.port}/gateway",
+            "shard": [0, 1],
+            "application": {"id": self.bot_user["id"], "flags": 0}
+        })
+        
+        for guild in self.guilds:
+            await self.send_dispatch(socket, "GUILD_CREATE", self.guild_create_payload(guild))
+        
+        self.connected.set()
+    
+    async def send_member_chunks(self, socket, data):
+        guild = self.guilds_by_id.get(str(data.get("guild_id")))
+        if guild:
+            await self.send_dispatch(socket, "GUILD_MEMBERS_CHUNK", {
+                "guild_id": guild["id"],
+                "members": guild["members"],
+                "chunk_index": 0,
+                "chunk_count": 1,
+                "nonce": data.get("nonce")
+            })
+    
+    # Event generation
+    
+    def pick_guild(self, skew):
+        if skew:
+            # Pareto-distributed: a handful of guilds get most of the traffic.
+            return self.guilds[min(int(self.random.paretovariate(skew)) - 1, len(self.guilds) - 1)]
+        return self.random.choice(self.guilds)
+    
+    def message_payload(self, guild, channel_id, message_id, member, content, edited=False):
+        return {
+            "id": message_id,
+            "channel_id": channel_id,
+            "guild_id": guild["id"],
+            "author": member["user"],
+            "member": {key: value for key, value in member.items() if key != "user"},
+            "content": content,
+            "timestamp": isoformat(time.time()),
+            "edited_timestamp": isoformat(time.time()) if edited else None,
+            "tts": False,
+            "mention_everyone": False,
+            "mentions": [],
+            "mention_roles": [],
+            "attachments": [],
+            "embeds": [],
+            "pinned": False,
+            "type": 0
+        }
+    
+    def generate_event(self, skew):
+        guild = self.pick_guild(skew)
+        roll = self.random.random()
+        member = self.random.choice(guild["members"][1:])
+        recent = self.recent_messages.setdefault(guild["id"], [])
+        
+        if roll < 0.1 and recent:
+            channel_id, message_id, author = recent[self.random.randrange(len(recent))]
+            return message_id, "MESSAGE_UPDATE", self.message_payload(
+                guild, channel_id, message_id, author, f"edited at {time.time():.3f}", edited=True
+            )
+        
+        if roll < 0.15 and recent:
+            channel_id, message_id, author = recent.pop(self.random.randrange(len(recent)))
+            return message_id, "MESSAGE_DELETE", {"id": message_id, "channel_id": channel_id, "guild_id": guild["id"]}
+        
+        if roll < 0.18:
+            role = self.random.choice(guild["roles"][1:])
+            roles = [] if member["roles"] else [role["id"]]
+            member["roles"] = roles
+            return member["user"]["id"], "GUILD_MEMBER_UPDATE", {
+                "guild_id": guild["id"], "user": member["user"], "roles": roles,
+                "joined_at": member["joined_at"], "deaf": False, "mute": False, "flags": 0
+            }
+        
+        if roll < 0.2:
+            user_id = member["user"]["id"]
+            current = guild["voice"].get(user_id)
+            channel_id = None if current else self.random.choice(guild["voice_channels"])["id"]
+            guild["voice"][user_id] = channel_id
+            return user_id, "VOICE_STATE_UPDATE", {
+                "guild_id": guild["id"], "channel_id": channel_id, "user_id": user_id, "member": member,
+                "session_id": "mock", "deaf": False, "mute": False, "self_deaf": False, "self_mute": False,
+                "self_video": False, "suppress": False, "request_to_speak_timestamp": None
+            }
+        
+        channel_id = self.random.choice(guild["text_channels"])["id"]
+        message_id = str(self.snowflakes.next())
+        recent.append((channel_id, message_id, member))
+        if len(recent) > 20:
+            recent.pop(0)
+        return message_id, "MESSAGE_CREATE", self.message_payload(
+            guild, channel_id, message_id, member, f"message {message_id} in {guild['name']}"
+        )
+    
+    async def generate(self, rate, duration, skew=1.2, tick=0.01):
+        # Dispatches `rate` events per second, in batches every `tick`.
+        await self.connected.wait()
+        socket = next(iter(self.sockets))
+        
+        start = time.perf_counter()
+        due = 0.0
+        while True:
+            elapsed = time.perf_counter() - start
+            if elapsed >= duration:
+                break
+            
+            target = int(elapsed * rate)
+            while due < target:
+                source_id, event, data = self.generate_event(skew)
+                self.dispatch_times[source_id] = time.perf_counter()
+                await self.send_dispatch(socket, event, data)
+                self.dispatched += 1
+                due += 1
+            
+            await asyncio.sleep(tick)
@@ -0,0 +1,253 @@
+"""
+Replays a gateway trace recorded with GATEWAY_TRACE_PATH into a real
+DiscordBot, at the recorded pace, N times faster or as fast as possible.
+The dispatches go through discord.py's own parsers, so the bot sees the
+same objects and caches it did in production; the REST side is stubbed.
+
+Guilds without a config in --config-dir get every log type routed to
+their first text channel, so each event does its full amount of work.
+
+Results are printed as JSON (and written with --output).
+
+Usage: python -m benchmarks.replay_trace TRACE [--speed 1|N|max]
+       [--config-dir DIR] [--latency MS] [--rate-limit SHARE] [--output FILE]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import discord
+
+from benchmarks.fakes import StubSender
+from bot.config import ConfigManager
+from bot.core import DiscordBot
+from bot.metrics import PIPELINE
+from bot.trace import read_trace
+
+LOG_TYPES = ('messages', 'edits', 'deletions', 'joins', 'leaves', 'roles', 'voice')
+
+# Messages the bot sends come back with this author.
+BOT_USER = {
+    "id": "1",
+    "username": "replay-bot",
+    "discriminator": "0",
+    "global_name": None,
+    "avatar": None,
+    "bot": True
+}
+
+AUDIT_LOG = {
+    "audit_log_entries": [], "users": [], "webhooks": [], "threads": [], "integrations": [],
+    "application_commands": [], "auto_moderation_rules": [], "guild_scheduled_events": []
+}
+
+class StubRest:
+    # Replaces HTTPClient.request. Sends and audit log lookups cost a
+    # simulated round trip; anything else succeeds with an empty body.
+    def __init__(self, sender):
+        self.sender = sender
+        self.next_id = 1 << 40
+        self.requests = {}
+    
+    async def request(self, route, *, files=None, form=None, **kwargs):
+        key = f"{route.method} {route.path}"
+        self.requests[key] = self.requests.get(key, 0) + 1
+        await self.sender.request()
+        
+        if route.method == "POST" and route.path.endswith("/messages"):
+            payload = kwargs.get("json") or {}
+            self.next_id += 1
+            self.sender.sent += 1
+            return {
+                "id": str(self.next_id),
+                "channel_id": str(route.channel_id),
+                "author": BOT_USER,
+                "content": payload.get("content") or "",
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "edited_timestamp": None,
+                "tts": False,
+                "mention_everyone": False,
+                "mentions": [],
+                "mention_roles": [],
+                "attachments": [],
+                "embeds": payload.get("embeds") or [],
+                "pinned": False,
+                "type": 0
+            }
+        
+        if route.path.endswith("/audit-logs"):
+            return AUDIT_LOG
+        
+        return {}
+
+class Replayer:
+    def __init__(self, bot, auto_route):
+        self.bot = bot
+        self.state = bot._connection
+        self.auto_route = auto_route
+        self.counts = {}
+        self.skipped = 0
+        self.errors = 0
+    
+    def feed(self, event, data):
+        self.counts[event] = self.counts.get(event, 0) + 1
+        
+        if event == "READY":
+            self.ready(data)
+            return
+        
+        parser = self.state.parsers.get(event)
+        if parser is None:
+            self.skipped += 1
+            return
+        
+        try:
+            parser(data)
+        except Exception as e:
+            self.errors += 1
+            if self.errors <= 10:
+                print(f"Error replaying {event}: {e!r}")
+            return
+        
+        if event == "GUILD_CREATE" and self.auto_route:
+            self.route_guild(int(data["id"]))
+    
+    def ready(self, data):
+        # Only what parse_ready does that the handlers rely on; the real one
+        # also starts the ready wait and guild chunking over the gateway.
+        self.state.user = user = discord.ClientUser(state=self.state, data=data["user"])
+        self.state._users[user.id] = user
+        for guild_data in data.get("guilds", []):
+            if not guild_data.get("unavailable"):
+                self.state._add_guild_from_data(guild_data)
+    
+    def route_guild(self, guild_id):
+        config_manager = self.bot.config_manager
+        if guild_id in config_manager.guild_configs:
+            return
+        if os.path.exists(config_manager.get_guild_config_path(guild_id)):
+            return
+        
+        guild = self.bot.get_guild(guild_id)
+        if guild is None or not guild.text_channels:
+            return
+        
+        config = config_manager.default_config.copy()
+        config['log_channels'] = {log_type: guild.text_channels[0].id for log_type in LOG_TYPES}
+        config_manager.guild_configs[guild_id] = config
+
+async def replay(replayer, path, speed):
+    start = time.perf_counter()
+    dispatched = 0
+    
+    for offset, event, data in read_trace(path):
+        if speed is not None:
+            delay = offset / speed - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        
+        replayer.feed(event, data)
+        dispatched += 1
+        
+        # Let the scheduled event tasks run, as the gateway read loop
+        # would between messages.
+        if speed is None and dispatched % 50 == 0:
+            await asyncio.sleep(0)
+    
+    return dispatched, time.perf_counter() - start
+
+async def run(args):
+    speed = None if args.speed == "max" else float(args.speed)
+    trace_path = os.path.abspath(args.trace)
+    config_dir = os.path.abspath(args.config_dir) if args.config_dir else None
+    
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as work_dir:
+        # The bot writes its snapshot and default config relative to the
+        # working directory.
+        os.chdir(work_dir)
+        try:
+            sender = StubSender(latency=args.latency / 1000, rate_limit_rate=args.rate_limit, seed=args.seed)
+            rest = StubRest(sender)
+            
+            bot = DiscordBot()
+            bot.config_manager = ConfigManager(config_dir or "config")
+            bot.http.request = rest.request
+            bot._connection._chunk_guilds = False
+            await bot._async_setup_hook()
+            await bot.setup_hook()
+            
+            replayer = Replayer(bot, auto_route=not args.no_auto_route)
+            
+            start_cpu = time.process_time()
+            dispatched, elapsed = await replay(replayer, trace_path, speed)
+            await asyncio.sleep(0)
+            drain_start = time.perf_counter()
+            flushed, remaining = await bot.dispatcher.drain(args.timeout)
+            drain = time.perf_counter() - drain_start
+            cpu = time.process_time() - start_cpu
+            
+            PIPELINE.fold()
+            handler_p50, handler_p99 = PIPELINE.total.handler_latency.percentiles((0.5, 0.99))
+            dispatcher_stats = bot.dispatcher.get_stats()
+            await bot.close()
+        finally:
+            os.chdir(cwd)
+    
+    return {
+        "python": platform.python_version(),
+        "settings": {
+            "trace": args.trace,
+            "speed": args.speed,
+            "latency_ms": args.latency,
+            "rate_limit": args.rate_limit
+        },
+        "dispatches": dispatched,
+        "events": dict(sorted(replayer.counts.items(), key=lambda item: item[1], reverse=True)),
+        "skipped": replayer.skipped,
+        "errors": replayer.errors,
+        "handled": dispatcher_stats["processed"],
+        "left_in_queue": remaining,
+        "embeds_sent": sender.sent,
+        "rest_requests": sum(rest.requests.values()),
+        "replay_s": round(elapsed, 3),
+        "drain_s": round(drain, 3),
+        "dispatches_per_s": round(dispatched / (elapsed + drain), 1) if dispatched else None,
+        "cpu_us_per_dispatch": round(cpu / dispatched * 1e6, 1) if dispatched else None,
+        "handler_p50_ms": round(handler_p50 * 1000, 3) if handler_p50 is not None else None,
+        "handler_p99_ms": round(handler_p99 * 1000, 3) if handler_p99 is not None else None
+    }
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Replay a recorded gateway trace into the bot")
+    parser.add_argument("trace", help="trace file written with GATEWAY_TRACE_PATH")
+    parser.add_argument("--speed", default="max", help="1 for the recorded pace, N for N times faster, or max")
+    parser.add_argument("--config-dir", help="guild configs to use instead of routing every log type to "
+                        "the guild's first text channel")
+    parser.add_argument("--no-auto-route", action="store_true", help="leave guilds without a config unrouted")
+    parser.add_argument("--latency", type=float, default=0.0, help="mean simulated REST latency in ms")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="share of requests that hit a 429 first")
+    parser.add_argument("--timeout", type=float, default=300.0, help="seconds to wait for the queues to drain")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    results = asyncio.run(run(args))
+    
+    output = json.dumps(results, indent=2)
+    print(output)
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + "\n")
+
+if __name__ == "__main__":
+    main()
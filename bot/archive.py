@@ -0,0 +1,319 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+
+import aiohttp
+import discord
+
+from .metrics import ATTACHMENTS_ARCHIVED
+
+CHUNK_SIZE = 64 * 1024
+# Discord does not accept more files than this in one message.
+MAX_UPLOAD_FILES = 10
+MAX_ARCHIVE_QUOTA_MB = 10240
+
+class ArchivedAttachment:
+    __slots__ = ("attachment_id", "message_id", "guild_id", "digest", "filename", "size")
+    
+    def __init__(self, attachment_id, message_id, guild_id, digest, filename, size):
+        self.attachment_id = attachment_id
+        self.message_id = message_id
+        self.guild_id = guild_id
+        self.digest = digest
+        self.filename = filename
+        self.size = size
+    
+    def to_record(self):
+        return ["add", self.attachment_id, self.message_id, self.guild_id, self.digest, self.filename, self.size]
+
+class AttachmentArchiver:
+    # Downloads attachments of new messages in guilds that turned archiving
+    # on, while their CDN links still work, so a deleted message's files can
+    # be re-uploaded with its log entry. Files are stored once under their
+    # SHA-256 however many messages carry them; each guild's quota counts
+    # every attachment it keeps, and the oldest go first when it is full.
+    def __init__(self, bot, root="data/attachments", concurrency=4, queue_size=500, max_file_size=25 * 1024 * 1024):
+        self.bot = bot
+        self.root = root
+        self.concurrency = max(1, concurrency)
+        self.queue_size = queue_size
+        self.max_file_size = max_file_size
+        self.index_path = os.path.join(root, "index.jsonl")
+        self.logger = logging.getLogger(__name__)
+        
+        self.queue = None
+        self.workers = []
+        self.session = None
+        self.index_file = None
+        
+        # attachment id -> entry, per guild in the order they were stored.
+        self.guild_entries = {}
+        self.guild_usage = {}
+        self.by_message = {}
+        self.references = {}
+        # message id -> attachments queued or downloading, and the messages
+        # among them that were deleted before their downloads finished.
+        self.in_flight = {}
+        self.released = set()
+    
+    def is_enabled(self, guild_id):
+        config = self.bot.config_manager.get_guild_config(guild_id)
+        return config.get('archive_attachments', False)
+    
+    def get_quota(self, guild_id):
+        config = self.bot.config_manager.get_guild_config(guild_id)
+        return int(config.get('archive_quota_mb', 100)) * 1024 * 1024
+    
+    def start(self):
+        if self.workers:
+            return
+        
+        os.makedirs(os.path.join(self.root, "tmp"), exist_ok=True)
+        self.load_index()
+        self.index_file = open(self.index_path, 'a', encoding='utf-8')
+        
+        self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=120, sock_read=30))
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self.workers = [
+            asyncio.create_task(self.run_worker(), name=f"attachment-archiver-{index}")
+            for index in range(self.concurrency)
+        ]
+    
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        
+        if self.session:
+            await self.session.close()
+            self.session = None
+        if self.index_file:
+            self.index_file.close()
+            self.index_file = None
+    
+    def submit(self, message):
+        if not self.workers or not message.attachments:
+            return
+        
+        guild_id = message.guild.id
+        quota = self.get_quota(guild_id)
+        
+        for attachment in message.attachments:
+            if attachment.id in self.guild_entries.get(guild_id, ()):
+                continue
+            if attachment.size > self.max_file_size or attachment.size > quota:
+                ATTACHMENTS_ARCHIVED.labels("too_large").inc()
+                continue
+            
+            try:
+                self.queue.put_nowait((attachment, message.id, guild_id))
+            except asyncio.QueueFull:
+                # Downloads are falling behind; skipping keeps the event
+                # handlers from waiting on them.
+                ATTACHMENTS_ARCHIVED.labels("dropped").inc()
+                continue
+            self.in_flight[message.id] = self.in_flight.get(message.id, 0) + 1
+    
+    async def run_worker(self):
+        while True:
+            attachment, message_id, guild_id = await self.queue.get()
+            try:
+                result = await self.archive(attachment, message_id, guild_id)
+                ATTACHMENTS_ARCHIVED.labels(result).inc()
+            except Exception as e:
+                ATTACHMENTS_ARCHIVED.labels("failed").inc()
+                self.logger.warning(f"Could not archive attachment {attachment.id} in guild {guild_id}: {e}")
+            finally:
+                self.finish_download(message_id)
+                self.queue.task_done()
+    
+    def finish_download(self, message_id):
+        remaining = self.in_flight.get(message_id, 0) - 1
+        if remaining > 0:
+            self.in_flight[message_id] = remaining
+        else:
+            self.in_flight.pop(message_id, None)
+            self.released.discard(message_id)
+    
+    async def archive(self, attachment, message_id, guild_id):
+        temp_path = os.path.join(self.root, "tmp", str(attachment.id))
+        hasher = hashlib.sha256()
+        size = 0
+        f = None
+        
+        # File operations run in a thread so a slow disk does not stall
+        # the event loop.
+        try:
+            async with self.session.get(attachment.url) as response:
+                if response.status != 200:
+                    return "failed"
+                
+                f = await asyncio.to_thread(open, temp_path, 'wb')
+                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                    size += len(chunk)
+                    # The reported size is only metadata; stop at the limit.
+                    if size > self.max_file_size:
+                        return "too_large"
+                    hasher.update(chunk)
+                    await asyncio.to_thread(f.write, chunk)
+            
+            digest = hasher.hexdigest()
+            result = await asyncio.to_thread(self.store_file, f, temp_path, digest)
+        finally:
+            await asyncio.to_thread(self.discard_temp_file, f, temp_path)
+        
+        entry = ArchivedAttachment(attachment.id, message_id, guild_id, digest, attachment.filename, size)
+        self.add_entry(entry)
+        self.write_record(entry.to_record())
+        if message_id in self.released:
+            # Deleted while this was downloading, after release() ran.
+            self.release(message_id)
+        else:
+            self.enforce_quota(guild_id)
+        return result
+    
+    def store_file(self, f, temp_path, digest):
+        f.close()
+        path = self.get_path(digest)
+        if os.path.exists(path):
+            return "duplicate"
+        
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_path, path)
+        return "stored"
+    
+    def discard_temp_file(self, f, temp_path):
+        if f:
+            f.close()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    
+    def get_path(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+    
+    def add_entry(self, entry):
+        self.guild_entries.setdefault(entry.guild_id, {})[entry.attachment_id] = entry
+        self.guild_usage[entry.guild_id] = self.guild_usage.get(entry.guild_id, 0) + entry.size
+        self.by_message.setdefault(entry.message_id, []).append(entry)
+        self.references[entry.digest] = self.references.get(entry.digest, 0) + 1
+    
+    def remove_entry(self, entry):
+        entries = self.guild_entries.get(entry.guild_id)
+        if not entries or entries.pop(entry.attachment_id, None) is None:
+            return
+        if not entries:
+            del self.guild_entries[entry.guild_id]
+        
+        self.guild_usage[entry.guild_id] -= entry.size
+        if not self.guild_usage[entry.guild_id]:
+            del self.guild_usage[entry.guild_id]
+        
+        message_entries = self.by_message.get(entry.message_id)
+        if message_entries:
+            message_entries.remove(entry)
+            if not message_entries:
+                del self.by_message[entry.message_id]
+        
+        self.references[entry.digest] -= 1
+        if not self.references[entry.digest]:
+            del self.references[entry.digest]
+            try:
+                os.remove(self.get_path(entry.digest))
+            except FileNotFoundError:
+                pass
+    
+    def enforce_quota(self, guild_id):
+        quota = self.get_quota(guild_id)
+        entries = self.guild_entries.get(guild_id)
+        
+        while entries and self.guild_usage.get(guild_id, 0) > quota:
+            oldest = next(iter(entries.values()))
+            self.remove_entry(oldest)
+            self.write_record(["remove", oldest.attachment_id, oldest.guild_id])
+            ATTACHMENTS_ARCHIVED.labels("evicted").inc()
+            entries = self.guild_entries.get(guild_id)
+    
+    def get_files(self, message):
+        # Files for a deleted message's log entry, as many as the guild's
+        # upload limit allows.
+        limit = getattr(message.guild, 'filesize_limit', self.max_file_size)
+        files = []
+        
+        for entry in self.by_message.get(message.id, [])[:MAX_UPLOAD_FILES]:
+            path = self.get_path(entry.digest)
+            if entry.size <= limit and os.path.exists(path):
+                files.append(discord.File(path, filename=entry.filename))
+        
+        return files
+    
+    def release(self, message_id):
+        if message_id in self.in_flight:
+            self.released.add(message_id)
+        
+        for entry in list(self.by_message.get(message_id, [])):
+            self.remove_entry(entry)
+            self.write_record(["remove", entry.attachment_id, entry.guild_id])
+    
+    def write_record(self, record):
+        if not self.index_file:
+            return
+        
+        try:
+            self.index_file.write(json.dumps(record, separators=(',', ':')) + "\n")
+            self.index_file.flush()
+        except OSError as e:
+            self.logger.error(f"Error writing attachment index: {e}")
+    
+    def load_index(self):
+        # The index is an append-only log of additions and removals;
+        # loading replays it and writes back only what is still kept.
+        if not os.path.exists(self.index_path):
+            return
+        
+        start = time.perf_counter()
+        entries = {}
+        
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    
+                    if record[0] == "add":
+                        entries[record[1]] = ArchivedAttachment(*record[1:])
+                    elif record[0] == "remove":
+                        entries.pop(record[1], None)
+        except Exception as e:
+            self.logger.error(f"Error loading attachment index {self.index_path}: {e}")
+            return
+        
+        for entry in entries.values():
+            if os.path.exists(self.get_path(entry.digest)):
+                self.add_entry(entry)
+        
+        temp_path = f"{self.index_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for guild_entries in self.guild_entries.values():
+                for entry in guild_entries.values():
+                    f.write(json.dumps(entry.to_record(), separators=(',', ':')) + "\n")
+        os.replace(temp_path, self.index_path)
+        
+        elapsed = time.perf_counter() - start
+        self.logger.info(
+            f"Loaded attachment index: {sum(len(entries) for entries in self.guild_entries.values())} attachments, "
+            f"{len(self.references)} files in {elapsed * 1000:.1f}ms"
+        )
+    
+    def get_stats(self):
+        return {
+            "attachments": sum(len(entries) for entries in self.guild_entries.values()),
+            "files": len(self.references),
+            "bytes": sum(self.guild_usage.values()),
+            "queued": self.queue.qsize() if self.queue else 0
+        }
@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+
+import discord
+
+from .utils import create_embed
+
+ALERT_INTERVAL = 60 * 60
+# What the bot needs in a log channel to post an embed there.
+REQUIRED_PERMISSIONS = ("view_channel", "send_messages", "embed_links")
+
+class LogChannelCache:
+    # Resolved log channels per guild, with whether the bot can post embeds
+    # there worked out once instead of failing a send per event. Entries are
+    # keyed by channel id, so a config change simply misses; channel, role
+    # and bot member changes drop a guild's entries. A channel that is gone
+    # or unusable is reported once when it is resolved, and its events are
+    # dropped before an embed is built.
+    def __init__(self, bot):
+        self.bot = bot
+        self.guilds = {}
+        self.alerted = {}
+        self.alerts = set()
+        self.logger = logging.getLogger(__name__)
+    
+    def resolve(self, guild_id, channel_id):
+        channels = self.guilds.get(guild_id)
+        if channels is None:
+            channels = self.guilds[guild_id] = {}
+        elif channel_id in channels:
+            return channels[channel_id]
+        
+        channel = self.bot.get_channel(channel_id)
+        if channel is None:
+            self.report(guild_id, channel_id, "the channel no longer exists")
+        else:
+            me = channel.guild.me
+            if me is None:
+                # Not known yet right after connecting; check again later.
+                return channel
+            
+            permissions = channel.permissions_for(me)
+            missing = [name for name in REQUIRED_PERMISSIONS if not getattr(permissions, name)]
+            if missing:
+                names = ", ".join(name.replace('_', ' ').title() for name in missing)
+                self.report(guild_id, channel_id, f"the bot is missing {names}")
+                channel = None
+        
+        channels[channel_id] = channel
+        return channel
+    
+    def invalidate(self, guild_id):
+        self.guilds.pop(guild_id, None)
+    
+    def report(self, guild_id, channel_id, reason):
+        # At most one alert per log channel an hour, however often its
+        # entries are invalidated and resolved again.
+        now = time.monotonic()
+        if now - self.alerted.get(channel_id, -ALERT_INTERVAL) < ALERT_INTERVAL:
+            return
+        self.alerted[channel_id] = now
+        
+        self.logger.warning(f"Cannot log to channel {channel_id} in guild {guild_id}: {reason}")
+        
+        guild = self.bot.get_guild(guild_id)
+        channel = self.get_alert_channel(guild, channel_id)
+        if channel:
+            task = asyncio.create_task(self.send_alert(channel, channel_id, reason), name="log-channel-alert")
+            self.alerts.add(task)
+            task.add_done_callback(self.alerts.discard)
+    
+    def get_alert_channel(self, guild, failed_channel_id):
+        if guild is None or guild.me is None:
+            return None
+        
+        config = self.bot.config_manager.get_guild_config(guild.id)
+        candidates = [
+            self.bot.get_channel(config.get('log_channels', {}).get('default') or 0),
+            guild.public_updates_channel,
+            guild.system_channel
+        ]
+        for channel in candidates:
+            if channel and channel.id != failed_channel_id and channel.permissions_for(guild.me).send_messages:
+                return channel
+        return None
+    
+    async def send_alert(self, channel, failed_channel_id, reason):
+        embed = create_embed(
+            title="Log Delivery Failed",
+            description=f"Log entries for <#{failed_channel_id}> could not be delivered: {reason}. "
+                        f"Check that the bot can view, send messages and embed links there, or pick "
+                        f"another channel with `log channel`.",
+            color=discord.Color.red(),
+            timestamp=datetime.utcnow()
+        )
+        try:
+            await channel.send(embed=embed)
+        except discord.HTTPException as e:
+            self.logger.error(f"Failed to send log delivery alert to channel {channel.id}: {e}")
+    
+    def get_size(self):
+        return sum(len(channels) for channels in self.guilds.values())
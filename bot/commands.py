@@ -1,12 +1,64 @@
 import discord
 from discord.ext import commands
+import asyncio
 import json
 import logging
+import time
+from datetime import datetime, timezone
+from .archive import MAX_ARCHIVE_QUOTA_MB
+from .filters import IGNORE_KINDS, MAX_IGNORE_RULES, check_pattern
+from .log_stats import LogAnalyzer
+from .metrics import PIPELINE
+from .ratelimit import ScopedRateLimiter
+from .utils import format_file_size
+from .webhooks import MAX_WEBHOOKS_PER_CHANNEL
+
+# ignore/unignore argument -> key in the "ignore" config and converter for it.
+IGNORE_TARGETS = {
+    "channel": ("channels", commands.GuildChannelConverter),
+    "user": ("users", commands.UserConverter),
+    "role": ("roles", commands.RoleConverter),
+    "pattern": ("patterns", None)
+}
+
+# (requests, seconds) allowed per user, per guild and per command in a guild.
+COMMAND_RATE_LIMITS = {
+    "user": (5, 10),
+    "guild": (20, 10),
+    "command": (10, 10)
+}
 
 class CommandHandler(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.logger = logging.getLogger(__name__)
+        self.log_analyzer = None
+        self.log_stats_lock = asyncio.Lock()
+        self.rate_limiter = ScopedRateLimiter(COMMAND_RATE_LIMITS, max_keys=100000)
+    
+    async def cog_before_invoke(self, ctx):
+        ctx.invoked_at = time.perf_counter()
+        
+        # Runs after the command's permission checks, so members cannot use
+        # up the server's allowance with commands they are not allowed to run.
+        guild_id = ctx.guild.id if ctx.guild else 0
+        self.rate_limiter.acquire({
+            "user": ctx.author.id,
+            "guild": guild_id,
+            "command": (guild_id, ctx.command.qualified_name)
+        })
+    
+    async def cog_after_invoke(self, ctx):
+        if not self.bot.bot_logger:
+            return
+        
+        latency_ms = (time.perf_counter() - ctx.invoked_at) * 1000
+        self.bot.bot_logger.log_command(
+            ctx,
+            ctx.command.qualified_name,
+            success=not ctx.command_failed,
+            latency_ms=latency_ms
+        )
     
     @commands.group(name="log", invoke_without_command=True)
     @commands.has_permissions(administrator=True)
@@ -26,7 +78,14 @@ class CommandHandler(commands.Cog):
             value="`log setup` - Initial setup wizard\n"
                   "`log status` - Show current configuration\n"
                   "`log toggle <feature>` - Toggle logging features\n"
-                  "`log prefix <prefix>` - Set command prefix",
+                  "`log prefix <prefix>` - Set command prefix\n"
+                  "`log delivery <channel|webhook> [webhooks]` - How log messages are sent\n"
+                  "`log archive <on|off> [quota_mb]` - Keep copies of attachments for deletion logs\n"
+                  "`log duplicates <on|off> [seconds]` - Collapse repeated messages into one entry\n"
+                  "`log digest <auto|always|off> [per_minute]` - Summarize messages when they arrive too fast\n"
+                  "`log reports <daily|weekly|off> [channel] [hour]` - Schedule activity reports\n"
+                  "`log ignore <channel|user|role|pattern|list> [value]` - Stop logging matching events\n"
+                  "`log unignore <channel|user|role|pattern> <value>` - Remove an ignore rule",
             inline=False
         )
         
@@ -38,6 +97,22 @@ class CommandHandler(commands.Cog):
             inline=False
         )
         
+        embed.add_field(
+            name="Diagnostics",
+            value="`log metrics` - Live event rates, latency and drops for the last minute\n"
+                  "`log report [day|week]` - Activity report for today or the last 7 days",
+            inline=False
+        )
+        
+        embed.add_field(
+            name="Diagnostics (Bot Owner)",
+            value="`log stats` - Volume and error analytics from the bot's log files\n"
+                  "`log stats reset` - Forget collected log analytics\n"
+                  "`log profile [seconds] [cpu|memory|all]` - Profile the running bot\n"
+                  "`log memory [stop]` - Allocation diff since the previous call",
+            inline=False
+        )
+        
         embed.add_field(
             name="Log Types",
             value="messages, edits, deletions, joins, leaves, roles, voice, default",
@@ -277,6 +352,459 @@ class CommandHandler(commands.Cog):
         
         await ctx.send(f"✅ Command prefix set to `{prefix}`")
     
+    @log_group.command(name="delivery")
+    @commands.has_permissions(administrator=True)
+    async def log_delivery(self, ctx, mode: str, webhooks: int = None):
+        mode = mode.lower()
+        if mode not in ('channel', 'webhook'):
+            await ctx.send("Invalid delivery mode. Valid options: channel, webhook")
+            return
+        
+        if webhooks is not None and not 1 <= webhooks <= MAX_WEBHOOKS_PER_CHANNEL:
+            await ctx.send(f"Webhooks per channel must be between 1 and {MAX_WEBHOOKS_PER_CHANNEL}.")
+            return
+        
+        config = self.bot.config_manager.get_guild_config(ctx.guild.id)
+        config['log_delivery'] = mode
+        if webhooks is not None:
+            config['webhooks_per_channel'] = webhooks
+        self.bot.config_manager.save_guild_config(ctx.guild.id, config)
+        
+        if mode == 'webhook':
+            count = config.get('webhooks_per_channel', 2)
+            await ctx.send(
+                f"✅ Logs will be sent in batches through up to {count} webhooks per log channel. "
+                f"The bot needs the Manage Webhooks permission there; without it, logs are sent as the bot."
+            )
+        else:
+            await ctx.send("✅ Logs will be sent as the bot, one message per event.")
+    
+    @log_group.command(name="archive")
+    @commands.has_permissions(administrator=True)
+    async def log_archive(self, ctx, state: str, quota_mb: int = None):
+        if state.lower() not in ('on', 'off'):
+            await ctx.send("Invalid option. Valid options: on, off")
+            return
+        
+        if quota_mb is not None and not 1 <= quota_mb <= MAX_ARCHIVE_QUOTA_MB:
+            await ctx.send(f"Quota must be between 1 and {MAX_ARCHIVE_QUOTA_MB} MB.")
+            return
+        
+        config = self.bot.config_manager.get_guild_config(ctx.guild.id)
+        config['archive_attachments'] = state.lower() == 'on'
+        if quota_mb is not None:
+            config['archive_quota_mb'] = quota_mb
+        self.bot.config_manager.save_guild_config(ctx.guild.id, config)
+        
+        if config['archive_attachments']:
+            await ctx.send(
+                f"✅ Attachments of new messages will be archived (up to {config.get('archive_quota_mb', 100)} MB, "
+                f"oldest removed first) and re-uploaded when the message is deleted."
+            )
+        else:
+            await ctx.send("✅ Attachment archiving has been **disabled**.")
+    
+    @log_group.command(name="duplicates")
+    @commands.has_permissions(administrator=True)
+    async def log_duplicates(self, ctx, state: str, seconds: float = None):
+        if state.lower() not in ('on', 'off'):
+            await ctx.send("Invalid option. Valid options: on, off")
+            return
+        
+        if seconds is not None and not 1 <= seconds <= 300:
+            await ctx.send("Window must be between 1 and 300 seconds.")
+            return
+        
+        config = self.bot.config_manager.get_guild_config(ctx.guild.id)
+        config['collapse_duplicates'] = state.lower() == 'on'
+        if seconds is not None:
+            config['duplicate_window'] = seconds
+        self.bot.config_manager.save_guild_config(ctx.guild.id, config)
+        
+        if config['collapse_duplicates']:
+            await ctx.send(
+                f"✅ Repeated messages from the same author in the same channel within "
+                f"{config.get('duplicate_window', 10):g}s will be logged once, with a count when they stop."
+            )
+        else:
+            await ctx.send("✅ Duplicate collapsing has been **disabled**; every message is logged.")
+    
+    @log_group.command(name="digest")
+    @commands.has_permissions(administrator=True)
+    async def log_digest(self, ctx, mode: str, per_minute: int = None):
+        mode = mode.lower()
+        if mode not in ('auto', 'always', 'off'):
+            await ctx.send("Invalid option. Valid options: auto, always, off")
+            return
+        
+        if per_minute is not None and not 10 <= per_minute <= 100000:
+            await ctx.send("Threshold must be between 10 and 100000 messages per minute.")
+            return
+        
+        config = self.bot.config_manager.get_guild_config(ctx.guild.id)
+        config['digest_mode'] = mode
+        if per_minute is not None:
+            config['digest_threshold'] = per_minute
+        self.bot.config_manager.save_guild_config(ctx.guild.id, config)
+        
+        interval = config.get('digest_interval', 60)
+        if mode == 'auto':
+            await ctx.send(
+                f"✅ Above {config.get('digest_threshold', 300)} messages per minute, new messages will be "
+                f"summarized every {interval}s instead of logged one by one."
+            )
+        elif mode == 'always':
+            await ctx.send(f"✅ New messages will always be summarized every {interval}s.")
+        else:
+            await ctx.send("✅ Digest mode has been **disabled**; every message is logged individually.")
+    
+    @log_group.command(name="reports")
+    @commands.has_permissions(administrator=True)
+    async def log_reports(self, ctx, schedule: str, channel: discord.TextChannel = None, hour: int = None):
+        schedule = schedule.lower()
+        if schedule not in ('daily', 'weekly', 'off'):
+            await ctx.send("Invalid option. Valid options: daily, weekly, off")
+            return
+        
+        if hour is not None and not 0 <= hour <= 23:
+            await ctx.send("Hour must be between 0 and 23 (UTC).")
+            return
+        
+        config = self.bot.config_manager.get_guild_config(ctx.guild.id)
+        if schedule != 'off' and not channel and not config.get('report_channel'):
+            await ctx.send("Please give a channel to post the reports in.")
+            return
+        
+        config['report_schedule'] = schedule
+        if channel:
+            config['report_channel'] = channel.id
+        if hour is not None:
+            config['report_hour'] = hour
+        self.bot.config_manager.save_guild_config(ctx.guild.id, config)
+        
+        if schedule == 'off':
+            await ctx.send("✅ Scheduled activity reports have been **disabled**.")
+            return
+        
+        when = "every day" if schedule == 'daily' else "every Monday"
+        await ctx.send(
+            f"✅ Activity reports will be posted in <#{config['report_channel']}> {when} "
+            f"at {config.get('report_hour', 0):02d}:00 UTC."
+        )
+    
+    @log_group.command(name="report")
+    @commands.has_permissions(administrator=True)
+    async def log_report(self, ctx, period: str = "week"):
+        period = period.lower()
+        if period not in ('day', 'week'):
+            await ctx.send("Invalid period. Valid options: day, week")
+            return
+        
+        today = datetime.now(timezone.utc).date().toordinal()
+        first_day = today if period == 'day' else today - 6
+        await ctx.send(embed=self.bot.rollup.build_report(ctx.guild.id, first_day, today))
+    
+    async def get_ignore_value(self, ctx, kind, value):
+        converter = IGNORE_TARGETS[kind][1]
+        if converter is None:
+            return value
+        if value.isdigit():
+            # A bare id also covers channels, users and roles that are gone.
+            return int(value)
+        return (await converter().convert(ctx, value)).id
+    
+    def format_ignore_rules(self, rules):
+        lines = []
+        for kind in IGNORE_KINDS:
+            for value in rules.get(kind, []):
+                if kind == 'channels':
+                    lines.append(f"Channel: <#{value}>")
+                elif kind == 'users':
+                    lines.append(f"User: <@{value}>")
+                elif kind == 'roles':
+                    lines.append(f"Role: <@&{value}>")
+                else:
+                    lines.append(f"Pattern: `{value}`")
+        return lines
+    
+    @log_group.command(name="ignore")
+    @commands.has_permissions(administrator=True)
+    async def log_ignore(self, ctx, kind: str, *, value: str = None):
+        kind = kind.lower()
+        config = self.bot.config_manager.get_guild_config(ctx.guild.id)
+        rules = config.get('ignore') or {}
+        
+        if kind == 'list':
+            lines = self.format_ignore_rules(rules)
+            if not lines:
+                await ctx.send("No ignore rules are set; every event is logged.")
+                return
+            
+            text = "\n".join(lines[:50])
+            if len(lines) > 50:
+                text += f"\n... and {len(lines) - 50} more"
+            embed = discord.Embed(title="Ignore Rules", description=text, color=discord.Color.blue())
+            await ctx.send(embed=embed)
+            return
+        
+        if kind not in IGNORE_TARGETS:
+            await ctx.send("Invalid option. Valid options: channel, user, role, pattern, list")
+            return
+        
+        if not value:
+            await ctx.send(f"Please give the {kind} to ignore.")
+            return
+        
+        try:
+            value = await self.get_ignore_value(ctx, kind, value)
+        except commands.BadArgument as e:
+            await ctx.send(f"❌ {e}")
+            return
+        
+        if kind == 'pattern':
+            error = check_pattern(value)
+            if error:
+                await ctx.send(f"❌ Invalid pattern: {error}")
+                return
+        
+        if sum(len(rules.get(key, [])) for key in IGNORE_KINDS) >= MAX_IGNORE_RULES:
+            await ctx.send(f"A server can have at most {MAX_IGNORE_RULES} ignore rules.")
+            return
+        
+        key = IGNORE_TARGETS[kind][0]
+        if value in rules.get(key, []):
+            await ctx.send(f"That {kind} is already ignored.")
+            return
+        
+        # A new dict rather than an edit in place, so the compiled rules
+        # see the change.
+        rules = {name: list(rules.get(name, [])) for name in IGNORE_KINDS}
+        rules[key].append(value)
+        config['ignore'] = rules
+        self.bot.config_manager.save_guild_config(ctx.guild.id, config)
+        
+        await ctx.send(f"✅ Events matching this {kind} will no longer be logged.")
+    
+    @log_group.command(name="unignore")
+    @commands.has_permissions(administrator=True)
+    async def log_unignore(self, ctx, kind: str, *, value: str):
+        kind = kind.lower()
+        if kind not in IGNORE_TARGETS:
+            await ctx.send("Invalid option. Valid options: channel, user, role, pattern")
+            return
+        
+        try:
+            value = await self.get_ignore_value(ctx, kind, value)
+        except commands.BadArgument as e:
+            await ctx.send(f"❌ {e}")
+            return
+        
+        config = self.bot.config_manager.get_guild_config(ctx.guild.id)
+        rules = config.get('ignore') or {}
+        key = IGNORE_TARGETS[kind][0]
+        if value not in rules.get(key, []):
+            await ctx.send(f"That {kind} is not ignored.")
+            return
+        
+        rules = {name: list(rules.get(name, [])) for name in IGNORE_KINDS}
+        rules[key].remove(value)
+        config['ignore'] = rules
+        self.bot.config_manager.save_guild_config(ctx.guild.id, config)
+        
+        await ctx.send(f"✅ Events matching this {kind} will be logged again.")
+    
+    @log_group.command(name="stats")
+    @commands.is_owner()
+    async def log_stats(self, ctx, action: str = None):
+        if not self.bot.bot_logger:
+            await ctx.send("File logging is not enabled.")
+            return
+        
+        if self.log_analyzer is None:
+            self.log_analyzer = LogAnalyzer(self.bot.bot_logger.log_dir)
+        analyzer = self.log_analyzer
+        
+        async with self.log_stats_lock:
+            if action and action.lower() == "reset":
+                await asyncio.to_thread(analyzer.reset)
+                await ctx.send("✅ Log analytics have been reset.")
+                return
+            
+            read_bytes = await asyncio.to_thread(analyzer.update)
+            file_stats = await asyncio.to_thread(self.bot.bot_logger.get_log_stats)
+            
+            # Built before the lock is released: another `log stats` or a
+            # reset would change the analyzer's counters under it.
+            embed = discord.Embed(
+                title="Log Analytics",
+                color=discord.Color.blue()
+            )
+            
+            embed.add_field(
+                name="Files",
+                value="\n".join(
+                    f"{log_file}: {format_file_size(stats['size'])} "
+                    f"(+{stats['segments']} archived, {format_file_size(stats['segments_size'])})"
+                    for log_file, stats in file_stats.items()
+                ),
+                inline=False
+            )
+            
+            guild_lines = []
+            for guild_id, counts in analyzer.get_top_guilds():
+                guild = self.bot.get_guild(int(guild_id))
+                guild_lines.append(
+                    f"{guild.name if guild else guild_id}: {counts['events']} events, "
+                    f"{counts['commands']} commands, {analyzer.get_error_rate(counts):.1%} errors"
+                )
+            
+            if guild_lines:
+                embed.add_field(
+                    name="Top Guilds",
+                    value="\n".join(guild_lines),
+                    inline=False
+                )
+            
+            if analyzer.events:
+                embed.add_field(
+                    name="Event Types",
+                    value="\n".join(f"{name}: {count}" for name, count in analyzer.events.most_common(5)),
+                    inline=True
+                )
+            
+            if analyzer.commands:
+                embed.add_field(
+                    name="Commands",
+                    value="\n".join(
+                        f"{name}: {count} ({analyzer.failed_commands[name]} failed)"
+                        for name, count in analyzer.commands.most_common(5)
+                    ),
+                    inline=True
+                )
+            
+            if analyzer.errors:
+                embed.add_field(
+                    name="Errors",
+                    value="\n".join(f"{context}: {count}" for context, count in analyzer.errors.most_common(5)),
+                    inline=True
+                )
+            
+            if analyzer.command_users:
+                embed.add_field(
+                    name="Top Command Users",
+                    value="\n".join(f"<@{user_id}>: {count}" for user_id, count in analyzer.command_users.most_common(5)),
+                    inline=True
+                )
+            
+            embed.set_footer(text=f"Read {format_file_size(read_bytes)} of new log data | {analyzer.lines} lines analysed")
+        
+        await ctx.send(embed=embed)
+    
+    @log_group.command(name="profile")
+    @commands.is_owner()
+    async def log_profile(self, ctx, seconds: float = 30, mode: str = "all"):
+        mode = mode.lower()
+        if mode not in ("cpu", "memory", "all"):
+            await ctx.send("Invalid mode. Valid options: cpu, memory, all")
+            return
+        
+        if not seconds > 0:
+            await ctx.send("Duration must be more than 0 seconds.")
+            return
+        
+        profiler = self.bot.profiler
+        if profiler.active:
+            await ctx.send("A profile is already running.")
+            return
+        
+        await ctx.send(f"⏱️ Profiling for {seconds:g} seconds...")
+        path = await profiler.run(seconds, cpu=mode != "memory", memory=mode != "cpu")
+        
+        if path:
+            await ctx.send(f"✅ Profile written to `{path}`")
+        else:
+            await ctx.send("A profile is already running.")
+    
+    @log_group.command(name="memory")
+    @commands.is_owner()
+    async def log_memory(self, ctx, action: str = None):
+        profiler = self.bot.profiler
+        
+        if action and action.lower() == "stop":
+            profiler.stop_memory_tracing()
+            await ctx.send("✅ Allocation tracing stopped.")
+            return
+        
+        path = await profiler.snapshot_memory()
+        if path:
+            await ctx.send(f"✅ Allocation diff written to `{path}`")
+        else:
+            await ctx.send("✅ Allocation tracing started. Run `log memory` again to see what changed.")
+    
+    def format_latency(self, histogram):
+        p50, p99 = histogram.percentiles((0.5, 0.99))
+        if p50 is None:
+            return "no samples"
+        return f"p50 {p50 * 1000:.1f}ms / p99 {p99 * 1000:.1f}ms"
+    
+    def format_window_stats(self, stats):
+        return (
+            f"Events: {stats.events.rate() * 60:.0f}/min\n"
+            f"Handler: {self.format_latency(stats.handler_latency)}\n"
+            f"Send: {self.format_latency(stats.send_latency)}\n"
+            f"Send queue: {self.format_latency(stats.send_wait)}\n"
+            f"Dropped: {stats.dropped.total()} | Failed sends: {stats.failed.total()}"
+        )
+    
+    @log_group.command(name="metrics")
+    @commands.has_permissions(administrator=True)
+    async def log_metrics(self, ctx):
+        embed = discord.Embed(
+            title="Logging Pipeline Health",
+            color=discord.Color.blue()
+        )
+        
+        PIPELINE.fold()
+        guild_stats = PIPELINE.guilds.get(ctx.guild.id)
+        embed.add_field(
+            name="This Server",
+            value=self.format_window_stats(guild_stats) if guild_stats else "No events in the last minute",
+            inline=True
+        )
+        
+        embed.add_field(
+            name="All Servers",
+            value=self.format_window_stats(PIPELINE.total),
+            inline=True
+        )
+        
+        queue_stats = self.bot.dispatcher.get_stats()
+        limiter_sizes = self.rate_limiter.get_sizes()
+        archive_stats = self.bot.archiver.get_stats()
+        send_stats = self.bot.send_queue.get_stats()
+        retry_stats = self.bot.dead_letters.get_stats()
+        embed.add_field(
+            name="Caches",
+            value=f"Messages: {len(self.bot.cached_messages)}\n"
+                  f"Guild configs: {len(self.bot.config_manager.guild_configs)}\n"
+                  f"Restored messages: {len(self.bot.snapshot.restored)}\n"
+                  f"Flood limiter keys: {len(self.bot.event_limiter)}\n"
+                  f"Command limiter keys: {sum(limiter_sizes.values())}\n"
+                  f"Queued events: {queue_stats['queued']} (max depth {queue_stats['max_depth']})\n"
+                  f"Queued sends: {send_stats['queued']} from {send_stats['guilds']} servers\n"
+                  f"Failed sends awaiting retry: {retry_stats['queued']} "
+                  f"(oldest {retry_stats['oldest_age']:.0f}s, {retry_stats['retries']} retries)\n"
+                  f"Resolved log channels: {self.bot.log_channels.get_size()}\n"
+                  f"Tracked messages for duplicates: {self.bot.duplicates.get_size()}\n"
+                  f"Archived attachments: {archive_stats['attachments']} in {archive_stats['files']} files, "
+                  f"{format_file_size(archive_stats['bytes'])} ({archive_stats['queued']} queued)",
+            inline=False
+        )
+        
+        embed.set_footer(text=f"Rolling {PIPELINE.window}s window")
+        
+        await ctx.send(embed=embed)
+    
     @commands.command(name="ping")
     async def ping(self, ctx):
         latency = round(self.bot.latency * 1000)
@@ -307,6 +835,14 @@ class CommandHandler(commands.Cog):
             inline=True
         )
         
+        queue_stats = self.bot.dispatcher.get_stats()
+        embed.add_field(
+            name="Event Queues",
+            value=f"{queue_stats['queued']} queued across {queue_stats['workers']} workers "
+                  f"(max depth {queue_stats['max_depth']})",
+            inline=False
+        )
+        
         embed.add_field(
             name="Features",
             value="• Message Logging\n• Edit/Delete Tracking\n• User Activity\n• Voice Logging\n• Role Changes\n• Configurable Settings",
@@ -2,6 +2,7 @@ import json
 import os
 import logging
 from typing import Dict, Any
+from .metrics import CONFIG_CACHE_HITS, CONFIG_CACHE_MISSES
 
 class ConfigManager:
     def __init__(self, config_dir="config"):
@@ -38,6 +39,27 @@ class ConfigManager:
             "log_leaves": True,
             "log_role_changes": True,
             "log_voice": True,
+            "event_flood_limit": 100,
+            "log_delivery": "channel",
+            "webhooks_per_channel": 2,
+            "archive_attachments": False,
+            "archive_quota_mb": 100,
+            "collapse_duplicates": True,
+            "duplicate_window": 10,
+            "duplicate_max_tracked": 1000,
+            "digest_mode": "auto",
+            "digest_threshold": 300,
+            "digest_interval": 60,
+            "report_schedule": "off",
+            "report_channel": None,
+            "report_hour": 0,
+            "send_weight": 1,
+            "ignore": {
+                "channels": [],
+                "users": [],
+                "roles": [],
+                "patterns": []
+            },
             "log_channels": {}
         }
     
@@ -82,7 +104,9 @@ class ConfigManager:
     
     def get_guild_config(self, guild_id):
         if guild_id not in self.guild_configs:
+            CONFIG_CACHE_MISSES.inc()
             return self.load_guild_config(guild_id)
+        CONFIG_CACHE_HITS.inc()
         return self.guild_configs[guild_id]
     
     def create_default_config(self, guild_id):
@@ -1,31 +1,295 @@
 import discord
 from discord.ext import commands
+import asyncio
 import logging
 import json
 import os
+from .archive import AttachmentArchiver
+from .channels import LogChannelCache
 from .config import ConfigManager
 from .events import EventHandler
+from .fairqueue import FairSendQueue
+from .filters import LogFilters
 from .commands import CommandHandler
+from .deadletter import DeadLetterQueue
+from .digest import DigestManager
+from .dispatcher import EventDispatcher
+from .duplicates import DuplicateCollapser
+from .metrics import EVENTS_DROPPED, EVENTS_RECEIVED, PIPELINE, MetricsServer, RateLimitLogFilter
+from .profiler import Profiler
+from .ratelimit import RateLimiter
+from .reports import ActivityRollup
+from .snapshot import MessageSnapshot
+from .trace import TraceRecorder
+from .watchdog import LoopWatchdog
+from .webhooks import WebhookPool
+
+# Events moderators need most during a raid or purge, which is exactly when
+# they arrive in floods. They are still bounded by the worker queues and
+# the per-guild send backlog.
+FLOOD_EXEMPT_EVENTS = frozenset({"member_join", "member_remove", "message_edit", "message_delete"})
 
 class DiscordBot(commands.Bot):
-    def __init__(self):
+    def __init__(self, bot_logger=None):
         intents = discord.Intents.all()
+        max_messages = int(os.getenv('MAX_MESSAGES', 1000))
+        trace_path = os.getenv('GATEWAY_TRACE_PATH')
         super().__init__(
             command_prefix="!",
             intents=intents,
             help_command=None,
-            case_insensitive=True
+            case_insensitive=True,
+            max_messages=max_messages,
+            # Needed for the raw gateway messages the trace recorder reads.
+            enable_debug_events=bool(trace_path)
         )
         
+        self.bot_logger = bot_logger
         self.config_manager = ConfigManager()
         self.event_handler = EventHandler(self)
         self.command_handler = CommandHandler(self)
+        self.dispatcher = EventDispatcher(
+            worker_count=int(os.getenv('EVENT_WORKERS', 8)),
+            queue_size=int(os.getenv('EVENT_QUEUE_SIZE', 1000))
+        )
+        self.snapshot = MessageSnapshot(
+            path=os.getenv('SNAPSHOT_PATH', 'data/state.snapshot'),
+            max_messages=max_messages
+        )
+        # Per guild and event type; the limit itself comes from the guild config.
+        self.event_limiter = RateLimiter(time_window=10, max_keys=100000)
+        self.flood_drops = {}
+        self.metrics_server = None
+        self.profiler = Profiler(log_dir=bot_logger.log_dir if bot_logger else os.getenv('LOG_DIR', 'logs'))
+        self.profile_task = None
+        self.dispatcher.profiler = self.profiler
+        self.send_queue = FairSendQueue(
+            self,
+            concurrency=int(os.getenv('SEND_CONCURRENCY', 8)),
+            max_pending=int(os.getenv('SEND_BACKLOG', 500))
+        )
+        self.webhook_pool = WebhookPool(self)
+        self.log_channels = LogChannelCache(self)
+        self.dead_letters = DeadLetterQueue(
+            self,
+            path=os.getenv('DEAD_LETTER_PATH', 'data/dead_letters.jsonl'),
+            max_size=int(os.getenv('DEAD_LETTER_MAX', 10000))
+        )
+        self.filters = LogFilters(self)
+        self.duplicates = DuplicateCollapser(self)
+        self.digests = DigestManager(self)
+        self.archiver = AttachmentArchiver(
+            self,
+            root=os.getenv('ARCHIVE_DIR', 'data/attachments'),
+            concurrency=int(os.getenv('ARCHIVE_CONCURRENCY', 4))
+        )
+        self.rollup = ActivityRollup(self, path=os.getenv('ACTIVITY_PATH', 'data/activity.json'))
+        self.watchdog = None
+        self.trace_recorder = None
+        if trace_path:
+            self.trace_recorder = TraceRecorder(
+                trace_path,
+                redact=os.getenv('GATEWAY_TRACE_REDACT', 'true').lower() != 'false'
+            )
+        self.shutdown_timeout = float(os.getenv('SHUTDOWN_TIMEOUT', 10))
+        self.shutdown_started = False
+        # Loop time by which draining events and flushing sends must be done.
+        self.shutdown_deadline = None
         self.logger = logging.getLogger(__name__)
         
+        for logger_name in ('discord.http', 'discord.webhook.async_'):
+            http_logger = logging.getLogger(logger_name)
+            if not any(isinstance(f, RateLimitLogFilter) for f in http_logger.filters):
+                http_logger.addFilter(RateLimitLogFilter())
+        
         self.setup_events()
     
     async def setup_hook(self):
         await self.add_cog(self.command_handler)
+        self.snapshot.load()
+        self.archiver.start()
+        self.duplicates.start()
+        self.digests.start()
+        self.rollup.start()
+        self.dead_letters.start()
+        self.send_queue.start()
+        self.dispatcher.start()
+        
+        if self.trace_recorder:
+            self.trace_recorder.start()
+        
+        stall_threshold = float(os.getenv('LOOP_STALL_THRESHOLD', 0.25))
+        if stall_threshold > 0:
+            self.watchdog = LoopWatchdog(asyncio.get_running_loop(), self.dispatcher, threshold=stall_threshold)
+            self.watchdog.start()
+        
+        metrics_port = os.getenv('METRICS_PORT')
+        if metrics_port:
+            self.metrics_server = MetricsServer(
+                host=os.getenv('METRICS_HOST', '127.0.0.1'),
+                port=int(metrics_port)
+            )
+            await self.metrics_server.start()
+    
+    async def shutdown(self, timeout=None):
+        if self.shutdown_started:
+            return
+        self.shutdown_started = True
+        
+        timeout = self.shutdown_timeout if timeout is None else timeout
+        self.logger.info(f"Shutting down, draining queued events for up to {timeout:g}s")
+        
+        self.dispatcher.close_intake()
+        start = asyncio.get_running_loop().time()
+        # One budget for the whole shutdown; close() flushes sends with
+        # whatever the drain left of it.
+        self.shutdown_deadline = start + timeout
+        flushed, remaining = await self.dispatcher.drain(timeout)
+        elapsed = asyncio.get_running_loop().time() - start
+        
+        self.logger.info(
+            f"Drained {flushed} events in {elapsed:.1f}s; {remaining} still pending, "
+            f"{self.dispatcher.rejected} rejected after intake closed"
+        )
+        
+        await self.close()
+    
+    async def close(self):
+        if not self.is_closed():
+            self.dispatcher.close_intake()
+            await self.dispatcher.stop()
+            await self.duplicates.stop()
+            await self.digests.stop()
+            if self.shutdown_deadline is None:
+                self.shutdown_deadline = asyncio.get_running_loop().time() + self.shutdown_timeout
+            unsent = await self.send_queue.flush(self.get_shutdown_remaining())
+            undelivered = await self.webhook_pool.flush(self.get_shutdown_remaining())
+            self.persist_unsent(unsent, undelivered)
+            await self.dead_letters.stop()
+            self.save_snapshot()
+            await self.rollup.stop()
+            await self.archiver.stop()
+            if self.metrics_server:
+                await self.metrics_server.stop()
+            if self.watchdog:
+                self.watchdog.stop()
+            if self.trace_recorder:
+                self.trace_recorder.stop()
+        await super().close()
+    
+    def persist_unsent(self, unsent, undelivered):
+        # Log entries still waiting at the deadline are journaled as failed
+        # sends, so they are retried after the restart instead of lost.
+        # Every send queued on send_queue is an event_handler.deliver_log.
+        for _, (log_channel, embed, event_name, _, event_time, _) in unsent:
+            self.dead_letters.add(log_channel, embed, event_name, None, event_time)
+        for log_channel, embed, event_name, event_time in undelivered:
+            self.dead_letters.add(log_channel, embed, event_name, None, event_time)
+        
+        count = len(unsent) + len(undelivered)
+        if count:
+            self.logger.warning(f"{count} log entries not sent before shutdown were kept to retry after restart")
+    
+    def get_shutdown_remaining(self):
+        return max(0.0, self.shutdown_deadline - asyncio.get_running_loop().time())
+    
+    def save_snapshot(self):
+        try:
+            self.snapshot.save(self.cached_messages, self.dispatcher.take_pending())
+        except Exception as e:
+            self.logger.error(f"Error saving snapshot: {e}")
+    
+    async def replay_snapshot(self):
+        for handler_name, messages in self.snapshot.take_pending(self._connection):
+            handler = getattr(self.event_handler, handler_name)
+            await self.dispatcher.submit(messages[0].guild, handler, *messages)
+    
+    def request_profile(self, duration=None):
+        if self.profiler.active:
+            self.logger.warning("Profile requested while one is already running")
+            return
+        
+        duration = float(os.getenv('PROFILE_SECONDS', 30)) if duration is None else duration
+        # Kept so the task is not garbage collected while it runs.
+        self.profile_task = asyncio.create_task(self.profiler.run(duration), name="profiler")
+        self.profile_task.add_done_callback(self.on_profile_done)
+    
+    def on_profile_done(self, task):
+        if self.profile_task is task:
+            self.profile_task = None
+        
+        if not task.cancelled() and task.exception():
+            self.logger.error(f"Profile run failed: {task.exception()}")
+    
+    async def submit_event(self, guild, handler, *args):
+        event_name = handler.__name__[3:]
+        EVENTS_RECEIVED.labels(event_name).inc()
+        PIPELINE.record_event(guild.id if guild else None)
+        
+        # Ignored events are dropped before they reach the reports, digests,
+        # flood limit or queues, so a noisy ignored channel costs one check.
+        if guild and self.is_ignored_event(guild.id, event_name, args):
+            self.event_handler.record_drop(event_name, "ignored", guild.id)
+            if event_name == "message_delete":
+                self.archiver.release(args[0].id)
+            return
+        
+        if guild:
+            self.rollup.record(event_name, guild, args)
+        
+        # Messages going into a digest are only counted, so they skip the
+        # queue and the flood limit.
+        if guild and event_name == "message" and self.digests.add_message(*args):
+            return
+        
+        if guild and self.is_flooded(guild.id, event_name):
+            EVENTS_DROPPED.labels(event_name, "flood").inc()
+            PIPELINE.record_drop(guild.id)
+            return
+        
+        await self.dispatcher.submit(guild, handler, *args)
+    
+    def is_ignored_event(self, guild_id, event_name, args):
+        filters = self.filters
+        if event_name in ("message", "message_delete"):
+            message = args[0]
+            return filters.is_ignored(guild_id, message.channel, message.author, message.content)
+        if event_name == "message_edit":
+            before, after = args
+            return (filters.is_ignored(guild_id, before.channel, before.author, before.content)
+                    or filters.is_ignored(guild_id, content=after.content))
+        if event_name in ("member_join", "member_remove"):
+            return filters.is_ignored(guild_id, member=args[0])
+        if event_name == "member_update":
+            return filters.is_ignored(guild_id, member=args[1])
+        if event_name == "voice_state_update":
+            member, before, after = args
+            return filters.is_ignored(guild_id, after.channel or before.channel, member)
+        return False
+    
+    def is_flooded(self, guild_id, event_name):
+        if event_name in FLOOD_EXEMPT_EVENTS:
+            return False
+        
+        config = self.config_manager.get_guild_config(guild_id)
+        limit = config.get('event_flood_limit', 100)
+        if not limit:
+            return False
+        
+        key = (guild_id, event_name)
+        
+        if self.event_limiter.is_rate_limited(key, max_requests=limit):
+            if key not in self.flood_drops:
+                self.flood_drops[key] = 0
+                self.logger.warning(f"Flood protection engaged for {event_name} in guild {guild_id}")
+            self.flood_drops[key] += 1
+            return True
+        
+        dropped = self.flood_drops.pop(key, None)
+        if dropped:
+            self.logger.warning(f"Flood protection released for {event_name} in guild {guild_id} after dropping {dropped} events")
+        
+        return False
     
     async def get_prefix(self, message):
         if not message.guild:
@@ -38,43 +302,91 @@ class DiscordBot(commands.Bot):
         @self.event
         async def on_ready():
             await self.event_handler.on_ready()
+            self.rollup.seed_voice(self.guilds)
+            await self.replay_snapshot()
         
         @self.event
         async def on_message(message):
-            await self.event_handler.on_message(message)
+            # Commands first, so they never wait behind logging.
             await self.process_commands(message)
+            await self.submit_event(message.guild, self.event_handler.on_message, message)
         
         @self.event
         async def on_message_edit(before, after):
-            await self.event_handler.on_message_edit(before, after)
+            await self.submit_event(before.guild, self.event_handler.on_message_edit, before, after)
         
         @self.event
         async def on_message_delete(message):
-            await self.event_handler.on_message_delete(message)
+            await self.submit_event(message.guild, self.event_handler.on_message_delete, message)
+        
+        @self.event
+        async def on_raw_message_edit(payload):
+            if payload.cached_message is not None:
+                return
+            
+            before = self.snapshot.pop_message(self._connection, payload.message_id)
+            if before:
+                self.snapshot.remember(payload.message)
+                await self.submit_event(before.guild, self.event_handler.on_message_edit, before, payload.message)
+        
+        @self.event
+        async def on_raw_message_delete(payload):
+            if payload.cached_message is not None:
+                return
+            
+            message = self.snapshot.pop_message(self._connection, payload.message_id)
+            if message:
+                await self.submit_event(message.guild, self.event_handler.on_message_delete, message)
         
         @self.event
         async def on_member_join(member):
-            await self.event_handler.on_member_join(member)
+            await self.submit_event(member.guild, self.event_handler.on_member_join, member)
         
         @self.event
         async def on_member_remove(member):
-            await self.event_handler.on_member_remove(member)
+            await self.submit_event(member.guild, self.event_handler.on_member_remove, member)
         
         @self.event
         async def on_member_update(before, after):
-            await self.event_handler.on_member_update(before, after)
+            if self.user and after.id == self.user.id:
+                # The bot's own roles decide where it can post.
+                self.log_channels.invalidate(after.guild.id)
+            await self.submit_event(before.guild, self.event_handler.on_member_update, before, after)
         
         @self.event
         async def on_voice_state_update(member, before, after):
-            await self.event_handler.on_voice_state_update(member, before, after)
+            await self.submit_event(member.guild, self.event_handler.on_voice_state_update, member, before, after)
+        
+        @self.event
+        async def on_guild_channel_delete(channel):
+            self.log_channels.invalidate(channel.guild.id)
+            self.webhook_pool.forget_channel(channel)
+        
+        @self.event
+        async def on_guild_channel_update(before, after):
+            self.log_channels.invalidate(after.guild.id)
+        
+        @self.event
+        async def on_guild_role_update(before, after):
+            if before.permissions != after.permissions:
+                self.log_channels.invalidate(after.guild.id)
+        
+        @self.event
+        async def on_guild_role_delete(role):
+            self.log_channels.invalidate(role.guild.id)
         
         @self.event
         async def on_guild_join(guild):
-            await self.event_handler.on_guild_join(guild)
+            await self.dispatcher.submit(guild, self.event_handler.on_guild_join, guild)
         
         @self.event
         async def on_command_error(ctx, error):
             await self.event_handler.on_command_error(ctx, error)
+        
+        if self.trace_recorder:
+            @self.event
+            async def on_socket_raw_receive(message):
+                self.trace_recorder.record(message)
     
     async def get_log_channel(self, guild_id, log_type):
         config = self.config_manager.get_guild_config(guild_id)
@@ -87,6 +399,6 @@ class DiscordBot(commands.Bot):
             channel_id = config.get('log_channels', {}).get('default')
         
         if channel_id:
-            return self.get_channel(channel_id)
+            return self.log_channels.resolve(guild_id, channel_id)
         
         return None
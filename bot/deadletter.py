@@ -0,0 +1,325 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import time
+
+import aiohttp
+import discord
+
+from .metrics import DEAD_LETTERS, DEAD_LETTER_OLDEST, DEAD_LETTER_SIZE, EMBEDS_SENT, EVENT_TO_LOG_DELAY
+
+RETRY_INTERVAL = 1.0
+BASE_DELAY = 5.0
+MAX_DELAY = 900.0
+MAX_ATTEMPTS = 12
+MAX_AGE = 24 * 60 * 60
+# Discord accepts up to 10 embeds and 6000 embed characters per message.
+MAX_BATCH_EMBEDS = 10
+MAX_BATCH_CHARACTERS = 6000
+# Failures that retrying will not fix. For missing access and unknown
+# channels the guild has to fix its log channel, so it is told.
+PERMANENT_STATUSES = (400, 401, 403, 404)
+ALERT_STATUSES = (403, 404)
+# The journal is rewritten once it holds this many records and is mostly
+# entries that are gone.
+COMPACT_RECORDS = 10000
+
+def is_permanent(error):
+    return getattr(error, 'status', None) in PERMANENT_STATUSES
+
+def get_batches(letters):
+    batch = []
+    characters = 0
+    for letter in letters:
+        size = len(letter.embed)
+        if batch and (len(batch) == MAX_BATCH_EMBEDS or characters + size > MAX_BATCH_CHARACTERS):
+            yield batch
+            batch = []
+            characters = 0
+        batch.append(letter)
+        characters += size
+    if batch:
+        yield batch
+
+def is_valid_record(record):
+    # Journal lines are ["add", id, guild, channel, event, embed, created,
+    # event_time, attempts] or ["remove", id].
+    if not isinstance(record, list) or len(record) < 2 or not isinstance(record[1], int):
+        return False
+    if record[0] == "add":
+        return (
+            len(record) == 9
+            and isinstance(record[2], int) and isinstance(record[3], int) and isinstance(record[4], str)
+            and isinstance(record[5], dict) and isinstance(record[6], (int, float))
+            and (record[7] is None or isinstance(record[7], (int, float))) and isinstance(record[8], int)
+        )
+    return record[0] == "remove" and len(record) == 2
+
+def get_backoff(attempts):
+    # Exponential with equal jitter, so log channels that failed together
+    # do not all retry at the same moment.
+    delay = min(BASE_DELAY * 2 ** (attempts - 1), MAX_DELAY)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+class DeadLetter:
+    __slots__ = ("letter_id", "guild_id", "channel_id", "event_name", "embed", "created", "event_time", "attempts", "next_attempt")
+    
+    def __init__(self, letter_id, guild_id, channel_id, event_name, embed, created, event_time=None, attempts=1):
+        self.letter_id = letter_id
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.event_name = event_name
+        self.embed = embed
+        self.created = created
+        self.event_time = event_time
+        self.attempts = attempts
+        self.next_attempt = time.monotonic() + get_backoff(attempts)
+    
+    def to_record(self):
+        return [
+            "add", self.letter_id, self.guild_id, self.channel_id, self.event_name,
+            self.embed.to_dict(), self.created, self.event_time, self.attempts
+        ]
+
+class DeadLetterQueue:
+    # Log entries whose send failed for a reason that may pass (5xx,
+    # timeouts, Discord being down) are kept here and retried with
+    # exponential backoff, batched into messages of up to ten embeds per
+    # log channel. Entries are appended to a local journal as they come and
+    # go, so they survive a restart. When a log channel fails permanently
+    # (missing access, deleted) its entries are dropped and the guild is
+    # told through another channel.
+    def __init__(self, bot, path="data/dead_letters.jsonl", max_size=10000):
+        self.bot = bot
+        self.path = path
+        self.max_size = max_size
+        self.letters = {}
+        self.sequence = itertools.count(1)
+        self.journal = None
+        self.journal_records = 0
+        self.task = None
+        self.retries = 0
+        self.logger = logging.getLogger(__name__)
+    
+    def start(self):
+        if self.task:
+            return
+        
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        
+        self.load()
+        self.compact()
+        DEAD_LETTER_SIZE.set_callback(lambda: [((), len(self.letters))])
+        DEAD_LETTER_OLDEST.set_callback(lambda: [((), self.get_oldest_age())])
+        self.task = asyncio.create_task(self.run(), name="dead-letter-retry")
+    
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        if self.journal:
+            self.journal.close()
+            self.journal = None
+    
+    def add(self, log_channel, embed, event_name, error, event_time=None):
+        if is_permanent(error):
+            DEAD_LETTERS.labels("permanent").inc()
+            self.alert(log_channel.guild.id, log_channel.id, error)
+            return
+        
+        if not self.journal:
+            return
+        
+        while len(self.letters) >= self.max_size:
+            oldest = next(iter(self.letters.values()))
+            self.remove(oldest, "overflow")
+        
+        letter = DeadLetter(
+            next(self.sequence), log_channel.guild.id, log_channel.id, event_name, embed,
+            time.time(), event_time.timestamp() if event_time else None
+        )
+        self.letters[letter.letter_id] = letter
+        self.write_record(letter.to_record())
+        DEAD_LETTERS.labels("queued").inc()
+    
+    def remove(self, letter, result):
+        # A letter can go while a retry of it is in flight, to overflow or to
+        # a permanent failure of another batch for the same channel.
+        if self.letters.pop(letter.letter_id, None) is None:
+            return
+        self.write_record(["remove", letter.letter_id])
+        DEAD_LETTERS.labels(result).inc()
+    
+    async def run(self):
+        while True:
+            await asyncio.sleep(RETRY_INTERVAL)
+            try:
+                await self.retry_due(time.monotonic())
+            except Exception as e:
+                self.logger.error(f"Error retrying failed log sends: {e}")
+    
+    async def retry_due(self, now):
+        channels = {}
+        for letter in self.letters.values():
+            channels.setdefault(letter.channel_id, []).append(letter)
+        
+        for channel_id, letters in channels.items():
+            # Once one entry is due the rest of the channel's go with it, so
+            # they stay in order and fill whole messages.
+            if all(letter.next_attempt > now for letter in letters):
+                continue
+            
+            batches = list(get_batches(letters))
+            for index, batch in enumerate(batches):
+                if not await self.retry_batch(channel_id, batch):
+                    # Not tried this time; wait as long as the batch that failed.
+                    next_attempt = max(letter.next_attempt for letter in batch)
+                    for later in batches[index + 1:]:
+                        for letter in later:
+                            letter.next_attempt = max(letter.next_attempt, next_attempt)
+                    break
+    
+    async def retry_batch(self, channel_id, letters):
+        # Returns whether the rest of this channel's letters are worth
+        # trying now.
+        channel = self.bot.get_channel(channel_id)
+        if channel is None:
+            for letter in letters:
+                self.remove(letter, "permanent")
+            self.alert(letters[0].guild_id, channel_id, None)
+            return True
+        
+        self.retries += 1
+        try:
+            await channel.send(embeds=[letter.embed for letter in letters])
+        except (discord.HTTPException, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if is_permanent(e):
+                # Without access every entry for the channel fails the same
+                # way; anything else is down to this batch.
+                dropped = self.get_channel_letters(channel_id) if e.status in ALERT_STATUSES else letters
+                for letter in dropped:
+                    self.remove(letter, "permanent")
+                self.alert(channel.guild.id, channel_id, e)
+                return e.status not in ALERT_STATUSES
+            
+            for letter in letters:
+                if letter.letter_id not in self.letters:
+                    continue
+                letter.attempts += 1
+                if letter.attempts > MAX_ATTEMPTS or time.time() - letter.created > MAX_AGE:
+                    self.remove(letter, "expired")
+                else:
+                    letter.next_attempt = time.monotonic() + get_backoff(letter.attempts)
+                    DEAD_LETTERS.labels("retry_failed").inc()
+            self.logger.warning(f"Retry of {len(letters)} failed log sends to channel {channel_id} failed: {e}")
+            return False
+        
+        for letter in letters:
+            self.remove(letter, "delivered")
+            EMBEDS_SENT.labels(letter.event_name).inc()
+            if letter.event_time:
+                EVENT_TO_LOG_DELAY.observe(time.time() - letter.event_time)
+        return True
+    
+    def get_channel_letters(self, channel_id):
+        return [letter for letter in self.letters.values() if letter.channel_id == channel_id]
+    
+    def alert(self, guild_id, channel_id, error):
+        if error is not None and error.status not in ALERT_STATUSES:
+            self.logger.warning(f"Dropping log entry for channel {channel_id} in guild {guild_id}: {error}")
+            return
+        
+        reason = f"{error.text or 'error'} ({error.status})" if error is not None else "the channel no longer exists"
+        # Whatever was cached about the channel is out of date.
+        self.bot.log_channels.invalidate(guild_id)
+        self.bot.log_channels.report(guild_id, channel_id, reason)
+    
+    def write_record(self, record):
+        if not self.journal:
+            return
+        
+        try:
+            self.journal.write(json.dumps(record, separators=(',', ':')) + "\n")
+            self.journal.flush()
+        except OSError as e:
+            self.logger.error(f"Error writing dead letter journal: {e}")
+            return
+        
+        self.journal_records += 1
+        if self.journal_records > COMPACT_RECORDS and self.journal_records > 4 * len(self.letters):
+            self.compact()
+    
+    def compact(self):
+        # Rewrites the journal with only the entries still queued.
+        if self.journal:
+            self.journal.close()
+        
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for letter in self.letters.values():
+                f.write(json.dumps(letter.to_record(), separators=(',', ':')) + "\n")
+        os.replace(temp_path, self.path)
+        
+        self.journal = open(self.path, 'a', encoding='utf-8')
+        self.journal_records = len(self.letters)
+    
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        
+        records = {}
+        skipped = 0
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    
+                    if not is_valid_record(record):
+                        skipped += 1
+                        continue
+                    if record[0] == "add":
+                        records[record[1]] = record
+                    elif record[0] == "remove":
+                        records.pop(record[1], None)
+        except Exception as e:
+            self.logger.error(f"Error loading dead letter journal {self.path}: {e}")
+            return
+        
+        for _, _, guild_id, channel_id, event_name, embed, created, event_time, attempts in records.values():
+            if time.time() - created > MAX_AGE:
+                continue
+            try:
+                embed = discord.Embed.from_dict(embed)
+            except (TypeError, ValueError, AttributeError):
+                skipped += 1
+                continue
+            letter = DeadLetter(next(self.sequence), guild_id, channel_id, event_name, embed, created, event_time, attempts)
+            # Retried soon after startup rather than after a long backoff.
+            letter.next_attempt = time.monotonic() + random.uniform(0, BASE_DELAY)
+            self.letters[letter.letter_id] = letter
+        
+        if skipped:
+            self.logger.warning(f"Skipped {skipped} malformed records in dead letter journal {self.path}")
+        if self.letters:
+            self.logger.info(f"Loaded {len(self.letters)} failed log sends to retry")
+    
+    def get_oldest_age(self):
+        if not self.letters:
+            return 0
+        return time.time() - next(iter(self.letters.values())).created
+    
+    def get_stats(self):
+        return {
+            "queued": len(self.letters),
+            "oldest_age": self.get_oldest_age(),
+            "retries": self.retries
+        }
@@ -0,0 +1,188 @@
+import re
+from difflib import SequenceMatcher
+
+from discord.utils import escape_markdown
+
+# A word with the whitespace after it, or leading whitespace.
+TOKEN_PATTERN = re.compile(r"\S+\s*|\s+")
+# Unchanged words shown on each side of a change.
+CONTEXT_WORDS = 6
+ELLIPSIS = "…"
+
+def is_boundary(text, index):
+    return index == 0 or index == len(text) or text[index - 1].isspace() != text[index].isspace()
+
+def common_prefix_length(a, b):
+    limit = min(len(a), len(b))
+    if a[:limit] == b[:limit]:
+        return limit
+    
+    # Halve the search range; slice comparisons run in C.
+    low, high = 0, limit
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[:middle] == b[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+def common_suffix_length(a, b, limit):
+    low, high = 0, limit
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[len(a) - middle:] == b[len(b) - middle:]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+def diff_words(before, after):
+    # A list of ("equal" | "delete" | "insert", text) spans that turn before
+    # into after, split on word boundaries. The common prefix and suffix are
+    # cut off first, which leaves nothing more to compare for appends,
+    # truncations and single-word fixes, the usual edits.
+    if before == after:
+        return [("equal", before)] if before else []
+    
+    prefix = common_prefix_length(before, after)
+    while not (is_boundary(before, prefix) and is_boundary(after, prefix)):
+        prefix -= 1
+    
+    suffix = common_suffix_length(before, after, min(len(before), len(after)) - prefix)
+    while not (is_boundary(before, len(before) - suffix) and is_boundary(after, len(after) - suffix)):
+        suffix -= 1
+    
+    removed = before[prefix:len(before) - suffix]
+    added = after[prefix:len(after) - suffix]
+    
+    spans = []
+    if prefix:
+        spans.append(("equal", before[:prefix]))
+    
+    removed_tokens = TOKEN_PATTERN.findall(removed)
+    added_tokens = TOKEN_PATTERN.findall(added)
+    
+    if len(removed_tokens) <= 1 or len(added_tokens) <= 1:
+        if removed:
+            spans.append(("delete", removed))
+        if added:
+            spans.append(("insert", added))
+    else:
+        matcher = SequenceMatcher(None, removed_tokens, added_tokens, autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == "equal":
+                spans.append(("equal", "".join(removed_tokens[i1:i2])))
+                continue
+            if i1 != i2:
+                spans.append(("delete", "".join(removed_tokens[i1:i2])))
+            if j1 != j2:
+                spans.append(("insert", "".join(added_tokens[j1:j2])))
+    
+    if suffix:
+        spans.append(("equal", before[len(before) - suffix:]))
+    
+    return spans
+
+def take_words(text, count, from_end=False):
+    # The first (or last) count words of text and whether anything was cut.
+    # Scans only as far as it needs to, since text can be most of a long
+    # message.
+    words = 0
+    in_word = False
+    indexes = range(len(text) - 1, -1, -1) if from_end else range(len(text))
+    
+    for index in indexes:
+        if text[index].isspace():
+            in_word = False
+        elif not in_word:
+            in_word = True
+            words += 1
+            if words > count:
+                return (text[index + 1:] if from_end else text[:index]), True
+    
+    return text, False
+
+def describe_whitespace(text):
+    counts = []
+    for char, name in (("\n", "newline"), ("\t", "tab"), (" ", "space")):
+        count = text.count(char)
+        if count:
+            counts.append(f"{count} {name}{'s' if count != 1 else ''}")
+    other = len(text) - sum(text.count(char) for char in "\n\t ")
+    if other:
+        counts.append(f"{other} whitespace")
+    return "[" + ", ".join(counts) + "]"
+
+def mark(text, marker):
+    # Markdown needs the markers against the text, not whitespace. A change
+    # that is only whitespace would show nothing, so it is described.
+    stripped = text.strip()
+    if not stripped:
+        return f"{marker}{describe_whitespace(text)}{marker}"
+    
+    start = text.index(stripped[0])
+    end = start + len(stripped)
+    return f"{text[:start]}{marker}{escape_markdown(stripped)}{marker}{text[end:]}"
+
+def fit_mark(text, marker, room):
+    # The longest start of a marked change that fits in room characters,
+    # still closed so the rest of the embed is not struck through or bold.
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if len(mark(text[:middle], marker)) <= room:
+            low = middle
+        else:
+            high = middle - 1
+    return mark(text[:low], marker) if text[:low].strip() else ""
+
+def render_diff(spans, context=CONTEXT_WORDS, limit=None):
+    # Deleted text struck through and inserted text in bold, with context
+    # words around each change and the rest of the unchanged text elided.
+    # With a limit, the rendering is cut between spans (or inside a change,
+    # with its marker closed) and ends in an ellipsis.
+    parts = []
+    last = len(spans) - 1
+    
+    for index, (tag, text) in enumerate(spans):
+        if tag == "delete":
+            parts.append(mark(text, "~~"))
+        elif tag == "insert":
+            parts.append(mark(text, "**"))
+        elif index == 0:
+            kept, cut = take_words(text, context, from_end=True)
+            parts.append((ELLIPSIS + " " if cut else "") + escape_markdown(kept.lstrip()))
+        elif index == last:
+            kept, cut = take_words(text, context)
+            parts.append(escape_markdown(kept.rstrip()) + (" " + ELLIPSIS if cut else ""))
+        else:
+            head, cut = take_words(text, context)
+            if not cut:
+                parts.append(escape_markdown(text))
+                continue
+            tail, _ = take_words(text, context, from_end=True)
+            if len(head) + len(tail) >= len(text):
+                parts.append(escape_markdown(text))
+            else:
+                parts.append(f"{escape_markdown(head.rstrip())} {ELLIPSIS} {escape_markdown(tail.lstrip())}")
+    
+    if limit is None or sum(len(part) for part in parts) <= limit:
+        return "".join(parts)
+    
+    room = limit - len(ELLIPSIS) - 1
+    kept = []
+    for (tag, text), part in zip(spans, parts):
+        if len(part) > room:
+            if tag != "equal":
+                kept.append(fit_mark(text, "~~" if tag == "delete" else "**", room))
+            break
+        kept.append(part)
+        room -= len(part)
+    
+    return "".join(kept).rstrip() + " " + ELLIPSIS
+
+def get_diff_stats(spans):
+    removed = sum(len(text) for tag, text in spans if tag == "delete")
+    added = sum(len(text) for tag, text in spans if tag == "insert")
+    return removed, added
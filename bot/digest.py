@@ -0,0 +1,235 @@
+import asyncio
+import logging
+import re
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+import discord
+
+from .metrics import RollingCounter
+from .utils import create_embed
+
+CHECK_INTERVAL = 5.0
+# Digest mode ends once the rate falls below this share of the threshold,
+# so a guild hovering around it does not flip back and forth.
+EXIT_RATIO = 0.5
+MAX_TRACKED_AUTHORS = 5000
+MAX_NOTABLE = 5
+MASS_MENTION_COUNT = 5
+LINK_PATTERN = re.compile(r"https?://", re.IGNORECASE)
+
+class Digest:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.start_time = datetime.now(timezone.utc)
+        self.messages = 0
+        self.channels = Counter()
+        self.authors = Counter()
+        self.other_authors = 0
+        self.attachments = 0
+        self.links = 0
+        self.mass_mentions = 0
+        self.notable = []
+    
+    def add(self, message):
+        self.messages += 1
+        self.channels[message.channel.id] += 1
+        
+        author_id = message.author.id
+        if author_id in self.authors or len(self.authors) < MAX_TRACKED_AUTHORS:
+            self.authors[author_id] += 1
+        else:
+            self.other_authors += 1
+        
+        if message.attachments:
+            self.attachments += len(message.attachments)
+        if LINK_PATTERN.search(message.content):
+            self.links += 1
+        
+        if message.mention_everyone or len(message.mentions) >= MASS_MENTION_COUNT:
+            self.mass_mentions += 1
+            if len(self.notable) < MAX_NOTABLE:
+                self.notable.append(f"[Mass mention]({message.jump_url}) by {message.author.mention}")
+
+class DigestManager:
+    # Per guild, switches message logging to a periodic summary while
+    # messages arrive faster than digest_threshold per minute, and back
+    # once the rate drops. Only new messages are summarized; edits,
+    # deletions and everything else are logged as usual.
+    def __init__(self, bot):
+        self.bot = bot
+        self.rates = {}
+        self.digests = {}
+        self.task = None
+        self.notices = set()
+        self.logger = logging.getLogger(__name__)
+    
+    def start(self):
+        if not self.task:
+            self.task = asyncio.create_task(self.run(), name="digest-flusher")
+    
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        
+        if self.notices:
+            await asyncio.gather(*self.notices, return_exceptions=True)
+        for guild_id, digest in list(self.digests.items()):
+            await self.send_digest(guild_id, digest)
+    
+    def is_active(self, guild_id):
+        return guild_id in self.digests
+    
+    def add_message(self, message):
+        # True when the message was counted into a digest instead of being
+        # left for on_message to log.
+        if message.author.bot:
+            return False
+        
+        guild_id = message.guild.id
+        config = self.bot.config_manager.get_guild_config(guild_id)
+        mode = config.get('digest_mode', 'auto')
+        if mode == 'off':
+            return False
+        
+        now = time.monotonic()
+        rate = self.rates.get(guild_id)
+        if rate is None:
+            rate = self.rates[guild_id] = RollingCounter(window=60, slot_count=6)
+        rate.add(now=now)
+        
+        digest = self.digests.get(guild_id)
+        if digest is None:
+            per_minute = rate.total(now)
+            if mode != 'always' and per_minute <= config.get('digest_threshold', 300):
+                return False
+            digest = self.digests[guild_id] = Digest()
+            self.notify(guild_id, True, per_minute, config)
+        
+        if not config.get('log_messages', True):
+            return True
+        
+        digest.add(message)
+        if message.attachments and self.bot.archiver.is_enabled(guild_id):
+            self.bot.archiver.submit(message)
+        return True
+    
+    async def run(self):
+        while True:
+            await asyncio.sleep(CHECK_INTERVAL)
+            try:
+                await self.check(time.monotonic())
+            except Exception as e:
+                self.logger.error(f"Error sending message digests: {e}")
+    
+    async def check(self, now):
+        for guild_id, digest in list(self.digests.items()):
+            config = self.bot.config_manager.get_guild_config(guild_id)
+            if now - digest.started < config.get('digest_interval', 60):
+                continue
+            
+            per_minute = self.rates[guild_id].total(now)
+            mode = config.get('digest_mode', 'auto')
+            leaving = mode == 'off' or (
+                mode == 'auto' and per_minute < config.get('digest_threshold', 300) * EXIT_RATIO
+            )
+            
+            if leaving:
+                del self.digests[guild_id]
+            else:
+                self.digests[guild_id] = Digest()
+            
+            await self.send_digest(guild_id, digest)
+            
+            if leaving:
+                self.notify(guild_id, False, per_minute, config)
+        
+        # Rates of guilds that went quiet are not needed any more.
+        for guild_id in [guild_id for guild_id, rate in self.rates.items() if guild_id not in self.digests and not rate.total(now)]:
+            del self.rates[guild_id]
+    
+    def notify(self, guild_id, active, per_minute, config):
+        threshold = config.get('digest_threshold', 300)
+        if active:
+            self.logger.warning(
+                f"Digest mode on for guild {guild_id}: {per_minute} messages in the last minute (threshold {threshold})"
+            )
+        else:
+            self.logger.warning(f"Digest mode off for guild {guild_id}: {per_minute} messages in the last minute")
+        
+        task = asyncio.create_task(self.send_notice(guild_id, active, per_minute, config), name="digest-notice")
+        self.notices.add(task)
+        task.add_done_callback(self.notices.discard)
+    
+    async def send_notice(self, guild_id, active, per_minute, config):
+        log_channel = await self.bot.get_log_channel(guild_id, 'messages')
+        if not log_channel:
+            return
+        
+        if active:
+            embed = create_embed(
+                title="Message Digest Mode On",
+                description=f"{per_minute} messages in the last minute, over the limit of "
+                            f"{config.get('digest_threshold', 300)}. New messages are summarized every "
+                            f"{config.get('digest_interval', 60)} seconds until it gets quieter; "
+                            f"edits and deletions are still logged individually.",
+                color=discord.Color.gold()
+            )
+        else:
+            embed = create_embed(
+                title="Message Digest Mode Off",
+                description=f"{per_minute} messages in the last minute. Messages are logged individually again.",
+                color=discord.Color.gold()
+            )
+        
+        await self.bot.event_handler.send_log(log_channel, embed, "digest_mode", "digest mode change")
+    
+    async def send_digest(self, guild_id, digest):
+        if not digest.messages:
+            return
+        
+        log_channel = await self.bot.get_log_channel(guild_id, 'messages')
+        if not log_channel:
+            return
+        
+        elapsed = time.monotonic() - digest.started
+        embed = create_embed(
+            title="Message Digest",
+            description=f"{digest.messages} messages from {len(digest.authors) + (1 if digest.other_authors else 0)}"
+                        f"{'+' if digest.other_authors else ''} members in {len(digest.channels)} channels "
+                        f"over {elapsed:.0f}s",
+            color=discord.Color.green(),
+            timestamp=digest.start_time
+        )
+        
+        embed.add_field(
+            name="Busiest Channels",
+            value="\n".join(f"<#{channel_id}>: {count}" for channel_id, count in digest.channels.most_common(10)),
+            inline=True
+        )
+        
+        embed.add_field(
+            name="Top Authors",
+            value="\n".join(f"<@{author_id}>: {count}" for author_id, count in digest.authors.most_common(10)),
+            inline=True
+        )
+        
+        embed.add_field(
+            name="Content",
+            value=f"Attachments: {digest.attachments}\n"
+                  f"Messages with links: {digest.links}\n"
+                  f"Mass mentions: {digest.mass_mentions}",
+            inline=True
+        )
+        
+        if digest.notable:
+            embed.add_field(
+                name="Notable",
+                value="\n".join(digest.notable),
+                inline=False
+            )
+        
+        await self.bot.event_handler.send_log(log_channel, embed, "message_digest", "message digest")
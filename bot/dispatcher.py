@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import time
+from .metrics import EVENTS_DROPPED, QUEUE_DEPTH, PIPELINE
+
+class EventDispatcher:
+    def __init__(self, worker_count=8, queue_size=1000):
+        self.worker_count = max(1, worker_count)
+        self.queue_size = queue_size
+        self.logger = logging.getLogger(__name__)
+        
+        self.queues = []
+        self.workers = []
+        self.running = [None] * self.worker_count
+        self.processed = [0] * self.worker_count
+        self.saturated = [0] * self.worker_count
+        self.accepting = True
+        self.rejected = 0
+        self.profiler = None
+    
+    def start(self):
+        if self.workers:
+            return
+        
+        self.queues = [asyncio.Queue(maxsize=self.queue_size) for _ in range(self.worker_count)]
+        self.workers = [
+            asyncio.create_task(self.run_worker(index), name=f"event-worker-{index}")
+            for index in range(self.worker_count)
+        ]
+        QUEUE_DEPTH.set_callback(self.get_queue_depth_samples)
+        self.logger.info(f"Started {self.worker_count} event workers")
+    
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+    
+    def get_worker_index(self, guild_id):
+        # The low bits of a snowflake are a per-process increment that is
+        # usually zero for guilds, so shard on the timestamp part instead.
+        return (guild_id >> 22) % self.worker_count
+    
+    def close_intake(self):
+        self.accepting = False
+    
+    async def drain(self, timeout):
+        if not self.workers:
+            return 0, 0
+        
+        processed = sum(self.processed)
+        
+        try:
+            await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in self.queues)), timeout)
+        except asyncio.TimeoutError:
+            pass
+        
+        remaining = sum(self.get_queue_depths()) + sum(1 for item in self.running if item is not None)
+        return sum(self.processed) - processed, remaining
+    
+    async def submit(self, guild, handler, *args):
+        if not self.accepting:
+            self.rejected += 1
+            EVENTS_DROPPED.labels(handler.__name__[3:], "shutdown").inc()
+            PIPELINE.record_drop(guild.id if guild else None)
+            return
+        
+        guild_id = guild.id if guild else 0
+        
+        if not self.workers:
+            await self.run_handler(guild_id, handler, args)
+            return
+        
+        index = self.get_worker_index(guild_id)
+        queue = self.queues[index]
+        
+        if queue.full():
+            # discord.py already runs each event in its own task, so waiting
+            # here would only pile those up; drop and count it instead.
+            self.saturated[index] += 1
+            EVENTS_DROPPED.labels(handler.__name__[3:], "queue_full").inc()
+            PIPELINE.record_drop(guild_id)
+            return
+        
+        queue.put_nowait((handler, args, guild_id))
+    
+    async def run_handler(self, guild_id, handler, args):
+        start = time.perf_counter()
+        await handler(*args)
+        elapsed = time.perf_counter() - start
+        PIPELINE.record_handler(guild_id, elapsed)
+        if self.profiler:
+            self.profiler.record_handler(handler.__name__, elapsed)
+    
+    async def run_worker(self, index):
+        queue = self.queues[index]
+        
+        while True:
+            handler, args, guild_id = item = await queue.get()
+            self.running[index] = item
+            try:
+                await self.run_handler(guild_id, handler, args)
+            except asyncio.CancelledError:
+                # Leave the item marked as running so take_pending() keeps it.
+                raise
+            except Exception:
+                self.logger.exception(f"Error in event handler {handler.__name__}")
+            
+            self.running[index] = None
+            self.processed[index] += 1
+            queue.task_done()
+    
+    def take_pending(self):
+        # Handlers interrupted by stop() come first so they are replayed
+        # before anything queued behind them.
+        pending = [item[:2] for item in self.running if item is not None]
+        self.running = [None] * self.worker_count
+        
+        for queue in self.queues:
+            while not queue.empty():
+                pending.append(queue.get_nowait()[:2])
+                queue.task_done()
+        
+        return pending
+    
+    def get_queue_depths(self):
+        return [queue.qsize() for queue in self.queues]
+    
+    def get_queue_depth_samples(self):
+        return [((str(index),), queue.qsize()) for index, queue in enumerate(self.queues)]
+    
+    def get_stats(self):
+        depths = self.get_queue_depths()
+        return {
+            "workers": self.worker_count,
+            "queue_depths": depths,
+            "queued": sum(depths),
+            "max_depth": max(depths) if depths else 0,
+            "processed": sum(self.processed),
+            "saturated": sum(self.saturated),
+            "rejected": self.rejected
+        }
@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+import discord
+
+from .utils import create_embed, get_user_avatar
+
+SWEEP_INTERVAL = 1.0
+# A burst that never pauses is still reported this often.
+MAX_BURST_SECONDS = 60
+
+class Burst:
+    __slots__ = ("message", "log_channel", "count", "first_seen", "last_seen", "last_id", "window", "logged")
+    
+    def __init__(self, message, log_channel, now, window, logged=True):
+        self.message = message
+        self.log_channel = log_channel
+        self.count = 1
+        self.first_seen = now
+        self.last_seen = now
+        self.last_id = message.id
+        self.window = window
+        # Whether the first copy was logged on its own.
+        self.logged = logged
+
+class DuplicateCollapser:
+    # Tracks recent messages per guild by channel, author and content. The
+    # first copy is logged as usual; copies that follow within the window
+    # are counted instead, and once no copy has arrived for a whole window
+    # a single "×N" entry is logged for the burst. Each guild tracks at
+    # most duplicate_max_tracked messages, least recently repeated first
+    # out.
+    def __init__(self, bot):
+        self.bot = bot
+        self.guilds = {}
+        self.task = None
+        self.summaries = set()
+        self.logger = logging.getLogger(__name__)
+    
+    def start(self):
+        if not self.task:
+            self.task = asyncio.create_task(self.run_sweeper(), name="duplicate-sweeper")
+    
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        await self.flush()
+    
+    def is_repeat(self, message, log_channel, config):
+        if not message.content:
+            return False
+        
+        now = time.monotonic()
+        key = (message.channel.id, message.author.id, hash(message.content))
+        bursts = self.guilds.get(message.guild.id)
+        if bursts is None:
+            bursts = self.guilds[message.guild.id] = OrderedDict()
+        
+        burst = bursts.get(key)
+        if burst is not None and now - burst.last_seen <= burst.window:
+            if now - burst.first_seen >= MAX_BURST_SECONDS:
+                self.report(burst)
+                bursts[key] = Burst(message, log_channel, now, burst.window, logged=False)
+                bursts.move_to_end(key)
+                return True
+            
+            burst.count += 1
+            burst.last_seen = now
+            burst.last_id = message.id
+            bursts.move_to_end(key)
+            return True
+        
+        if burst is not None:
+            # Expired but not swept yet.
+            self.report(burst)
+        
+        window = float(config.get('duplicate_window', 10))
+        bursts[key] = Burst(message, log_channel, now, window)
+        bursts.move_to_end(key)
+        
+        # Evicted bursts are reported now rather than lost.
+        max_tracked = max(1, int(config.get('duplicate_max_tracked', 1000)))
+        while len(bursts) > max_tracked:
+            _, evicted = bursts.popitem(last=False)
+            self.report(evicted)
+        
+        return False
+    
+    async def run_sweeper(self):
+        while True:
+            await asyncio.sleep(SWEEP_INTERVAL)
+            try:
+                self.sweep(time.monotonic())
+            except Exception as e:
+                self.logger.error(f"Error sweeping duplicate messages: {e}")
+    
+    def sweep(self, now):
+        for guild_id in list(self.guilds):
+            bursts = self.guilds[guild_id]
+            
+            # Least recently seen first, so stop at the first one still open.
+            while bursts:
+                key, burst = next(iter(bursts.items()))
+                if now - burst.last_seen <= burst.window:
+                    break
+                del bursts[key]
+                self.report(burst)
+            
+            if not bursts:
+                del self.guilds[guild_id]
+    
+    async def flush(self):
+        guilds, self.guilds = self.guilds, {}
+        for bursts in guilds.values():
+            for burst in bursts.values():
+                self.report(burst)
+        
+        if self.summaries:
+            await asyncio.gather(*self.summaries, return_exceptions=True)
+    
+    def report(self, burst):
+        if burst.count < 2 and burst.logged:
+            return
+        
+        task = asyncio.create_task(self.send_summary(burst), name="duplicate-summary")
+        self.summaries.add(task)
+        task.add_done_callback(self.summaries.discard)
+    
+    async def send_summary(self, burst):
+        message = burst.message
+        embed = create_embed(
+            title="Message Repeated",
+            color=discord.Color.dark_green(),
+            timestamp=message.created_at
+        )
+        
+        embed.add_field(
+            name="Author",
+            value=f"{message.author.mention} (`{message.author.id}`)",
+            inline=True
+        )
+        
+        embed.add_field(
+            name="Channel",
+            value=f"{message.channel.mention} (`{message.channel.id}`)",
+            inline=True
+        )
+        
+        embed.add_field(
+            name="Copies",
+            value=f"×{burst.count} in {burst.last_seen - burst.first_seen:.0f}s "
+                  f"({burst.count - 1 if burst.logged else burst.count} not logged separately)",
+            inline=True
+        )
+        
+        content = message.content
+        if len(content) > 1024:
+            content = content[:1021] + "..."
+        embed.add_field(
+            name="Content",
+            value=content,
+            inline=False
+        )
+        
+        embed.set_thumbnail(url=get_user_avatar(message.author))
+        embed.set_footer(text=f"First Message ID: {message.id} | Last Message ID: {burst.last_id}")
+        
+        await self.bot.event_handler.send_log(burst.log_channel, embed, "message_repeat", "repeated message")
+    
+    def get_size(self):
+        return sum(len(bursts) for bursts in self.guilds.values())
@@ -1,7 +1,14 @@
+import aiohttp
+import asyncio
 import discord
+import io
 import logging
+import time
 from datetime import datetime
 from discord.ext import commands
+from .diff import diff_words, get_diff_stats, render_diff
+from .metrics import EVENTS_DROPPED, EMBEDS_SENT, SEND_FAILURES, SEND_LATENCY, EVENT_TO_LOG_DELAY, PIPELINE
+from .ratelimit import RateLimited
 from .utils import create_embed, format_timestamp, get_user_avatar, get_audit_log_entry
 
 class EventHandler:
@@ -9,6 +16,53 @@ class EventHandler:
         self.bot = bot
         self.logger = logging.getLogger(__name__)
     
+    def record_drop(self, event_name, reason, guild_id):
+        EVENTS_DROPPED.labels(event_name, reason).inc()
+        PIPELINE.record_drop(guild_id)
+    
+    async def send_log(self, log_channel, embed, event_name, description, event_time=None, files=None):
+        # Webhook batches carry embeds only, so logs with files go as the bot.
+        if not files and self.bot.webhook_pool.is_enabled(log_channel.guild.id):
+            await self.bot.webhook_pool.deliver(log_channel, embed, event_name, description, event_time)
+            return
+        
+        # Sends as the bot all share its HTTP client, so they are queued
+        # fairly per guild and a busy guild cannot hold up everyone else.
+        await self.bot.send_queue.submit(
+            log_channel.guild.id, event_name, self.deliver_log,
+            log_channel, embed, event_name, description, event_time, files
+        )
+    
+    async def deliver_log(self, log_channel, embed, event_name, description, event_time, files):
+        start = time.perf_counter()
+        try:
+            await log_channel.send(embed=embed, files=files)
+        except (discord.HTTPException, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.record_send_failure(log_channel, e, event_name, description)
+            self.bot.dead_letters.add(log_channel, embed, event_name, e, event_time)
+            return
+        
+        elapsed = time.perf_counter() - start
+        SEND_LATENCY.observe(elapsed)
+        PIPELINE.record_send(log_channel.guild.id, elapsed)
+        self.record_sent(log_channel, event_name, event_time)
+    
+    def record_sent(self, log_channel, event_name, event_time=None):
+        EMBEDS_SENT.labels(event_name).inc()
+        if event_time:
+            EVENT_TO_LOG_DELAY.observe(time.time() - event_time.timestamp())
+        
+        if self.bot.bot_logger:
+            self.bot.bot_logger.log_event(event_name, f"Channel: {log_channel.id}", guild_id=log_channel.guild.id)
+    
+    def record_send_failure(self, log_channel, error, event_name, description):
+        SEND_FAILURES.labels(str(getattr(error, 'status', 'network'))).inc()
+        PIPELINE.record_failure(log_channel.guild.id)
+        if self.bot.bot_logger:
+            self.bot.bot_logger.log_error(error, context=event_name, guild_id=log_channel.guild.id)
+        else:
+            self.logger.error(f"Failed to log {description}: {error}")
+    
     async def on_ready(self):
         self.logger.info(f"{self.bot.user} has connected to Discord!")
         self.logger.info(f"Bot is in {len(self.bot.guilds)} guilds")
@@ -26,12 +80,23 @@ class EventHandler:
         if not message.guild:
             return
         
+        # Archived whether or not new messages are logged, so a later
+        # deletion can show the files.
+        if message.attachments and self.bot.archiver.is_enabled(message.guild.id):
+            self.bot.archiver.submit(message)
+        
         config = self.bot.config_manager.get_guild_config(message.guild.id)
         if not config.get('log_messages', True):
+            self.record_drop("message", "config", message.guild.id)
             return
         
         log_channel = await self.bot.get_log_channel(message.guild.id, 'messages')
         if not log_channel:
+            self.record_drop("message", "no_channel", message.guild.id)
+            return
+        
+        if config.get('collapse_duplicates', True) and self.bot.duplicates.is_repeat(message, log_channel, config):
+            self.record_drop("message", "duplicate", message.guild.id)
             return
         
         embed = create_embed(
@@ -73,10 +138,7 @@ class EventHandler:
         embed.set_thumbnail(url=get_user_avatar(message.author))
         embed.set_footer(text=f"Message ID: {message.id}")
         
-        try:
-            await log_channel.send(embed=embed)
-        except discord.HTTPException as e:
-            self.logger.error(f"Failed to log message: {e}")
+        await self.send_log(log_channel, embed, "message", "message", event_time=message.created_at)
     
     async def on_message_edit(self, before, after):
         if before.author.bot:
@@ -90,10 +152,12 @@ class EventHandler:
         
         config = self.bot.config_manager.get_guild_config(before.guild.id)
         if not config.get('log_edits', True):
+            self.record_drop("message_edit", "config", before.guild.id)
             return
         
         log_channel = await self.bot.get_log_channel(before.guild.id, 'edits')
         if not log_channel:
+            self.record_drop("message_edit", "no_channel", before.guild.id)
             return
         
         embed = create_embed(
@@ -114,25 +178,24 @@ class EventHandler:
             inline=True
         )
         
-        if before.content:
-            content = before.content
-            if len(content) > 1024:
-                content = content[:1021] + "..."
-            embed.add_field(
-                name="Before",
-                value=content,
-                inline=False
-            )
+        spans = diff_words(before.content, after.content)
+        changes = render_diff(spans)
+        removed, added = get_diff_stats(spans)
         
-        if after.content:
-            content = after.content
-            if len(content) > 1024:
-                content = content[:1021] + "..."
-            embed.add_field(
-                name="After",
-                value=content,
-                inline=False
-            )
+        # Only when the changes do not fit does the log carry the full text.
+        files = None
+        if len(changes) > 1024:
+            changes = render_diff(spans, limit=1024)
+            files = [discord.File(
+                io.BytesIO(f"Before:\n{before.content}\n\nAfter:\n{after.content}\n".encode('utf-8')),
+                filename=f"edit-{after.id}.txt"
+            )]
+        
+        embed.add_field(
+            name=f"Changes (-{removed} +{added} characters)",
+            value=changes,
+            inline=False
+        )
         
         embed.add_field(
             name="Jump to Message",
@@ -143,10 +206,7 @@ class EventHandler:
         embed.set_thumbnail(url=get_user_avatar(before.author))
         embed.set_footer(text=f"Message ID: {before.id}")
         
-        try:
-            await log_channel.send(embed=embed)
-        except discord.HTTPException as e:
-            self.logger.error(f"Failed to log message edit: {e}")
+        await self.send_log(log_channel, embed, "message_edit", "message edit", event_time=after.edited_at, files=files)
     
     async def on_message_delete(self, message):
         if message.author.bot:
@@ -157,10 +217,14 @@ class EventHandler:
         
         config = self.bot.config_manager.get_guild_config(message.guild.id)
         if not config.get('log_deletions', True):
+            self.record_drop("message_delete", "config", message.guild.id)
+            self.bot.archiver.release(message.id)
             return
         
         log_channel = await self.bot.get_log_channel(message.guild.id, 'deletions')
         if not log_channel:
+            self.record_drop("message_delete", "no_channel", message.guild.id)
+            self.bot.archiver.release(message.id)
             return
         
         embed = create_embed(
@@ -210,8 +274,12 @@ class EventHandler:
                 inline=False
             )
         
+        files = None
         if message.attachments:
             attachments = "\n".join([att.filename for att in message.attachments])
+            files = self.bot.archiver.get_files(message)
+            if files:
+                attachments += f"\n({len(files)} archived {'copy' if len(files) == 1 else 'copies'} attached)"
             embed.add_field(
                 name="Attachments",
                 value=attachments,
@@ -221,18 +289,18 @@ class EventHandler:
         embed.set_thumbnail(url=get_user_avatar(message.author))
         embed.set_footer(text=f"Message ID: {message.id}")
         
-        try:
-            await log_channel.send(embed=embed)
-        except discord.HTTPException as e:
-            self.logger.error(f"Failed to log message deletion: {e}")
+        await self.send_log(log_channel, embed, "message_delete", "message deletion", files=files)
+        self.bot.archiver.release(message.id)
     
     async def on_member_join(self, member):
         config = self.bot.config_manager.get_guild_config(member.guild.id)
         if not config.get('log_joins', True):
+            self.record_drop("member_join", "config", member.guild.id)
             return
         
         log_channel = await self.bot.get_log_channel(member.guild.id, 'joins')
         if not log_channel:
+            self.record_drop("member_join", "no_channel", member.guild.id)
             return
         
         embed = create_embed(
@@ -262,18 +330,17 @@ class EventHandler:
         embed.set_thumbnail(url=get_user_avatar(member))
         embed.set_footer(text=f"User ID: {member.id}")
         
-        try:
-            await log_channel.send(embed=embed)
-        except discord.HTTPException as e:
-            self.logger.error(f"Failed to log member join: {e}")
+        await self.send_log(log_channel, embed, "member_join", "member join")
     
     async def on_member_remove(self, member):
         config = self.bot.config_manager.get_guild_config(member.guild.id)
         if not config.get('log_leaves', True):
+            self.record_drop("member_remove", "config", member.guild.id)
             return
         
         log_channel = await self.bot.get_log_channel(member.guild.id, 'leaves')
         if not log_channel:
+            self.record_drop("member_remove", "no_channel", member.guild.id)
             return
         
         embed = create_embed(
@@ -313,14 +380,12 @@ class EventHandler:
         embed.set_thumbnail(url=get_user_avatar(member))
         embed.set_footer(text=f"User ID: {member.id}")
         
-        try:
-            await log_channel.send(embed=embed)
-        except discord.HTTPException as e:
-            self.logger.error(f"Failed to log member leave: {e}")
+        await self.send_log(log_channel, embed, "member_remove", "member leave")
     
     async def on_member_update(self, before, after):
         config = self.bot.config_manager.get_guild_config(before.guild.id)
         if not config.get('log_role_changes', True):
+            self.record_drop("member_update", "config", before.guild.id)
             return
         
         if before.roles == after.roles:
@@ -328,6 +393,7 @@ class EventHandler:
         
         log_channel = await self.bot.get_log_channel(before.guild.id, 'roles')
         if not log_channel:
+            self.record_drop("member_update", "no_channel", before.guild.id)
             return
         
         added_roles = set(after.roles) - set(before.roles)
@@ -364,18 +430,17 @@ class EventHandler:
         embed.set_thumbnail(url=get_user_avatar(after))
         embed.set_footer(text=f"User ID: {after.id}")
         
-        try:
-            await log_channel.send(embed=embed)
-        except discord.HTTPException as e:
-            self.logger.error(f"Failed to log role change: {e}")
+        await self.send_log(log_channel, embed, "member_update", "role change")
     
     async def on_voice_state_update(self, member, before, after):
         config = self.bot.config_manager.get_guild_config(member.guild.id)
         if not config.get('log_voice', True):
+            self.record_drop("voice_state_update", "config", member.guild.id)
             return
         
         log_channel = await self.bot.get_log_channel(member.guild.id, 'voice')
         if not log_channel:
+            self.record_drop("voice_state_update", "no_channel", member.guild.id)
             return
         
         embed = None
@@ -430,10 +495,7 @@ class EventHandler:
             embed.set_thumbnail(url=get_user_avatar(member))
             embed.set_footer(text=f"User ID: {member.id}")
             
-            try:
-                await log_channel.send(embed=embed)
-            except discord.HTTPException as e:
-                self.logger.error(f"Failed to log voice activity: {e}")
+            await self.send_log(log_channel, embed, "voice_state_update", "voice activity")
     
     async def on_guild_join(self, guild):
         self.logger.info(f"Joined guild: {guild.name} ({guild.id})")
@@ -451,6 +513,10 @@ class EventHandler:
             await ctx.send(f"Missing required argument: `{error.param.name}`")
             return
         
+        if isinstance(error, RateLimited):
+            await ctx.send(f"You're using commands too quickly. Try again in {error.retry_after:.0f}s.")
+            return
+        
         if isinstance(error, commands.BadArgument):
             await ctx.send("Invalid argument provided.")
             return
@@ -0,0 +1,145 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+from .metrics import EVENTS_DROPPED, PIPELINE, SEND_QUEUE_DELAY
+
+MAX_SEND_WEIGHT = 100
+
+class FairSendQueue:
+    # Weighted fair queueing of log sends across guilds (start-time fair
+    # queueing). Each send gets a start tag of max(virtual time, the finish
+    # tag of its guild's previous send), and finishes 1 / weight later;
+    # senders always take the lowest start tag. A busy guild's sends are
+    # spaced out on the virtual clock while a guild that was idle starts at
+    # the current virtual time, so it goes next instead of waiting behind
+    # the backlog.
+    def __init__(self, bot, concurrency=8, max_pending=500):
+        self.bot = bot
+        self.concurrency = max(1, concurrency)
+        self.max_pending = max_pending
+        self.logger = logging.getLogger(__name__)
+        
+        self.heap = []
+        self.sequence = itertools.count()
+        self.virtual_time = 0.0
+        # guild id -> finish tag of its last queued send, while it has any.
+        self.finish_tags = {}
+        self.pending = {}
+        self.active = 0
+        self.ready = None
+        self.idle = None
+        self.workers = []
+        self.cancelled = []
+        self.dropped = 0
+    
+    def get_weight(self, guild_id):
+        config = self.bot.config_manager.get_guild_config(guild_id)
+        try:
+            weight = float(config.get('send_weight', 1))
+        except (TypeError, ValueError):
+            return 1.0
+        return min(max(weight, 1 / MAX_SEND_WEIGHT), MAX_SEND_WEIGHT)
+    
+    def start(self):
+        if self.workers:
+            return
+        
+        self.ready = asyncio.Event()
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.workers = [
+            asyncio.create_task(self.run_sender(), name=f"log-sender-{index}")
+            for index in range(self.concurrency)
+        ]
+    
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+    
+    async def submit(self, guild_id, event_name, send, *args):
+        if not self.workers:
+            await send(*args)
+            return
+        
+        pending = self.pending.get(guild_id, 0)
+        if pending >= self.max_pending:
+            # Only this guild's backlog is full; everyone else keeps going.
+            self.dropped += 1
+            EVENTS_DROPPED.labels(event_name, "send_backlog").inc()
+            PIPELINE.record_drop(guild_id)
+            return
+        
+        start_tag = max(self.virtual_time, self.finish_tags.get(guild_id, 0.0))
+        self.finish_tags[guild_id] = start_tag + 1 / self.get_weight(guild_id)
+        self.pending[guild_id] = pending + 1
+        
+        heapq.heappush(self.heap, (start_tag, next(self.sequence), guild_id, time.monotonic(), send, args))
+        self.idle.clear()
+        self.ready.set()
+    
+    async def run_sender(self):
+        while True:
+            if not self.heap:
+                self.ready.clear()
+                await self.ready.wait()
+                continue
+            
+            start_tag, _, guild_id, queued_at, send, args = heapq.heappop(self.heap)
+            self.virtual_time = start_tag
+            
+            pending = self.pending[guild_id] - 1
+            if pending:
+                self.pending[guild_id] = pending
+            else:
+                # Caught up; its next send starts from the virtual time.
+                del self.pending[guild_id]
+                del self.finish_tags[guild_id]
+            
+            waited = time.monotonic() - queued_at
+            SEND_QUEUE_DELAY.observe(waited)
+            PIPELINE.record_send_wait(guild_id, waited)
+            
+            self.active += 1
+            try:
+                await send(*args)
+            except asyncio.CancelledError:
+                # Stopped at shutdown mid-send; kept for flush() to hand
+                # over, even though it may have gone out.
+                self.cancelled.append((send, args))
+                raise
+            except Exception:
+                self.logger.exception(f"Error sending log for guild {guild_id}")
+            finally:
+                self.active -= 1
+                if not self.heap and not self.active:
+                    self.idle.set()
+    
+    async def flush(self, timeout):
+        # Waits for queued sends to go out, then stops the senders; returns
+        # the sends that were never started, in order, as (send, args).
+        if self.workers:
+            try:
+                await asyncio.wait_for(self.idle.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        
+        await self.stop()
+        unsent = self.cancelled + [(send, args) for _, _, _, _, send, args in sorted(self.heap)]
+        self.cancelled = []
+        self.heap.clear()
+        self.pending.clear()
+        self.finish_tags.clear()
+        return unsent
+    
+    def get_stats(self):
+        return {
+            "queued": len(self.heap),
+            "guilds": len(self.pending),
+            "sending": self.active,
+            "dropped": self.dropped
+        }
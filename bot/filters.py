@@ -0,0 +1,168 @@
+import logging
+import re
+
+IGNORE_KINDS = ('channels', 'users', 'roles', 'patterns')
+MAX_IGNORE_RULES = 1000
+MAX_PATTERN_LENGTH = 200
+# Zero-width anchors a pattern may start with and still share its leading
+# text with others.
+PATTERN_ANCHORS = ("\\b", "^")
+QUANTIFIERS = "*+?{"
+LITERAL_PUNCTUATION = " _-'\"/:@#%&=<>,;~`!"
+
+class CompiledFilter:
+    __slots__ = ("source", "channels", "users", "roles", "pattern", "empty")
+    
+    def __init__(self, source, channels=(), users=(), roles=(), pattern=None):
+        # The ignore rules this was compiled from, to spot config changes.
+        self.source = source
+        self.channels = frozenset(channels)
+        self.users = frozenset(users)
+        self.roles = frozenset(roles)
+        self.pattern = pattern
+        self.empty = not (self.channels or self.users or self.roles or pattern)
+    
+    def matches(self, channel=None, member=None, content=None):
+        if channel is not None and self.channels and (
+            channel.id in self.channels
+            # Ignoring a category covers its channels, and a channel its threads.
+            or getattr(channel, 'category_id', None) in self.channels
+            or getattr(channel, 'parent_id', None) in self.channels
+        ):
+            return True
+        
+        if member is not None:
+            if member.id in self.users:
+                return True
+            if self.roles and not self.roles.isdisjoint(role.id for role in getattr(member, 'roles', ())):
+                return True
+        
+        return bool(content and self.pattern and self.pattern.search(content))
+
+def check_pattern(pattern):
+    # The reason a pattern cannot be used, or None. Patterns are joined into
+    # one regex, so group names and numbers would clash.
+    if len(pattern) > MAX_PATTERN_LENGTH:
+        return f"patterns can be at most {MAX_PATTERN_LENGTH} characters"
+    if "(?P" in pattern or re.search(r"\\[1-9]", pattern):
+        return "patterns cannot use named groups or backreferences"
+    try:
+        re.compile(f"(?:{pattern})")
+    except re.error as e:
+        return str(e)
+    return None
+
+def has_alternation(pattern):
+    # Whether the pattern has a | outside any group or character class.
+    depth = 0
+    in_class = False
+    escaped = False
+    for char in pattern:
+        if escaped:
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif in_class:
+            in_class = char != ']'
+        elif char == '[':
+            in_class = True
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == '|' and not depth:
+            return True
+    return False
+
+def split_literal(pattern):
+    # Splits a pattern into a leading anchor, the literal text after it
+    # (lowercased, as matching ignores case) and the rest.
+    if has_alternation(pattern):
+        return "", "", pattern
+    
+    anchor = next((anchor for anchor in PATTERN_ANCHORS if pattern.startswith(anchor)), "")
+    literal = []
+    index = len(anchor)
+    while index < len(pattern):
+        char = pattern[index]
+        if char == '\\' and index + 1 < len(pattern) and not pattern[index + 1].isalnum():
+            char = pattern[index + 1]
+            step = 2
+        elif (char.isascii() and char.isalnum()) or char in LITERAL_PUNCTUATION:
+            step = 1
+        else:
+            break
+        if index + step < len(pattern) and pattern[index + step] in QUANTIFIERS:
+            break
+        literal.append(char.lower())
+        index += step
+    return anchor, "".join(literal), pattern[index:]
+
+def build_alternation(node):
+    branches = [re.escape(char) + build_alternation(node[char]) for char in sorted(key for key in node if key is not None)]
+    branches.extend(f"(?:{rest})" if rest else "" for rest in node.get(None, ()))
+    if len(branches) == 1:
+        return branches[0]
+    return "(?:" + "|".join(branches) + ")"
+
+def compile_patterns(patterns):
+    # All patterns as one regex, so a message is scanned once however many
+    # there are. re tries the branches of an alternation one by one, so
+    # leading literal text is merged into a trie: at each position only
+    # patterns that agree so far are followed. A pattern that cannot be
+    # used is left out.
+    tries = {}
+    others = []
+    for pattern in patterns:
+        error = check_pattern(pattern)
+        if error:
+            logging.getLogger(__name__).warning(f"Skipping ignore pattern {pattern!r}: {error}")
+            continue
+        
+        anchor, literal, rest = split_literal(pattern)
+        if not literal:
+            others.append(f"(?:{pattern})")
+            continue
+        
+        node = tries.setdefault(anchor, {})
+        for char in literal:
+            node = node.setdefault(char, {})
+        node.setdefault(None, []).append(rest)
+    
+    branches = [anchor + build_alternation(trie) for anchor, trie in tries.items()] + others
+    if not branches:
+        return None
+    return re.compile("|".join(branches), re.IGNORECASE)
+
+def compile_filter(rules):
+    if not rules:
+        return CompiledFilter(rules)
+    
+    return CompiledFilter(
+        rules,
+        channels=rules.get('channels', ()),
+        users=rules.get('users', ()),
+        roles=rules.get('roles', ()),
+        pattern=compile_patterns(rules.get('patterns', ()))
+    )
+
+class LogFilters:
+    # Per-guild ignore rules from the "ignore" config key: channel (or
+    # category), user and role ids, and regex patterns for message content.
+    # Each guild's rules are compiled into id sets and a single regex the
+    # first time they are used, and again whenever the config holds a
+    # different rules dict; commands replace it rather than edit it.
+    def __init__(self, bot):
+        self.bot = bot
+        self.compiled = {}
+    
+    def get(self, guild_id):
+        rules = self.bot.config_manager.get_guild_config(guild_id).get('ignore')
+        compiled = self.compiled.get(guild_id)
+        if compiled is None or compiled.source is not rules:
+            compiled = self.compiled[guild_id] = compile_filter(rules)
+        return compiled
+    
+    def is_ignored(self, guild_id, channel=None, member=None, content=None):
+        compiled = self.get(guild_id)
+        return not compiled.empty and compiled.matches(channel, member, content)
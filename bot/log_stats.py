@@ -0,0 +1,240 @@
+import json
+import logging
+import os
+import re
+from collections import Counter
+
+from .logger import COMPRESSED_EXTENSIONS, get_segments
+
+LINE_PATTERN = re.compile(r"^\S+ \S+ - (\S+) - (\w+) - (.*)$")
+COMMAND_PATTERN = re.compile(
+    r"^(SUCCESS|FAILED) - Command: (.+?) \| User: .*? \((\d+)\) \| Guild: .*? \((\d+|N/A)\)"
+)
+GUILD_PATTERN = re.compile(r"\| Guild: (\d+)")
+CONTEXT_PATTERN = re.compile(r"^Context: (.+?) \|")
+
+CHUNK_SIZE = 1024 * 1024
+MAX_TRACKED_USERS = 10000
+
+class LogAnalyzer:
+    def __init__(self, log_dir="logs", log_files=("events.log", "commands.log", "errors.log")):
+        self.log_dir = log_dir
+        self.log_files = log_files
+        self.state_path = os.path.join(log_dir, ".stats_state.json")
+        self.logger = logging.getLogger(__name__)
+        
+        self.offsets = {}
+        self.guilds = {}
+        self.events = Counter()
+        self.commands = Counter()
+        self.failed_commands = Counter()
+        self.errors = Counter()
+        self.command_users = Counter()
+        self.lines = 0
+        
+        self.load_state()
+    
+    def load_state(self):
+        try:
+            with open(self.state_path, 'r') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return
+        except json.JSONDecodeError as e:
+            self.logger.error(f"Error loading log stats state: {e}")
+            return
+        
+        self.offsets = state.get("offsets", {})
+        self.guilds = {guild_id: Counter(counts) for guild_id, counts in state.get("guilds", {}).items()}
+        self.events = Counter(state.get("events", {}))
+        self.commands = Counter(state.get("commands", {}))
+        self.failed_commands = Counter(state.get("failed_commands", {}))
+        self.errors = Counter(state.get("errors", {}))
+        self.command_users = Counter(state.get("command_users", {}))
+        self.lines = state.get("lines", 0)
+    
+    def save_state(self):
+        state = {
+            "offsets": self.offsets,
+            "guilds": self.guilds,
+            "events": self.events,
+            "commands": self.commands,
+            "failed_commands": self.failed_commands,
+            "errors": self.errors,
+            "command_users": self.command_users,
+            "lines": self.lines
+        }
+        
+        temp_path = f"{self.state_path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(temp_path, self.state_path)
+    
+    def update(self):
+        read_bytes = 0
+        
+        for log_file in self.log_files:
+            read_bytes += self.scan_file(os.path.join(self.log_dir, log_file), log_file)
+        
+        if len(self.command_users) > MAX_TRACKED_USERS:
+            self.command_users = Counter(dict(self.command_users.most_common(MAX_TRACKED_USERS // 2)))
+        
+        self.save_state()
+        return read_bytes
+    
+    def scan_file(self, path, log_file):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return 0
+        
+        inode, offset = self.offsets.get(log_file, (None, 0))
+        read_bytes = 0
+        
+        # A new inode means the log was rotated since the last run. The old
+        # file is still among the segments until it is compressed, so the
+        # part of it not read yet is counted first.
+        if inode is not None and inode != stat.st_ino:
+            segment = self.find_segment(path, inode)
+            if segment:
+                try:
+                    read_bytes += self.read_lines(segment, offset) - offset
+                except OSError:
+                    # Compressed away in the meantime.
+                    pass
+            offset = 0
+        elif stat.st_size < offset:
+            # Cleared since the last run.
+            offset = 0
+        
+        new_offset = self.read_lines(path, offset)
+        self.offsets[log_file] = (stat.st_ino, new_offset)
+        return read_bytes + new_offset - offset
+    
+    def find_segment(self, path, inode):
+        for segment in get_segments(path):
+            if segment.endswith(tuple(COMPRESSED_EXTENSIONS.values())):
+                continue
+            try:
+                if os.stat(segment).st_ino == inode:
+                    return segment
+            except OSError:
+                continue
+        return None
+    
+    def read_lines(self, path, offset):
+        # Returns the offset after the last complete line; a partially
+        # written last line is read again on the next run.
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            remainder = b""
+            
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                
+                offset += len(chunk)
+                lines = (remainder + chunk).split(b"\n")
+                remainder = lines.pop()
+                
+                for line in lines:
+                    self.process_line(line.decode('utf-8', 'replace'))
+        
+        return offset - len(remainder)
+    
+    def process_line(self, line):
+        if not line:
+            return
+        
+        self.lines += 1
+        
+        if line.startswith("{"):
+            try:
+                self.process_record(json.loads(line))
+            except json.JSONDecodeError:
+                pass
+            return
+        
+        match = LINE_PATTERN.match(line)
+        if not match:
+            return
+        
+        logger_name, level, message = match.groups()
+        
+        if logger_name == "events":
+            guild = GUILD_PATTERN.search(message)
+            self.count_event(message.split(" - ", 1)[0], guild.group(1) if guild else None)
+        elif logger_name == "commands":
+            command = COMMAND_PATTERN.match(message)
+            if command:
+                status, name, user_id, guild_id = command.groups()
+                self.count_command(name, status == "SUCCESS", user_id, None if guild_id == "N/A" else guild_id)
+        elif level == "ERROR":
+            guild = GUILD_PATTERN.search(message)
+            context = CONTEXT_PATTERN.match(message) if logger_name == "errors" else None
+            self.count_error(context.group(1) if context else logger_name, guild.group(1) if guild else None)
+    
+    def process_record(self, record):
+        record_type = record.get("type")
+        guild_id = record.get("guild_id")
+        guild_id = str(guild_id) if guild_id is not None else None
+        
+        if record_type == "event":
+            self.count_event(record.get("event"), guild_id)
+        elif record_type == "command":
+            user_id = record.get("user_id")
+            self.count_command(
+                record.get("command"),
+                record.get("success", True),
+                str(user_id) if user_id is not None else None,
+                guild_id
+            )
+        elif record.get("level") == "ERROR":
+            self.count_error(record.get("context") or record.get("logger"), guild_id)
+    
+    def get_guild(self, guild_id):
+        if guild_id not in self.guilds:
+            self.guilds[guild_id] = Counter()
+        return self.guilds[guild_id]
+    
+    def count_event(self, event_name, guild_id):
+        self.events[event_name] += 1
+        if guild_id:
+            self.get_guild(guild_id)["events"] += 1
+    
+    def count_command(self, command_name, success, user_id, guild_id):
+        self.commands[command_name] += 1
+        if not success:
+            self.failed_commands[command_name] += 1
+        if user_id:
+            self.command_users[user_id] += 1
+        if guild_id:
+            self.get_guild(guild_id)["commands"] += 1
+    
+    def count_error(self, context, guild_id):
+        self.errors[context] += 1
+        if guild_id:
+            self.get_guild(guild_id)["errors"] += 1
+    
+    def get_error_rate(self, counts):
+        total = counts["events"] + counts["errors"]
+        return counts["errors"] / total if total else 0.0
+    
+    def get_top_guilds(self, limit=5):
+        return sorted(
+            self.guilds.items(),
+            key=lambda item: item[1]["events"] + item[1]["commands"] + item[1]["errors"],
+            reverse=True
+        )[:limit]
+    
+    def reset(self):
+        self.offsets = {}
+        self.guilds = {}
+        self.events = Counter()
+        self.commands = Counter()
+        self.failed_commands = Counter()
+        self.errors = Counter()
+        self.command_users = Counter()
+        self.lines = 0
+        self.save_state()
@@ -1,130 +1,471 @@
+import gzip
+import json
 import logging
 import os
+import queue
+import shutil
+import sys
+import threading
+import time
 from datetime import datetime
-from logging.handlers import RotatingFileHandler
+from logging.handlers import TimedRotatingFileHandler, QueueHandler, QueueListener
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSED_EXTENSIONS = {"gzip": ".gz", "zstd": ".zst"}
+
+class LogPayload:
+    # Log messages that keep references to the objects being logged and only
+    # turn them into text (__str__) or a dict (fields()) when a handler
+    # writes the record.
+    __slots__ = ()
+
+class CommandPayload(LogPayload):
+    __slots__ = ("ctx", "command_name", "success", "latency_ms")
+    
+    def __init__(self, ctx, command_name, success, latency_ms):
+        self.ctx = ctx
+        self.command_name = command_name
+        self.success = success
+        self.latency_ms = latency_ms
+    
+    def fields(self):
+        ctx = self.ctx
+        return {
+            "type": "command",
+            "command": self.command_name,
+            "success": self.success,
+            "user": str(ctx.author),
+            "user_id": ctx.author.id,
+            "guild": ctx.guild.name if ctx.guild else None,
+            "guild_id": ctx.guild.id if ctx.guild else None,
+            "channel": getattr(ctx.channel, 'name', None),
+            "channel_id": ctx.channel.id,
+            "latency_ms": self.latency_ms
+        }
+    
+    def __str__(self):
+        ctx = self.ctx
+        status = "SUCCESS" if self.success else "FAILED"
+        message = (
+            f"{status} - Command: {self.command_name} | "
+            f"User: {ctx.author} ({ctx.author.id}) | "
+            f"Guild: {ctx.guild.name if ctx.guild else 'DM'} ({ctx.guild.id if ctx.guild else 'N/A'}) | "
+            f"Channel: {ctx.channel.name if hasattr(ctx.channel, 'name') else 'DM'} ({ctx.channel.id})"
+        )
+        if self.latency_ms is not None:
+            message += f" | Latency: {self.latency_ms:.1f}ms"
+        return message
+
+class EventPayload(LogPayload):
+    __slots__ = ("event_name", "details", "guild_id")
+    
+    def __init__(self, event_name, details, guild_id):
+        self.event_name = event_name
+        self.details = details
+        self.guild_id = guild_id
+    
+    def fields(self):
+        return {
+            "type": "event",
+            "event": self.event_name,
+            "guild_id": self.guild_id,
+            "details": str(self.details)
+        }
+    
+    def __str__(self):
+        if self.guild_id is None:
+            return f"{self.event_name} - {self.details}"
+        return f"{self.event_name} - {self.details} | Guild: {self.guild_id}"
+
+class ErrorPayload(LogPayload):
+    __slots__ = ("error", "context", "guild_id")
+    
+    def __init__(self, error, context, guild_id):
+        self.error = error
+        self.context = context
+        self.guild_id = guild_id
+    
+    def fields(self):
+        return {
+            "type": "error",
+            "context": self.context,
+            "guild_id": self.guild_id,
+            "error": str(self.error)
+        }
+    
+    def __str__(self):
+        message = f"Context: {self.context} | " if self.context else ""
+        if self.guild_id is not None:
+            message += f"Guild: {self.guild_id} | "
+        return message + f"Error: {self.error}"
+
+class GuildActionPayload(LogPayload):
+    __slots__ = ("guild", "action", "details")
+    
+    def __init__(self, guild, action, details):
+        self.guild = guild
+        self.action = action
+        self.details = details
+    
+    def fields(self):
+        return {
+            "type": "guild_action",
+            "guild": self.guild.name,
+            "guild_id": self.guild.id,
+            "action": self.action,
+            "details": str(self.details)
+        }
+    
+    def __str__(self):
+        return f"Guild: {self.guild.name} ({self.guild.id}) | Action: {self.action} | Details: {self.details}"
+
+class UserActionPayload(LogPayload):
+    __slots__ = ("user", "action", "details")
+    
+    def __init__(self, user, action, details):
+        self.user = user
+        self.action = action
+        self.details = details
+    
+    def fields(self):
+        return {
+            "type": "user_action",
+            "user": str(self.user),
+            "user_id": self.user.id,
+            "action": self.action,
+            "details": str(self.details)
+        }
+    
+    def __str__(self):
+        return f"User: {self.user} ({self.user.id}) | Action: {self.action} | Details: {self.details}"
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "logger": record.name,
+            "level": record.levelname
+        }
+        
+        if isinstance(record.msg, LogPayload):
+            entry.update(record.msg.fields())
+        else:
+            entry["message"] = record.getMessage()
+        
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        
+        return json.dumps(entry, default=str)
+
+class DeferredQueueHandler(QueueHandler):
+    def prepare(self, record):
+        # Payload records are formatted by the listener's handlers instead of
+        # on the calling thread; everything else is prepared as usual.
+        if isinstance(record.msg, LogPayload) and not record.exc_info:
+            return record
+        return super().prepare(record)
+
+class SegmentCompressor:
+    def __init__(self, compression="gzip", max_age_days=30, backup_count=0):
+        if compression == "zstd" and zstandard is None:
+            logging.getLogger(__name__).warning("zstandard is not installed, compressing log segments with gzip")
+            compression = "gzip"
+        
+        self.compression = compression
+        self.extension = COMPRESSED_EXTENSIONS.get(compression, "")
+        self.max_age = max_age_days * 86400 if max_age_days else None
+        self.backup_count = backup_count
+        
+        self.queue = queue.Queue()
+        self.thread = None
+    
+    def start(self):
+        if self.thread:
+            return
+        
+        self.thread = threading.Thread(target=self.run, name="log-compressor", daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        if not self.thread:
+            return
+        
+        # Segments still waiting are left uncompressed and picked up by
+        # compress_leftovers() on the next start; only the one in progress
+        # is finished.
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+    
+    def submit(self, segment_path, base_path):
+        self.queue.put((segment_path, base_path))
+    
+    def run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            
+            segment_path, base_path = job
+            try:
+                self.compress(segment_path)
+                self.prune(base_path)
+            except Exception as e:
+                # Logging from here would feed back into the handlers that
+                # produced the segment, so report straight to stderr.
+                print(f"Error compressing log segment {segment_path}: {e}", file=sys.stderr)
+    
+    def compress(self, segment_path):
+        if not self.extension or not os.path.exists(segment_path):
+            return
+        
+        target_path = segment_path + self.extension
+        temp_path = target_path + ".tmp"
+        
+        with open(segment_path, 'rb') as source:
+            if self.compression == "zstd":
+                with open(temp_path, 'wb') as target:
+                    zstandard.ZstdCompressor().copy_stream(source, target)
+            else:
+                with gzip.open(temp_path, 'wb') as target:
+                    shutil.copyfileobj(source, target, 1024 * 1024)
+        
+        # Keep the segment's mtime so age-based pruning sees when it was
+        # written rather than when it was compressed.
+        stat = os.stat(segment_path)
+        os.utime(temp_path, (stat.st_atime, stat.st_mtime))
+        os.replace(temp_path, target_path)
+        os.remove(segment_path)
+    
+    def prune(self, base_path):
+        segments = get_segments(base_path)
+        now = time.time()
+        
+        if self.max_age:
+            expired = [segment for segment in segments if now - os.path.getmtime(segment) > self.max_age]
+            for segment in expired:
+                os.remove(segment)
+            segments = segments[len(expired):]
+        
+        if self.backup_count and len(segments) > self.backup_count:
+            for segment in segments[:-self.backup_count]:
+                os.remove(segment)
+    
+    def compress_leftovers(self, base_path):
+        for segment in get_segments(base_path):
+            if not segment.endswith(tuple(COMPRESSED_EXTENSIONS.values())):
+                self.submit(segment, base_path)
+
+def get_segments(base_path):
+    directory = os.path.dirname(base_path) or "."
+    prefix = os.path.basename(base_path) + "."
+    
+    segments = []
+    for filename in os.listdir(directory):
+        if not filename.startswith(prefix) or filename.endswith(".tmp"):
+            continue
+        
+        path = os.path.join(directory, filename)
+        try:
+            segments.append((os.path.getmtime(path), path))
+        except OSError:
+            # Removed by the compressor between listdir() and stat().
+            continue
+    
+    segments.sort()
+    return [path for _, path in segments]
+
+class CompressingRotatingFileHandler(TimedRotatingFileHandler):
+    # Rotates on a schedule (and optionally on size) on the writing thread,
+    # which only renames the file; compression and pruning happen on the
+    # compressor's own thread.
+    def __init__(self, filename, compressor, when="midnight", max_bytes=0):
+        super().__init__(filename, when=when, backupCount=0, encoding="utf-8")
+        self.compressor = compressor
+        self.max_bytes = max_bytes
+        self.namer = self.unique_segment_name
+        self.rotator = self.rotate_segment
+    
+    def shouldRollover(self, record):
+        if super().shouldRollover(record):
+            return True
+        
+        if self.max_bytes and self.stream is not None:
+            return self.stream.tell() >= self.max_bytes
+        
+        return False
+    
+    def unique_segment_name(self, name):
+        # Size-based rollovers can happen several times within one period.
+        candidate = name
+        counter = 1
+        while os.path.exists(candidate) or os.path.exists(candidate + self.compressor.extension):
+            candidate = f"{name}.{counter}"
+            counter += 1
+        return candidate
+    
+    def rotate_segment(self, source, dest):
+        if os.path.exists(source):
+            os.rename(source, dest)
+            self.compressor.submit(dest, self.baseFilename)
 
 class BotLogger:
-    def __init__(self, log_dir="logs", max_file_size=10*1024*1024, backup_count=5):
+    def __init__(self, log_dir="logs", max_file_size=100*1024*1024, backup_count=0, structured=False,
+                 rotation="midnight", compression="gzip", max_age_days=30):
         self.log_dir = log_dir
         self.max_file_size = max_file_size
         self.backup_count = backup_count
+        self.structured = structured
+        self.rotation = rotation
         
         if not os.path.exists(log_dir):
             os.makedirs(log_dir)
         
+        self.handlers = []
+        self.queue = queue.SimpleQueue()
+        self.queue_handler = DeferredQueueHandler(self.queue)
+        self.listener = None
+        self.compressor = SegmentCompressor(
+            compression=compression,
+            max_age_days=max_age_days,
+            backup_count=backup_count
+        )
+        
         self.setup_loggers()
+        self.start()
     
     def setup_loggers(self):
         log_format = logging.Formatter(
             '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
         )
+        self.console_format = log_format
+        
+        if self.structured:
+            log_format = JsonFormatter()
         
         self.setup_main_logger(log_format)
         self.setup_command_logger(log_format)
         self.setup_event_logger(log_format)
         self.setup_error_logger(log_format)
+        
+        # Every record goes through the root logger's single queue handler;
+        # the file and console handlers only ever run on the listener thread.
+        root_logger = logging.getLogger()
+        root_logger.setLevel(logging.INFO)
+        root_logger.addHandler(self.queue_handler)
     
-    def setup_main_logger(self, formatter):
-        main_handler = RotatingFileHandler(
-            os.path.join(self.log_dir, "bot.log"),
-            maxBytes=self.max_file_size,
-            backupCount=self.backup_count
+    def create_file_handler(self, filename, formatter, level, logger_name=None):
+        handler = CompressingRotatingFileHandler(
+            os.path.join(self.log_dir, filename),
+            self.compressor,
+            when=self.rotation,
+            max_bytes=self.max_file_size
         )
-        main_handler.setFormatter(formatter)
-        main_handler.setLevel(logging.INFO)
+        handler.setFormatter(formatter)
+        handler.setLevel(level)
         
-        console_handler = logging.StreamHandler()
-        console_handler.setFormatter(formatter)
-        console_handler.setLevel(logging.INFO)
+        if logger_name:
+            handler.addFilter(logging.Filter(logger_name))
         
-        main_logger = logging.getLogger("bot")
-        main_logger.setLevel(logging.INFO)
-        main_logger.addHandler(main_handler)
-        main_logger.addHandler(console_handler)
+        self.handlers.append(handler)
+        return handler
+    
+    def setup_main_logger(self, formatter):
+        self.create_file_handler("bot.log", formatter, logging.INFO)
         
-        logging.getLogger().addHandler(main_handler)
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(self.console_format)
+        console_handler.setLevel(logging.INFO)
+        self.handlers.append(console_handler)
+        
+        logging.getLogger("bot").setLevel(logging.INFO)
     
     def setup_command_logger(self, formatter):
-        command_handler = RotatingFileHandler(
-            os.path.join(self.log_dir, "commands.log"),
-            maxBytes=self.max_file_size,
-            backupCount=self.backup_count
-        )
-        command_handler.setFormatter(formatter)
-        command_handler.setLevel(logging.INFO)
-        
-        command_logger = logging.getLogger("commands")
-        command_logger.setLevel(logging.INFO)
-        command_logger.addHandler(command_handler)
+        self.create_file_handler("commands.log", formatter, logging.INFO, logger_name="commands")
+        logging.getLogger("commands").setLevel(logging.INFO)
     
     def setup_event_logger(self, formatter):
-        event_handler = RotatingFileHandler(
-            os.path.join(self.log_dir, "events.log"),
-            maxBytes=self.max_file_size,
-            backupCount=self.backup_count
-        )
-        event_handler.setFormatter(formatter)
-        event_handler.setLevel(logging.INFO)
-        
-        event_logger = logging.getLogger("events")
-        event_logger.setLevel(logging.INFO)
-        event_logger.addHandler(event_handler)
+        self.create_file_handler("events.log", formatter, logging.INFO, logger_name="events")
+        logging.getLogger("events").setLevel(logging.INFO)
     
     def setup_error_logger(self, formatter):
-        error_handler = RotatingFileHandler(
-            os.path.join(self.log_dir, "errors.log"),
-            maxBytes=self.max_file_size,
-            backupCount=self.backup_count
-        )
-        error_handler.setFormatter(formatter)
-        error_handler.setLevel(logging.ERROR)
+        self.create_file_handler("errors.log", formatter, logging.ERROR)
+        logging.getLogger("errors").setLevel(logging.ERROR)
+    
+    def start(self):
+        if self.listener:
+            return
         
-        error_logger = logging.getLogger("errors")
-        error_logger.setLevel(logging.ERROR)
-        error_logger.addHandler(error_handler)
+        self.compressor.start()
+        for handler in self.handlers:
+            if isinstance(handler, CompressingRotatingFileHandler):
+                self.compressor.compress_leftovers(handler.baseFilename)
         
-        logging.getLogger().addHandler(error_handler)
+        self.listener = QueueListener(self.queue, *self.handlers, respect_handler_level=True)
+        self.listener.start()
     
-    def log_command(self, ctx, command_name, success=True):
-        command_logger = logging.getLogger("commands")
+    def stop(self):
+        if not self.listener:
+            return
         
-        status = "SUCCESS" if success else "FAILED"
-        message = (
-            f"{status} - Command: {command_name} | "
-            f"User: {ctx.author} ({ctx.author.id}) | "
-            f"Guild: {ctx.guild.name if ctx.guild else 'DM'} ({ctx.guild.id if ctx.guild else 'N/A'}) | "
-            f"Channel: {ctx.channel.name if hasattr(ctx.channel, 'name') else 'DM'} ({ctx.channel.id})"
-        )
+        # QueueListener.stop() writes out everything already queued before
+        # the thread exits.
+        self.listener.stop()
+        self.listener = None
+        
+        logging.getLogger().removeHandler(self.queue_handler)
+        for handler in self.handlers:
+            handler.close()
+        
+        self.compressor.stop()
+    
+    def log_command(self, ctx, command_name, success=True, latency_ms=None):
+        command_logger = logging.getLogger("commands")
+        if not command_logger.isEnabledFor(logging.INFO):
+            return
         
-        command_logger.info(message)
+        command_logger.info(CommandPayload(ctx, command_name, success, latency_ms))
     
-    def log_event(self, event_name, details):
+    def log_event(self, event_name, details, guild_id=None):
         event_logger = logging.getLogger("events")
-        event_logger.info(f"{event_name} - {details}")
+        if not event_logger.isEnabledFor(logging.INFO):
+            return
+        
+        event_logger.info(EventPayload(event_name, details, guild_id))
     
-    def log_error(self, error, context=None):
+    def log_error(self, error, context=None, guild_id=None):
         error_logger = logging.getLogger("errors")
-        
-        if context:
-            error_logger.error(f"Context: {context} | Error: {error}")
-        else:
-            error_logger.error(f"Error: {error}")
+        error_logger.error(ErrorPayload(error, context, guild_id))
     
     def log_guild_action(self, guild, action, details):
         main_logger = logging.getLogger("bot")
-        message = f"Guild: {guild.name} ({guild.id}) | Action: {action} | Details: {details}"
-        main_logger.info(message)
+        if not main_logger.isEnabledFor(logging.INFO):
+            return
+        
+        main_logger.info(GuildActionPayload(guild, action, details))
     
     def log_user_action(self, user, action, details):
         main_logger = logging.getLogger("bot")
-        message = f"User: {user} ({user.id}) | Action: {action} | Details: {details}"
-        main_logger.info(message)
+        if not main_logger.isEnabledFor(logging.INFO):
+            return
+        
+        main_logger.info(UserActionPayload(user, action, details))
     
     def get_log_stats(self):
         stats = {}
         
         for log_file in ["bot.log", "commands.log", "events.log", "errors.log"]:
             file_path = os.path.join(self.log_dir, log_file)
+            segments = get_segments(file_path) if os.path.isdir(self.log_dir) else []
             
             if os.path.exists(file_path):
                 stats[log_file] = {
@@ -136,15 +477,27 @@ class BotLogger:
                     "size": 0,
                     "modified": None
                 }
+            
+            segments_size = 0
+            for segment in segments:
+                try:
+                    segments_size += os.path.getsize(segment)
+                except OSError:
+                    continue
+            
+            stats[log_file]["segments"] = len(segments)
+            stats[log_file]["segments_size"] = segments_size
         
         return stats
     
     def clear_logs(self):
         try:
             for log_file in os.listdir(self.log_dir):
+                file_path = os.path.join(self.log_dir, log_file)
                 if log_file.endswith('.log'):
-                    file_path = os.path.join(self.log_dir, log_file)
                     open(file_path, 'w').close()
+                elif '.log.' in log_file:
+                    os.remove(file_path)
             
             main_logger = logging.getLogger("bot")
             main_logger.info("All log files cleared")
@@ -0,0 +1,507 @@
+import asyncio
+import logging
+import math
+import time
+from bisect import bisect_left
+from aiohttp import web
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def format_labels(labelnames, labelvalues, extra=None):
+    pairs = [f'{name}="{escape_label_value(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+class CounterChild:
+    __slots__ = ("value",)
+    
+    def __init__(self):
+        self.value = 0
+    
+    def inc(self, amount=1):
+        self.value += amount
+
+class HistogramChild:
+    __slots__ = ("bounds", "counts", "sum")
+    
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+    
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+class Metric:
+    metric_type = "untyped"
+    
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+    
+    def labels(self, *labelvalues):
+        # Instrumented call sites cache the returned child where the labels
+        # are fixed, so the hot path is a single attribute increment.
+        # Subclasses provide create_child().
+        try:
+            return self.children[labelvalues]
+        except KeyError:
+            child = self.children[labelvalues] = self.create_child()
+            return child
+    
+    def header(self):
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.metric_type}"
+        ]
+
+class Counter(Metric):
+    metric_type = "counter"
+    
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        if not self.labelnames:
+            self.inc = self.labels().inc
+    
+    def create_child(self):
+        return CounterChild()
+    
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+    
+    def render(self):
+        lines = self.header()
+        for labelvalues, child in list(self.children.items()):
+            lines.append(f"{self.name}{format_labels(self.labelnames, labelvalues)} {format_value(child.value)}")
+        return lines
+
+class Gauge(Metric):
+    metric_type = "gauge"
+    
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.callback = None
+    
+    def create_child(self):
+        return CounterChild()
+    
+    def set(self, value):
+        self.labels().value = value
+    
+    def set_callback(self, callback):
+        # callback() returns (labelvalues, value) pairs and is called at
+        # scrape time, for values that are cheaper to read than to track.
+        self.callback = callback
+    
+    def render(self):
+        lines = self.header()
+        samples = list(self.callback()) if self.callback else [
+            (labelvalues, child.value) for labelvalues, child in list(self.children.items())
+        ]
+        for labelvalues, value in samples:
+            lines.append(f"{self.name}{format_labels(self.labelnames, labelvalues)} {format_value(value)}")
+        return lines
+
+class Histogram(Metric):
+    metric_type = "histogram"
+    
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.bounds = tuple(sorted(buckets))
+        if not self.labelnames:
+            self.observe = self.labels().observe
+    
+    def create_child(self):
+        return HistogramChild(self.bounds)
+    
+    def observe(self, value):
+        self.labels().observe(value)
+    
+    def render(self):
+        lines = self.header()
+        for labelvalues, child in list(self.children.items()):
+            cumulative = 0
+            for bound, count in zip(self.bounds + (math.inf,), child.counts):
+                cumulative += count
+                labels = format_labels(self.labelnames, labelvalues, f'le="{format_value(float(bound))}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {format_value(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = {}
+    
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+    
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+    
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+    
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+    
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = MetricsRegistry()
+
+EVENTS_RECEIVED = REGISTRY.counter(
+    "discord_events_received_total", "Gateway events received, by event handler.", ["event"]
+)
+EVENTS_DROPPED = REGISTRY.counter(
+    "discord_events_dropped_total", "Events that were not logged, by event handler and reason.", ["event", "reason"]
+)
+EMBEDS_SENT = REGISTRY.counter(
+    "log_embeds_sent_total", "Log embeds delivered to log channels, by event handler.", ["event"]
+)
+SEND_FAILURES = REGISTRY.counter(
+    "log_send_failures_total", "Log sends that failed, by HTTP status.", ["status"]
+)
+SEND_LATENCY = REGISTRY.histogram(
+    "log_send_latency_seconds", "Time taken to deliver a log embed."
+)
+EVENT_TO_LOG_DELAY = REGISTRY.histogram(
+    "log_event_delay_seconds", "Time from the Discord event to its log entry being delivered.",
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+)
+RATE_LIMITS = REGISTRY.counter(
+    "discord_http_rate_limited_total", "HTTP 429 responses received from Discord.", ["scope"]
+)
+QUEUE_DEPTH = REGISTRY.gauge(
+    "event_queue_depth", "Events waiting in each dispatcher worker queue.", ["worker"]
+)
+CONFIG_CACHE = REGISTRY.counter(
+    "config_cache_requests_total", "Guild config lookups, by cache result.", ["result"]
+)
+LOOP_LAG = REGISTRY.histogram(
+    "event_loop_lag_seconds", "Delay before a callback scheduled on the event loop runs.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+SEND_QUEUE_DELAY = REGISTRY.histogram(
+    "log_send_queue_seconds", "Time a log send waited in the per-guild fair queue before it started."
+)
+LOG_BATCH_SIZE = REGISTRY.histogram(
+    "log_send_batch_size", "Embeds per batched log message, by how it was delivered.", ["delivery"],
+    buckets=(1, 2, 3, 5, 10)
+)
+ATTACHMENTS_ARCHIVED = REGISTRY.counter(
+    "attachments_archived_total", "Attachment archive attempts, by result.", ["result"]
+)
+DEAD_LETTERS = REGISTRY.counter(
+    "log_dead_letters_total", "Failed log sends kept for retry and what became of them, by result.", ["result"]
+)
+DEAD_LETTER_SIZE = REGISTRY.gauge(
+    "log_dead_letter_queue_size", "Failed log sends waiting to be retried."
+)
+DEAD_LETTER_OLDEST = REGISTRY.gauge(
+    "log_dead_letter_oldest_seconds", "Age of the oldest failed log send waiting to be retried."
+)
+LOOP_STALLS = REGISTRY.counter(
+    "event_loop_stalls_total", "Times the event loop was blocked for longer than the stall threshold."
+)
+
+CONFIG_CACHE_HITS = CONFIG_CACHE.labels("hit")
+CONFIG_CACHE_MISSES = CONFIG_CACHE.labels("miss")
+
+# Sub-buckets per power of two in RollingHistogram, for about 3% relative
+# error on the reported percentiles.
+HISTOGRAM_SUB_BUCKETS = 16
+# PipelineStats folds latency samples into its histograms once this many
+# are waiting, even before the slot ends.
+MAX_PENDING_SAMPLES = 4096
+
+def get_bucket(seconds):
+    mantissa, exponent = math.frexp(seconds * 1e6)
+    return exponent * HISTOGRAM_SUB_BUCKETS + int(mantissa * 2 * HISTOGRAM_SUB_BUCKETS) - HISTOGRAM_SUB_BUCKETS if exponent > 0 else 0
+
+class RollingWindow:
+    # A ring of slots covering the last `window` seconds. Slots that fall out
+    # of the window are cleared lazily when time moves past them. Subclasses
+    # provide create_slot().
+    def __init__(self, window=60, slot_count=6):
+        self.slot_seconds = window / slot_count
+        self.window = window
+        self.current = 0
+        self.slots = [self.create_slot() for _ in range(slot_count)]
+    
+    def get_index(self, now):
+        slot = int(now // self.slot_seconds)
+        slot_count = len(self.slots)
+        
+        if slot != self.current:
+            for expired in range(max(self.current + 1, slot - slot_count + 1), slot + 1):
+                self.slots[expired % slot_count] = self.create_slot()
+            self.current = slot
+        
+        return slot % slot_count
+
+class RollingCounter(RollingWindow):
+    def create_slot(self):
+        return 0
+    
+    def add(self, amount=1, now=None):
+        index = self.get_index(time.monotonic() if now is None else now)
+        self.slots[index] += amount
+    
+    def total(self, now=None):
+        self.get_index(time.monotonic() if now is None else now)
+        return sum(self.slots)
+    
+    def rate(self, now=None):
+        return self.total(now) / self.window
+
+class RollingHistogram(RollingWindow):
+    # Log-linear buckets in the style of HDR histograms: values are recorded
+    # in microseconds and bucketed by power of two, each split linearly into
+    # HISTOGRAM_SUB_BUCKETS, so any range is covered with bounded error.
+    def create_slot(self):
+        return {}
+    
+    def record(self, seconds, now=None):
+        self.add_counts({get_bucket(seconds): 1}, now)
+    
+    def add_counts(self, counts, now=None):
+        slot = self.slots[self.get_index(time.monotonic() if now is None else now)]
+        for bucket, count in counts.items():
+            slot[bucket] = slot.get(bucket, 0) + count
+    
+    def get_bucket_value(self, bucket):
+        if not bucket:
+            return 0.0
+        exponent, sub_bucket = divmod(bucket, HISTOGRAM_SUB_BUCKETS)
+        # The midpoint of the bucket, converted back to seconds.
+        return math.ldexp((HISTOGRAM_SUB_BUCKETS + sub_bucket + 0.5) / (2 * HISTOGRAM_SUB_BUCKETS), exponent) / 1e6
+    
+    def percentiles(self, quantiles, now=None):
+        self.get_index(time.monotonic() if now is None else now)
+        
+        counts = {}
+        for slot in self.slots:
+            for bucket, count in slot.items():
+                counts[bucket] = counts.get(bucket, 0) + count
+        
+        total = sum(counts.values())
+        if not total:
+            return [None] * len(quantiles)
+        
+        results = []
+        buckets = sorted(counts.items())
+        for quantile in quantiles:
+            target = quantile * total
+            cumulative = 0
+            for bucket, count in buckets:
+                cumulative += count
+                if cumulative >= target:
+                    break
+            results.append(self.get_bucket_value(bucket))
+        
+        return results
+    
+    def count(self, now=None):
+        self.get_index(time.monotonic() if now is None else now)
+        return sum(sum(slot.values()) for slot in self.slots)
+
+class WindowStats:
+    def __init__(self, window=60):
+        self.events = RollingCounter(window)
+        self.dropped = RollingCounter(window)
+        self.failed = RollingCounter(window)
+        self.handler_latency = RollingHistogram(window)
+        self.send_latency = RollingHistogram(window)
+        self.send_wait = RollingHistogram(window)
+        self.last_used = 0.0
+
+class PipelineStats:
+    # In-process view of the last minute for the `log metrics` command,
+    # kept globally and per guild. Recording only counts into plain dicts
+    # and lists for the slot in progress; they are folded into the rolling
+    # windows and histograms when the slot ends or the stats are read, so
+    # readers call fold() first. A guild with nothing recorded for a whole
+    # window has nothing left to show, so it is forgotten on the next sweep.
+    def __init__(self, window=60, slot_count=6):
+        self.window = window
+        self.slot_seconds = window / slot_count
+        self.total = WindowStats(window)
+        self.guilds = {}
+        self.events = {}
+        self.dropped = {}
+        self.failed = {}
+        self.handler_times = []
+        self.send_times = []
+        self.wait_times = []
+        self.last_sweep = time.monotonic()
+        self.slot_end = self.get_slot_end(self.last_sweep)
+    
+    def get_slot_end(self, now):
+        return (now // self.slot_seconds + 1) * self.slot_seconds
+    
+    def get_guild(self, guild_id, now):
+        stats = self.guilds.get(guild_id)
+        if stats is None:
+            stats = self.guilds[guild_id] = WindowStats(self.window)
+        stats.last_used = now
+        return stats
+    
+    def sweep(self, now):
+        self.last_sweep = now
+        cutoff = now - self.window
+        for guild_id in [guild_id for guild_id, stats in self.guilds.items() if stats.last_used < cutoff]:
+            del self.guilds[guild_id]
+    
+    def fold(self, now=None):
+        now = time.monotonic() if now is None else now
+        # Everything pending was recorded in the slot ending at slot_end.
+        stamp = min(now, self.slot_end - self.slot_seconds / 2)
+        self.slot_end = self.get_slot_end(now)
+        
+        for name, counts in (("events", self.events), ("dropped", self.dropped), ("failed", self.failed)):
+            for guild_id, count in counts.items():
+                getattr(self.total, name).add(count, stamp)
+                if guild_id:
+                    getattr(self.get_guild(guild_id, stamp), name).add(count, stamp)
+            counts.clear()
+        
+        for name, samples in (
+            ("handler_latency", self.handler_times), ("send_latency", self.send_times), ("send_wait", self.wait_times)
+        ):
+            if not samples:
+                continue
+            # Bucketed once per sample, then added to each window in bulk.
+            total = {}
+            guilds = {}
+            for guild_id, seconds in samples:
+                bucket = get_bucket(seconds)
+                total[bucket] = total.get(bucket, 0) + 1
+                if guild_id:
+                    counts = guilds.setdefault(guild_id, {})
+                    counts[bucket] = counts.get(bucket, 0) + 1
+            getattr(self.total, name).add_counts(total, stamp)
+            for guild_id, counts in guilds.items():
+                getattr(self.get_guild(guild_id, stamp), name).add_counts(counts, stamp)
+            samples.clear()
+        
+        if now - self.last_sweep >= self.window:
+            self.sweep(now)
+    
+    def reset(self):
+        self.fold()
+        self.total = WindowStats(self.window)
+        self.guilds.clear()
+    
+    def count(self, counts, guild_id):
+        if time.monotonic() >= self.slot_end:
+            self.fold()
+        counts[guild_id] = counts.get(guild_id, 0) + 1
+    
+    def add_sample(self, samples, guild_id, seconds):
+        if len(samples) >= MAX_PENDING_SAMPLES or time.monotonic() >= self.slot_end:
+            self.fold()
+        samples.append((guild_id, seconds))
+    
+    def record_event(self, guild_id):
+        self.count(self.events, guild_id)
+    
+    def record_drop(self, guild_id):
+        self.count(self.dropped, guild_id)
+    
+    def record_failure(self, guild_id):
+        self.count(self.failed, guild_id)
+    
+    def record_handler(self, guild_id, seconds):
+        self.add_sample(self.handler_times, guild_id, seconds)
+    
+    def record_send(self, guild_id, seconds):
+        self.add_sample(self.send_times, guild_id, seconds)
+    
+    def record_send_wait(self, guild_id, seconds):
+        self.add_sample(self.wait_times, guild_id, seconds)
+
+PIPELINE = PipelineStats()
+
+class RateLimitLogFilter(logging.Filter):
+    # discord.py retries 429s internally and only reports them through its
+    # loggers, so count them from there. Records are never filtered out.
+    # A global 429 is logged twice, first as a plain rate limit and right
+    # after (with no await in between) as global, so the plain one is only
+    # counted once the current callback has finished without the second.
+    def __init__(self):
+        super().__init__()
+        self.pending = False
+    
+    def filter(self, record):
+        if record.levelno < logging.WARNING or not isinstance(record.msg, str):
+            return True
+        
+        if record.msg.startswith("We are being rate limited."):
+            self.count_pending()
+            try:
+                asyncio.get_running_loop().call_soon(self.count_pending)
+            except RuntimeError:
+                RATE_LIMITS.labels("route").inc()
+            else:
+                self.pending = True
+        elif record.msg.startswith("Global rate limit has been hit."):
+            self.pending = False
+            RATE_LIMITS.labels("global").inc()
+        elif record.msg.startswith("Webhook ID") and "is rate limited" in record.msg:
+            RATE_LIMITS.labels("webhook").inc()
+        return True
+    
+    def count_pending(self):
+        if self.pending:
+            self.pending = False
+            RATE_LIMITS.labels("route").inc()
+
+class MetricsServer:
+    def __init__(self, registry=REGISTRY, host="127.0.0.1", port=9100):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.runner = None
+        self.logger = logging.getLogger(__name__)
+    
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle_metrics)
+        
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        self.logger.info(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+    
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+    
+    async def handle_metrics(self, request):
+        return web.Response(
+            body=self.registry.render().encode('utf-8'),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+        )
@@ -0,0 +1,233 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+MAX_PROFILE_SECONDS = 600
+MEMORY_TRACE_FRAMES = 10
+REPORT_LIMIT = 25
+
+class StackSampler:
+    # Samples the stack of one thread from a background thread. Coroutines
+    # run on the event loop thread's stack, so sampling that thread shows
+    # which handler and which line the loop is busy in.
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.stopped = threading.Event()
+        self.thread = None
+    
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="stack-sampler", daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        self.stopped.set()
+        if self.thread:
+            self.thread.join()
+    
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_filename, code.co_firstlineno, code.co_name, frame.f_lineno))
+                frame = frame.f_back
+            
+            # Innermost frame last, as in folded stack files.
+            stack.reverse()
+            self.stacks[tuple(stack)] += 1
+            self.samples += 1
+
+def format_frame(frame, with_line=False):
+    filename, first_line, name, line = frame
+    location = f"{os.path.basename(filename)}:{line if with_line else first_line}"
+    return f"{name} ({location})"
+
+class Profiler:
+    def __init__(self, log_dir="logs", interval=0.005):
+        self.log_dir = log_dir
+        self.interval = interval
+        self.active = False
+        self.handler_times = None
+        self.memory_snapshot = None
+        self.logger = logging.getLogger(__name__)
+    
+    def record_handler(self, name, seconds):
+        handler_times = self.handler_times
+        if handler_times is None:
+            return
+        
+        timing = handler_times.get(name)
+        if timing is None:
+            timing = handler_times[name] = [0, 0.0, 0.0]
+        timing[0] += 1
+        timing[1] += seconds
+        timing[2] = max(timing[2], seconds)
+    
+    async def run(self, duration, cpu=True, memory=True):
+        if self.active:
+            return None
+        
+        duration = min(duration, MAX_PROFILE_SECONDS)
+        self.active = True
+        started_tracing = False
+        switch_interval = None
+        sampler = None
+        
+        try:
+            self.logger.info(f"Profiling for {duration:g}s (cpu={cpu}, memory={memory})")
+            
+            before = None
+            if memory:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start(MEMORY_TRACE_FRAMES)
+                    started_tracing = True
+                before = await asyncio.to_thread(tracemalloc.take_snapshot)
+            
+            if cpu:
+                # The sampler needs the GIL to read the loop thread's stack, and
+                # by default only gets it every 5ms or when the loop goes idle,
+                # which would hide short handlers. Ask for it more often.
+                switch_interval = sys.getswitchinterval()
+                sys.setswitchinterval(min(switch_interval, self.interval / 10))
+                sampler = StackSampler(threading.get_ident(), self.interval)
+                sampler.start()
+            
+            self.handler_times = {}
+            start = time.perf_counter()
+            await asyncio.sleep(duration)
+            elapsed = time.perf_counter() - start
+            handler_times = self.handler_times
+            self.handler_times = None
+            
+            if sampler:
+                sampler.stop()
+            
+            after = await asyncio.to_thread(tracemalloc.take_snapshot) if memory else None
+            
+            path = await asyncio.to_thread(self.write_report, elapsed, sampler, handler_times, before, after)
+            self.logger.info(f"Profile written to {path}")
+            return path
+        finally:
+            if sampler:
+                sampler.stop()
+            if switch_interval is not None:
+                sys.setswitchinterval(switch_interval)
+            if started_tracing:
+                tracemalloc.stop()
+            self.handler_times = None
+            self.active = False
+    
+    async def snapshot_memory(self):
+        # Diffs against the previous call, for comparing two points in time
+        # that are further apart than a profile run.
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(MEMORY_TRACE_FRAMES)
+            self.memory_snapshot = await asyncio.to_thread(tracemalloc.take_snapshot)
+            return None
+        
+        snapshot = await asyncio.to_thread(tracemalloc.take_snapshot)
+        previous, self.memory_snapshot = self.memory_snapshot, snapshot
+        if previous is None:
+            return None
+        
+        return await asyncio.to_thread(self.write_memory_diff, previous, snapshot)
+    
+    def stop_memory_tracing(self):
+        self.memory_snapshot = None
+        if tracemalloc.is_tracing() and not self.active:
+            tracemalloc.stop()
+    
+    def get_report_path(self, kind, extension="txt"):
+        os.makedirs(self.log_dir, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        return os.path.join(self.log_dir, f"{kind}-{timestamp}.{extension}")
+    
+    def write_report(self, elapsed, sampler, handler_times, before, after):
+        path = self.get_report_path("profile")
+        lines = [f"Profile of {elapsed:.1f}s taken {datetime.now().isoformat(timespec='seconds')}", ""]
+        
+        if sampler:
+            lines.extend(self.format_cpu(sampler))
+            self.write_folded(path[:-len(".txt")] + ".folded", sampler)
+        
+        lines.extend(self.format_handlers(handler_times, elapsed))
+        
+        if before and after:
+            lines.extend(self.format_memory_diff(before, after))
+        
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+        
+        return path
+    
+    def write_memory_diff(self, before, after):
+        path = self.get_report_path("memory")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(self.format_memory_diff(before, after)) + "\n")
+        return path
+    
+    def write_folded(self, path, sampler):
+        # One "outer;...;inner count" line per distinct stack, as read by
+        # flamegraph.pl and speedscope.
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in sampler.stacks.items():
+                f.write(";".join(format_frame(frame) for frame in stack) + f" {count}\n")
+    
+    def format_cpu(self, sampler):
+        self_counts = Counter()
+        total_counts = Counter()
+        
+        for stack, count in sampler.stacks.items():
+            self_counts[format_frame(stack[-1], with_line=True)] += count
+            for frame in set(format_frame(frame) for frame in stack):
+                total_counts[frame] += count
+        
+        samples = sampler.samples or 1
+        lines = [f"CPU: {sampler.samples} samples every {sampler.interval * 1000:g}ms", "", "Self (by line):"]
+        lines.extend(f"  {count / samples:6.1%}  {frame}" for frame, count in self_counts.most_common(REPORT_LIMIT))
+        lines.extend(["", "Cumulative (by function):"])
+        lines.extend(f"  {count / samples:6.1%}  {frame}" for frame, count in total_counts.most_common(REPORT_LIMIT))
+        lines.append("")
+        return lines
+    
+    def format_handlers(self, handler_times, elapsed):
+        lines = ["Event handlers:"]
+        
+        if not handler_times:
+            lines.extend(["  no events handled", ""])
+            return lines
+        
+        for name, (calls, total, worst) in sorted(handler_times.items(), key=lambda item: item[1][1], reverse=True):
+            lines.append(
+                f"  {name}: {calls} calls ({calls / elapsed:.1f}/s), total {total * 1000:.1f}ms, "
+                f"mean {total / calls * 1000:.2f}ms, max {worst * 1000:.2f}ms"
+            )
+        lines.append("")
+        return lines
+    
+    def format_memory_diff(self, before, after):
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap>")]
+        before = before.filter_traces(filters)
+        after = after.filter_traces(filters)
+        
+        stats = after.compare_to(before, 'lineno')
+        total = sum(stat.size for stat in after.statistics('filename'))
+        growth = sum(stat.size_diff for stat in stats)
+        
+        lines = [f"Memory: {total / 1024 / 1024:.1f} MB traced, {growth / 1024:+.1f} KB since start", ""]
+        lines.extend(f"  {stat}" for stat in stats[:REPORT_LIMIT])
+        lines.append("")
+        return lines
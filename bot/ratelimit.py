@@ -0,0 +1,123 @@
+import time
+from collections import OrderedDict
+from discord.ext import commands
+
+# Idle keys evicted per call at most, so a burst of expiries is spread over
+# later calls instead of stalling one of them.
+EVICTION_BATCH = 64
+
+class RateLimited(commands.CheckFailure):
+    def __init__(self, scope, retry_after):
+        self.scope = scope
+        self.retry_after = retry_after
+        super().__init__(f"Rate limited ({scope}), retry in {retry_after:.1f}s")
+
+class RateLimiter:
+    # Approximate sliding window: each key keeps the request count for the
+    # current and previous fixed window, and the previous count is weighted
+    # by how much of it still overlaps the sliding window. Keys are kept in
+    # least-recently-used order so idle keys can be evicted from the front
+    # in amortised O(1) instead of sweeping the whole table.
+    def __init__(self, max_requests=5, time_window=60, max_keys=None):
+        self.max_requests = max_requests
+        self.time_window = time_window
+        self.max_keys = max_keys
+        self.requests = OrderedDict()
+    
+    def get_bucket(self, key, window):
+        bucket = self.requests.get(key)
+        
+        if bucket is None:
+            bucket = self.requests[key] = [window, 0, 0]
+            return bucket
+        
+        self.requests.move_to_end(key)
+        
+        if bucket[0] != window:
+            bucket[2] = bucket[1] if bucket[0] == window - 1 else 0
+            bucket[1] = 0
+            bucket[0] = window
+        
+        return bucket
+    
+    def evict(self, window):
+        requests = self.requests
+        
+        for _ in range(EVICTION_BATCH):
+            if not requests:
+                break
+            
+            bucket = requests[next(iter(requests))]
+            if bucket[0] >= window - 1 and (not self.max_keys or len(requests) <= self.max_keys):
+                break
+            requests.popitem(last=False)
+    
+    def is_rate_limited(self, key, max_requests=None, now=None):
+        if now is None:
+            now = time.monotonic()
+        
+        window = int(now // self.time_window)
+        self.evict(window)
+        
+        bucket = self.get_bucket(key, window)
+        elapsed = now / self.time_window - window
+        
+        if bucket[2] * (1 - elapsed) + bucket[1] >= (max_requests or self.max_requests):
+            return True
+        
+        bucket[1] += 1
+        return False
+    
+    def get_retry_after(self, key, max_requests=None, now=None):
+        if now is None:
+            now = time.monotonic()
+        
+        bucket = self.requests.get(key)
+        if bucket is None:
+            return 0.0
+        
+        limit = max_requests or self.max_requests
+        window = int(now // self.time_window)
+        elapsed = now / self.time_window - window
+        
+        if bucket[0] == window:
+            current, previous = bucket[1], bucket[2]
+        elif bucket[0] == window - 1:
+            current, previous = 0, bucket[1]
+        else:
+            return 0.0
+        
+        if previous * (1 - elapsed) + current < limit:
+            return 0.0
+        
+        if current >= limit:
+            # Wait for this window to end and then for enough of it to slide out.
+            return (1 - elapsed + 1 - limit / current) * self.time_window
+        
+        return (1 - (limit - current) / previous - elapsed) * self.time_window
+    
+    def __len__(self):
+        return len(self.requests)
+
+class ScopedRateLimiter:
+    def __init__(self, limits, max_keys=None):
+        self.limiters = {
+            scope: RateLimiter(max_requests, time_window, max_keys=max_keys)
+            for scope, (max_requests, time_window) in limits.items()
+        }
+    
+    def acquire(self, keys):
+        # Check every scope before counting, so a request rejected by one
+        # scope does not use up the allowance of the others.
+        now = time.monotonic()
+        
+        for scope, key in keys.items():
+            retry_after = self.limiters[scope].get_retry_after(key, now=now)
+            if retry_after > 0:
+                raise RateLimited(scope, retry_after)
+        
+        for scope, key in keys.items():
+            self.limiters[scope].is_rate_limited(key, now=now)
+    
+    def get_sizes(self):
+        return {scope: len(limiter) for scope, limiter in self.limiters.items()}
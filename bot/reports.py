@@ -0,0 +1,302 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import Counter
+from datetime import date, datetime, timezone
+
+import discord
+
+from .utils import create_embed
+
+REPORT_VERSION = 1
+# Days of counters kept per guild; enough for a weekly report and today.
+KEEP_DAYS = 8
+CHECK_INTERVAL = 60
+CHECKPOINT_INTERVAL = 300
+
+class DayStats:
+    __slots__ = ("messages", "deletions", "joins", "leaves", "voice_seconds", "hours", "channels")
+    
+    def __init__(self):
+        self.messages = 0
+        self.deletions = 0
+        self.joins = 0
+        self.leaves = 0
+        self.voice_seconds = 0.0
+        self.hours = [0] * 24
+        self.channels = Counter()
+    
+    def to_record(self):
+        return {
+            "messages": self.messages,
+            "deletions": self.deletions,
+            "joins": self.joins,
+            "leaves": self.leaves,
+            "voice_seconds": round(self.voice_seconds),
+            "hours": self.hours,
+            "channels": self.channels
+        }
+    
+    @classmethod
+    def from_record(cls, record):
+        stats = cls()
+        stats.messages = record.get("messages", 0)
+        stats.deletions = record.get("deletions", 0)
+        stats.joins = record.get("joins", 0)
+        stats.leaves = record.get("leaves", 0)
+        stats.voice_seconds = record.get("voice_seconds", 0)
+        stats.hours = list(record.get("hours", stats.hours))
+        stats.channels = Counter({int(channel_id): count for channel_id, count in record.get("channels", {}).items()})
+        return stats
+
+class ActivityRollup:
+    # Running per-guild counters of messages (per channel and hour of day),
+    # deletions, joins, leaves and voice time, bucketed by UTC day. Events
+    # are counted as they arrive, so a report only adds up a week of
+    # buckets and never reads message history. Counters are checkpointed
+    # to disk every few minutes and on shutdown.
+    def __init__(self, bot, path="data/activity.json"):
+        self.bot = bot
+        self.path = path
+        self.guilds = {}
+        self.last_reports = {}
+        # (guild id, member id) -> when the current stretch in voice started.
+        self.voice_sessions = {}
+        self.task = None
+        self.logger = logging.getLogger(__name__)
+    
+    def start(self):
+        self.load()
+        if not self.task:
+            self.task = asyncio.create_task(self.run(), name="activity-reports")
+    
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        self.save()
+    
+    def get_day(self, guild_id, now=None):
+        today = (now or datetime.now(timezone.utc)).date().toordinal()
+        days = self.guilds.get(guild_id)
+        if days is None:
+            days = self.guilds[guild_id] = {}
+        
+        stats = days.get(today)
+        if stats is None:
+            stats = days[today] = DayStats()
+            for day in [day for day in days if day <= today - KEEP_DAYS]:
+                del days[day]
+        return stats
+    
+    def record(self, event_name, guild, args):
+        if event_name == "message":
+            message = args[0]
+            if message.author.bot:
+                return
+            now = datetime.now(timezone.utc)
+            stats = self.get_day(guild.id, now)
+            stats.messages += 1
+            stats.hours[now.hour] += 1
+            stats.channels[message.channel.id] += 1
+        elif event_name == "message_delete":
+            self.get_day(guild.id).deletions += 1
+        elif event_name == "member_join":
+            self.get_day(guild.id).joins += 1
+        elif event_name == "member_remove":
+            self.get_day(guild.id).leaves += 1
+        elif event_name == "voice_state_update":
+            member, before, after = args
+            if member.bot or (before.channel is None) == (after.channel is None):
+                return
+            key = (guild.id, member.id)
+            if after.channel is not None:
+                self.voice_sessions[key] = time.time()
+            else:
+                started = self.voice_sessions.pop(key, None)
+                if started is not None:
+                    self.get_day(guild.id).voice_seconds += time.time() - started
+    
+    def seed_voice(self, guilds):
+        # Members already in voice when the bot connects.
+        now = time.time()
+        for guild in guilds:
+            for channel in guild.voice_channels:
+                for member in channel.members:
+                    if not member.bot:
+                        self.voice_sessions.setdefault((guild.id, member.id), now)
+    
+    def settle_voice(self):
+        # Moves time spent in voice so far into today's counters, so an
+        # ongoing session is not lost if the bot stops.
+        now = time.time()
+        for key, started in self.voice_sessions.items():
+            self.get_day(key[0]).voice_seconds += now - started
+            self.voice_sessions[key] = now
+    
+    def summarize(self, guild_id, first_day, last_day):
+        total = DayStats()
+        for day, stats in self.guilds.get(guild_id, {}).items():
+            if first_day <= day <= last_day:
+                total.messages += stats.messages
+                total.deletions += stats.deletions
+                total.joins += stats.joins
+                total.leaves += stats.leaves
+                total.voice_seconds += stats.voice_seconds
+                total.hours = [a + b for a, b in zip(total.hours, stats.hours)]
+                total.channels.update(stats.channels)
+        return total
+    
+    def build_report(self, guild_id, first_day, last_day):
+        self.settle_voice()
+        total = self.summarize(guild_id, first_day, last_day)
+        
+        start = date.fromordinal(first_day)
+        end = date.fromordinal(last_day)
+        period = start.isoformat() if start == end else f"{start.isoformat()} to {end.isoformat()}"
+        
+        embed = create_embed(
+            title="Activity Report",
+            description=f"{period} (UTC)",
+            color=discord.Color.blue(),
+            timestamp=datetime.now(timezone.utc)
+        )
+        
+        embed.add_field(
+            name="Members",
+            value=f"Joined: {total.joins}\nLeft: {total.leaves}\nNet: {total.joins - total.leaves:+d}",
+            inline=True
+        )
+        
+        embed.add_field(
+            name="Activity",
+            value=f"Messages: {total.messages}\n"
+                  f"Deleted messages: {total.deletions}\n"
+                  f"Voice: {total.voice_seconds / 3600:.1f} hours",
+            inline=True
+        )
+        
+        if total.messages:
+            busiest_hour = max(range(24), key=lambda hour: total.hours[hour])
+            embed.add_field(
+                name="Busiest Hour",
+                value=f"{busiest_hour:02d}:00-{(busiest_hour + 1) % 24:02d}:00 UTC ({total.hours[busiest_hour]} messages)",
+                inline=True
+            )
+            
+            embed.add_field(
+                name="Busiest Channels",
+                value="\n".join(f"<#{channel_id}>: {count}" for channel_id, count in total.channels.most_common(10)),
+                inline=False
+            )
+        
+        return embed
+    
+    def get_period(self, schedule, today):
+        # The full days covered by a scheduled report sent today.
+        if schedule == 'weekly':
+            return today - 7, today - 1
+        return today - 1, today - 1
+    
+    async def run(self):
+        last_checkpoint = time.monotonic()
+        while True:
+            await asyncio.sleep(CHECK_INTERVAL)
+            try:
+                await self.send_scheduled(datetime.now(timezone.utc))
+            except Exception as e:
+                self.logger.error(f"Error sending activity reports: {e}")
+            
+            if time.monotonic() - last_checkpoint >= CHECKPOINT_INTERVAL:
+                self.save()
+                last_checkpoint = time.monotonic()
+    
+    async def send_scheduled(self, now):
+        today = now.date().toordinal()
+        
+        # Every guild the bot is in, so one with nothing recorded in the
+        # period still gets its report, showing zeros.
+        for guild_id in [guild.id for guild in self.bot.guilds]:
+            config = self.bot.config_manager.get_guild_config(guild_id)
+            schedule = config.get('report_schedule', 'off')
+            if schedule not in ('daily', 'weekly') or not config.get('report_channel'):
+                continue
+            if now.hour < config.get('report_hour', 0) or self.last_reports.get(guild_id) == today:
+                continue
+            # Weekly reports go out on Mondays, covering Monday to Sunday.
+            if schedule == 'weekly' and now.weekday() != 0:
+                continue
+            
+            # Resolved and sent like any other log, so a report shares the
+            # guild's send queue, webhooks and failure retries.
+            channel = self.bot.log_channels.resolve(guild_id, config['report_channel'])
+            if not channel:
+                continue
+            
+            self.last_reports[guild_id] = today
+            embed = self.build_report(guild_id, *self.get_period(schedule, today))
+            await self.bot.event_handler.send_log(channel, embed, "activity_report", "activity report")
+    
+    def save(self):
+        self.settle_voice()
+        start = time.perf_counter()
+        data = {
+            "version": REPORT_VERSION,
+            "guilds": {
+                str(guild_id): {
+                    "days": {str(day): stats.to_record() for day, stats in self.guilds.get(guild_id, {}).items()},
+                    "last_report": self.last_reports.get(guild_id)
+                }
+                # Guilds sent a report with nothing recorded are kept too, so
+                # they are not sent the same report again after a restart.
+                for guild_id in self.guilds.keys() | self.last_reports.keys()
+            }
+        }
+        
+        try:
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            self.logger.error(f"Error saving activity counters {self.path}: {e}")
+            return
+        
+        elapsed = time.perf_counter() - start
+        self.logger.debug(f"Saved activity counters for {len(self.guilds)} guilds in {elapsed * 1000:.1f}ms")
+    
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            self.logger.error(f"Error loading activity counters {self.path}: {e}")
+            return
+        
+        if data.get("version") != REPORT_VERSION:
+            self.logger.warning(f"Ignoring activity counters with unsupported version {data.get('version')}")
+            return
+        
+        oldest = datetime.now(timezone.utc).date().toordinal() - KEEP_DAYS
+        for guild_id, guild_data in data.get("guilds", {}).items():
+            days = {
+                int(day): DayStats.from_record(record)
+                for day, record in guild_data.get("days", {}).items()
+                if int(day) > oldest
+            }
+            if days:
+                self.guilds[int(guild_id)] = days
+            if guild_data.get("last_report") is not None:
+                self.last_reports[int(guild_id)] = guild_data["last_report"]
+        
+        self.logger.info(f"Loaded activity counters for {len(self.guilds)} guilds")
@@ -0,0 +1,212 @@
+import discord
+import io
+import logging
+import os
+import pickle
+import time
+import zlib
+
+SNAPSHOT_VERSION = 1
+
+class SnapshotUnpickler(pickle.Unpickler):
+    # Snapshots only ever contain tuples, lists, strings and numbers, so
+    # refuse anything that would import or construct an arbitrary object.
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError(f"Refusing to load {module}.{name} from snapshot")
+
+def serialize_author(author):
+    return (
+        author.name,
+        author.discriminator,
+        author.avatar.key if author.avatar else None,
+        author.bot,
+        author.global_name
+    )
+
+def serialize_message(message):
+    return (
+        message.id,
+        message.channel.id,
+        message.author.id,
+        message.content,
+        message.edited_at.isoformat() if message.edited_at else None,
+        tuple(
+            (att.id, att.filename, att.url, att.proxy_url, att.size, att.content_type)
+            for att in message.attachments
+        ) if message.attachments else (),
+        message.type.value,
+        message.pinned
+    )
+
+def build_message_payload(record, author):
+    message_id, channel_id, author_id, content, edited_at, attachments, message_type, pinned = record
+    author_name, discriminator, avatar, bot, global_name = author
+    
+    return {
+        "id": message_id,
+        "channel_id": channel_id,
+        "type": message_type,
+        "content": content,
+        "pinned": pinned,
+        "edited_timestamp": edited_at,
+        "attachments": [
+            {
+                "id": att_id,
+                "filename": filename,
+                "url": url,
+                "proxy_url": proxy_url,
+                "size": size,
+                "content_type": content_type
+            }
+            for att_id, filename, url, proxy_url, size, content_type in attachments
+        ],
+        "embeds": [],
+        "mentions": [],
+        "mention_roles": [],
+        "author": {
+            "id": author_id,
+            "username": author_name,
+            "discriminator": discriminator,
+            "avatar": avatar,
+            "bot": bot,
+            "global_name": global_name
+        }
+    }
+
+class MessageSnapshot:
+    def __init__(self, path="data/state.snapshot", max_messages=1000):
+        self.path = path
+        self.max_messages = max_messages
+        self.logger = logging.getLogger(__name__)
+        
+        self.restored = {}
+        self.authors = {}
+        self.pending = []
+    
+    def save(self, messages, pending):
+        start = time.perf_counter()
+        
+        records = dict(self.restored)
+        authors = dict(self.authors)
+        for message in messages:
+            try:
+                records[message.id] = serialize_message(message)
+                if message.author.id not in authors:
+                    authors[message.author.id] = serialize_author(message.author)
+            except AttributeError:
+                continue
+        
+        # Keep only the newest messages; snowflakes sort by creation time.
+        message_ids = sorted(records)[-self.max_messages:] if self.max_messages else []
+        message_records = [records[message_id] for message_id in message_ids]
+        message_authors = {record[2]: authors[record[2]] for record in message_records}
+        
+        pending_records = list(self.pending)
+        skipped = 0
+        for handler, args in pending:
+            if all(isinstance(arg, discord.Message) for arg in args):
+                pending_records.append((handler.__name__, tuple(serialize_message(arg) for arg in args)))
+                for arg in args:
+                    message_authors[arg.author.id] = serialize_author(arg.author)
+            else:
+                skipped += 1
+        
+        payload = zlib.compress(
+            pickle.dumps(
+                (SNAPSHOT_VERSION, message_records, message_authors, pending_records),
+                protocol=pickle.HIGHEST_PROTOCOL
+            ),
+            1
+        )
+        
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(payload)
+        os.replace(temp_path, self.path)
+        
+        elapsed = time.perf_counter() - start
+        self.logger.info(
+            f"Saved snapshot: {len(message_records)} messages, {len(pending_records)} pending events "
+            f"({skipped} not persistable), {len(payload)} bytes in {elapsed * 1000:.1f}ms"
+        )
+        return len(message_records), len(pending_records), skipped
+    
+    def load(self):
+        if not os.path.exists(self.path):
+            return False
+        
+        start = time.perf_counter()
+        
+        try:
+            with open(self.path, 'rb') as f:
+                payload = f.read()
+            
+            version, message_records, authors, pending_records = SnapshotUnpickler(
+                io.BytesIO(zlib.decompress(payload))
+            ).load()
+        except Exception as e:
+            self.logger.error(f"Error loading snapshot {self.path}: {e}")
+            return False
+        finally:
+            # A snapshot is only replayed once, even if the bot crashes before
+            # writing the next one.
+            try:
+                os.remove(self.path)
+            except OSError as e:
+                self.logger.error(f"Error removing snapshot {self.path}: {e}")
+        
+        if version != SNAPSHOT_VERSION:
+            self.logger.warning(f"Ignoring snapshot with unsupported version {version}")
+            return False
+        
+        self.restored = {record[0]: record for record in message_records}
+        self.authors = authors
+        self.pending = pending_records
+        
+        elapsed = time.perf_counter() - start
+        self.logger.info(
+            f"Loaded snapshot: {len(self.restored)} messages, {len(self.pending)} pending events "
+            f"in {elapsed * 1000:.1f}ms"
+        )
+        return True
+    
+    def build_message(self, state, record):
+        channel = state.get_channel(record[1])
+        if channel is None:
+            return None
+        
+        author = self.authors.get(record[2])
+        if author is None:
+            return None
+        
+        return discord.Message(state=state, channel=channel, data=build_message_payload(record, author))
+    
+    def pop_message(self, state, message_id):
+        record = self.restored.pop(message_id, None)
+        if record is None:
+            return None
+        
+        return self.build_message(state, record)
+    
+    def remember(self, message):
+        self.restored[message.id] = serialize_message(message)
+        self.authors[message.author.id] = serialize_author(message.author)
+    
+    def take_pending(self, state):
+        pending = []
+        
+        for handler_name, records in self.pending:
+            messages = [self.build_message(state, record) for record in records]
+            if all(messages):
+                pending.append((handler_name, messages))
+        
+        dropped = len(self.pending) - len(pending)
+        if dropped:
+            self.logger.warning(f"Dropped {dropped} pending events whose channels are no longer available")
+        
+        self.pending = []
+        return pending
@@ -0,0 +1,176 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from datetime import datetime, timezone
+
+TRACE_VERSION = 1
+TOKEN_ALPHABET = "abcdefghijklmnopqrstuvwxyz0123456789"
+
+# User-written text, wherever it appears: message and profile text, the
+# names of guilds, channels, roles, emoji, stickers and threads, custom
+# status and activity text, audit log reasons, component labels and values,
+# and poll and event text. Everything else in a dispatch (IDs, flags,
+# timestamps, permissions) is kept, since that is what shapes the work the
+# bot does.
+REDACTED_TEXT_FIELDS = frozenset((
+    "content", "username", "global_name", "display_name", "nick", "bio", "pronouns", "email",
+    "name", "filename", "description", "title", "topic", "custom_status", "state", "details",
+    "large_text", "small_text", "reason", "label", "placeholder", "value", "text", "tags",
+    "location", "vanity_url_code"
+))
+REDACTED_URL_FIELDS = frozenset(("url", "proxy_url"))
+# Credentials, such as interaction and webhook tokens; left out entirely.
+DROPPED_FIELDS = frozenset(("token",))
+
+# Mentions, channel links and custom emoji keep their IDs.
+WORD_PATTERN = re.compile(r"<[@#:a&!][^\s>]*>|\S+")
+EMOJI_PATTERN = re.compile(r"^<(a?):([^:>]+):(\d+)>$")
+
+class TraceRedactor:
+    # Replaces each word with a token of the same length derived from a
+    # per-trace secret, so message sizes, repeated words and duplicate
+    # messages survive but the text cannot be read or guessed back.
+    def __init__(self, secret=None):
+        self.secret = secret or os.urandom(16)
+        self.tokens = {}
+    
+    def token(self, word):
+        token = self.tokens.get(word)
+        if token is None:
+            if len(self.tokens) > 100000:
+                self.tokens.clear()
+            digest = hashlib.blake2b(word.encode(), key=self.secret, digest_size=32).digest()
+            token = "".join(TOKEN_ALPHABET[digest[i % 32] % len(TOKEN_ALPHABET)] for i in range(len(word)))
+            self.tokens[word] = token
+        return token
+    
+    def redact_word(self, match):
+        word = match.group(0)
+        if not word.startswith("<"):
+            return self.token(word)
+        
+        # Custom emoji names are chosen by the server.
+        emoji = EMOJI_PATTERN.match(word)
+        if emoji:
+            animated, name, emoji_id = emoji.groups()
+            return f"<{animated}:{self.token(name)}:{emoji_id}>"
+        return word
+    
+    def redact_text(self, text):
+        return WORD_PATTERN.sub(self.redact_word, text)
+    
+    def redact(self, value):
+        if isinstance(value, dict):
+            redacted = {}
+            for key, item in value.items():
+                if key in DROPPED_FIELDS:
+                    continue
+                if key == "embeds" and isinstance(item, list):
+                    # Embeds carry arbitrary text in many fields; keep how
+                    # many there were.
+                    redacted[key] = [{"type": "rich"} for _ in item]
+                elif isinstance(item, str) and key in REDACTED_TEXT_FIELDS:
+                    redacted[key] = self.redact_text(item)
+                elif isinstance(item, str) and key in REDACTED_URL_FIELDS:
+                    redacted[key] = "https://redacted.invalid/" + self.token(item)[:16]
+                else:
+                    redacted[key] = self.redact(item)
+            return redacted
+        if isinstance(value, list):
+            return [self.redact(item) for item in value]
+        return value
+
+class TraceRecorder:
+    # Writes every gateway dispatch as one gzip compressed JSON line:
+    # [seconds since the recording started, event name, payload]. The loop
+    # thread only timestamps and queues the raw message; parsing,
+    # redaction and compression happen on a writer thread.
+    def __init__(self, path, redact=True):
+        self.path = path
+        self.redactor = TraceRedactor() if redact else None
+        self.queue = queue.SimpleQueue()
+        self.thread = None
+        self.started = None
+        self.recorded = 0
+        self.logger = logging.getLogger(__name__)
+    
+    def start(self):
+        if self.thread:
+            return
+        
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        self.started = time.monotonic()
+        self.thread = threading.Thread(target=self.run, name="trace-writer", daemon=True)
+        self.thread.start()
+        self.logger.info(f"Recording gateway trace to {self.path} (redaction {'on' if self.redactor else 'off'})")
+    
+    def stop(self):
+        if not self.thread:
+            return
+        
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+        self.logger.info(f"Gateway trace closed after {self.recorded} dispatches")
+    
+    def record(self, message):
+        if self.thread:
+            self.queue.put((time.monotonic() - self.started, message))
+    
+    def run(self):
+        try:
+            with gzip.open(self.path, 'wt', encoding='utf-8', compresslevel=6) as f:
+                header = {
+                    "version": TRACE_VERSION,
+                    "started": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                    "redacted": self.redactor is not None
+                }
+                f.write(json.dumps(header) + "\n")
+                
+                while True:
+                    item = self.queue.get()
+                    if item is None:
+                        break
+                    self.write_dispatch(f, *item)
+        except Exception as e:
+            self.logger.error(f"Error writing gateway trace: {e}")
+    
+    def write_dispatch(self, f, offset, message):
+        if isinstance(message, bytes):
+            message = message.decode('utf-8')
+        
+        try:
+            payload = json.loads(message)
+        except ValueError:
+            return
+        
+        # Only dispatches (op 0); heartbeats and the handshake are not replayed.
+        if payload.get("op") != 0:
+            return
+        
+        data = payload.get("d")
+        if self.redactor:
+            data = self.redactor.redact(data)
+        
+        f.write(json.dumps([round(offset, 4), payload.get("t"), data], separators=(',', ':')) + "\n")
+        self.recorded += 1
+
+def read_trace(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        header = json.loads(f.readline())
+        if header.get("version") != TRACE_VERSION:
+            raise ValueError(f"Unsupported trace version {header.get('version')}")
+        
+        for line in f:
+            if line.strip():
+                offset, event, data = json.loads(line)
+                yield offset, event, data
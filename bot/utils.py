@@ -1,6 +1,7 @@
 import discord
 from datetime import datetime
 import logging
+from .ratelimit import RateLimiter
 
 def create_embed(title=None, description=None, color=None, timestamp=None):
     embed = discord.Embed(
@@ -96,27 +97,6 @@ def format_activity(activity):
     activity_type = activity_types.get(activity.type, "Unknown")
     return f"{activity_type} {activity.name}"
 
-class RateLimiter:
-    def __init__(self, max_requests=5, time_window=60):
-        self.max_requests = max_requests
-        self.time_window = time_window
-        self.requests = {}
-    
-    def is_rate_limited(self, user_id):
-        now = datetime.utcnow().timestamp()
-        
-        if user_id not in self.requests:
-            self.requests[user_id] = []
-        
-        user_requests = self.requests[user_id]
-        user_requests[:] = [req for req in user_requests if now - req < self.time_window]
-        
-        if len(user_requests) >= self.max_requests:
-            return True
-        
-        user_requests.append(now)
-        return False
-
 def format_file_size(size_bytes):
     if size_bytes == 0:
         return "0 B"
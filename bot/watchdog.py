@@ -0,0 +1,105 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from .metrics import LOOP_LAG, LOOP_STALLS
+
+class LoopWatchdog:
+    # Schedules a callback on the event loop from a separate thread and
+    # measures how long it takes to run. When the loop does not get to it
+    # within the threshold, something is blocking the loop thread, and its
+    # stack shows what.
+    def __init__(self, loop, dispatcher=None, threshold=0.25, interval=0.5, report_interval=60):
+        self.loop = loop
+        self.dispatcher = dispatcher
+        self.threshold = threshold
+        self.interval = interval
+        self.report_interval = report_interval
+        self.loop_thread_id = None
+        self.thread = None
+        self.stopped = threading.Event()
+        self.acknowledged = threading.Event()
+        self.last_report = None
+        self.suppressed = 0
+        self.stalls = 0
+        self.logger = logging.getLogger(__name__)
+    
+    def start(self):
+        # Must be called from the event loop thread.
+        self.loop_thread_id = threading.get_ident()
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, name="loop-watchdog", daemon=True)
+        self.thread.start()
+        self.logger.info(f"Loop watchdog started (stall threshold {self.threshold * 1000:g}ms)")
+    
+    def stop(self):
+        self.stopped.set()
+        self.acknowledged.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+    
+    def run(self):
+        while not self.stopped.is_set():
+            self.acknowledged.clear()
+            sent = time.monotonic()
+            
+            try:
+                self.loop.call_soon_threadsafe(self.acknowledged.set)
+            except RuntimeError:
+                # The loop was closed underneath us.
+                return
+            
+            if not self.acknowledged.wait(self.threshold):
+                report = self.capture_stall()
+                self.acknowledged.wait()
+                if self.stopped.is_set():
+                    return
+                
+                duration = time.monotonic() - sent
+                self.stalls += 1
+                LOOP_STALLS.inc()
+                if report:
+                    self.logger.warning(f"Event loop stalled for {duration * 1000:.0f}ms\n{report}")
+            
+            LOOP_LAG.observe(time.monotonic() - sent)
+            self.stopped.wait(self.interval)
+    
+    def capture_stall(self):
+        now = time.monotonic()
+        if self.last_report is not None and now - self.last_report < self.report_interval:
+            self.suppressed += 1
+            return None
+        
+        self.last_report = now
+        suppressed, self.suppressed = self.suppressed, 0
+        
+        lines = []
+        if suppressed:
+            lines.append(f"{suppressed} earlier stalls not reported")
+        
+        task = asyncio.current_task(self.loop)
+        if task is not None:
+            lines.append(f"Running task: {task.get_name()}")
+        
+        lines.extend(f"Running handler: {name}" for name in self.get_running_handlers())
+        
+        frame = sys._current_frames().get(self.loop_thread_id)
+        if frame is not None:
+            lines.append("Loop thread stack (most recent call last):")
+            lines.append("".join(traceback.format_stack(frame)).rstrip())
+        
+        return "\n".join(lines)
+    
+    def get_running_handlers(self):
+        if not self.dispatcher:
+            return []
+        
+        handlers = []
+        for index, item in enumerate(list(self.dispatcher.running)):
+            if item is not None:
+                handler, args, guild_id = item
+                handlers.append(f"{handler.__name__} (worker {index}, guild {guild_id})")
+        return handlers
@@ -0,0 +1,252 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+import aiohttp
+import discord
+
+from .metrics import EVENTS_DROPPED, LOG_BATCH_SIZE, PIPELINE, SEND_LATENCY
+
+# Discord accepts up to 10 embeds and 6000 embed characters per message.
+MAX_BATCH_EMBEDS = 10
+MAX_BATCH_CHARACTERS = 6000
+# Per log channel; new embeds beyond this are dropped.
+MAX_PENDING_EMBEDS = 200
+MAX_WEBHOOKS_PER_CHANNEL = 10
+# How long to wait before trying to create a webhook in a channel again
+# after it failed; until then it uses the webhooks it has, or channel.send.
+FALLBACK_SECONDS = 600
+WEBHOOK_NAME = "Logs"
+
+class ChannelDelivery:
+    def __init__(self, channel):
+        self.channel = channel
+        self.pending = deque()
+        self.senders = 0
+        self.next_webhook = 0
+        self.create_after = 0.0
+        self.creating = asyncio.Lock()
+
+class WebhookPool:
+    # Delivers log embeds for guilds with log_delivery set to "webhook".
+    # Each log channel gets up to webhooks_per_channel webhooks, saved in
+    # the guild config, each with its own rate limit bucket. Embeds queued
+    # while a send is in flight go out together in the next message, so
+    # batches grow with load and add no delay when it is quiet.
+    def __init__(self, bot):
+        self.bot = bot
+        self.channels = {}
+        self.webhooks = {}
+        self.tasks = set()
+        self.dropped = 0
+        self.logger = logging.getLogger(__name__)
+    
+    def is_enabled(self, guild_id):
+        config = self.bot.config_manager.get_guild_config(guild_id)
+        return config.get('log_delivery', 'channel') == 'webhook'
+    
+    def get_webhook_count(self, guild_id):
+        config = self.bot.config_manager.get_guild_config(guild_id)
+        return max(1, min(int(config.get('webhooks_per_channel', 2)), MAX_WEBHOOKS_PER_CHANNEL))
+    
+    async def deliver(self, channel, embed, event_name, description, event_time=None):
+        delivery = self.channels.get(channel.id)
+        if delivery is None:
+            delivery = self.channels[channel.id] = ChannelDelivery(channel)
+        delivery.channel = channel
+        
+        if len(delivery.pending) >= MAX_PENDING_EMBEDS:
+            # Waiting here would hold up the dispatcher worker, and every
+            # other guild on it, behind one slow channel.
+            self.dropped += 1
+            EVENTS_DROPPED.labels(event_name, "send_backlog").inc()
+            PIPELINE.record_drop(channel.guild.id)
+            return
+        
+        delivery.pending.append((embed, event_name, description, event_time))
+        
+        # One sender keeps a quiet channel going; more join, up to one per
+        # webhook, once a full batch is waiting.
+        if delivery.senders == 0 or (
+            len(delivery.pending) >= MAX_BATCH_EMBEDS and delivery.senders < self.get_webhook_count(channel.guild.id)
+        ):
+            delivery.senders += 1
+            task = asyncio.create_task(self.run_sender(delivery), name=f"log-sender-{channel.id}")
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+    
+    async def run_sender(self, delivery):
+        try:
+            while delivery.pending:
+                batch = self.take_batch(delivery.pending)
+                try:
+                    await self.send_batch(delivery, batch)
+                except asyncio.CancelledError:
+                    # Stopped at shutdown mid-send; kept for flush() to hand
+                    # over, even though it may have gone out.
+                    delivery.pending.extendleft(reversed(batch))
+                    raise
+                except Exception as e:
+                    self.logger.error(f"Error delivering logs to channel {delivery.channel.id}: {e}")
+        finally:
+            delivery.senders -= 1
+    
+    def take_batch(self, pending):
+        batch = [pending.popleft()]
+        characters = len(batch[0][0])
+        
+        while pending and len(batch) < MAX_BATCH_EMBEDS:
+            size = len(pending[0][0])
+            if characters + size > MAX_BATCH_CHARACTERS:
+                break
+            batch.append(pending.popleft())
+            characters += size
+        
+        return batch
+    
+    async def send_batch(self, delivery, batch):
+        channel = delivery.channel
+        event_handler = self.bot.event_handler
+        embeds = [item[0] for item in batch]
+        
+        start = time.perf_counter()
+        try:
+            method = await self.send_embeds(delivery, embeds)
+        except (discord.HTTPException, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            for embed, event_name, description, event_time in batch:
+                event_handler.record_send_failure(channel, e, event_name, description)
+                self.bot.dead_letters.add(channel, embed, event_name, e, event_time)
+            return
+        
+        elapsed = time.perf_counter() - start
+        SEND_LATENCY.observe(elapsed)
+        PIPELINE.record_send(channel.guild.id, elapsed)
+        LOG_BATCH_SIZE.labels(method).observe(len(batch))
+        
+        for _, event_name, _, event_time in batch:
+            event_handler.record_sent(channel, event_name, event_time)
+    
+    async def send_embeds(self, delivery, embeds):
+        channel = delivery.channel
+        
+        # A second attempt in case the first webhook had been deleted.
+        for _ in range(2):
+            webhook = await self.get_webhook(delivery)
+            if webhook is None:
+                break
+            
+            try:
+                await webhook.send(
+                    embeds=embeds,
+                    username=self.bot.user.name if self.bot.user else WEBHOOK_NAME,
+                    avatar_url=self.bot.user.display_avatar.url if self.bot.user else None
+                )
+                return "webhook"
+            except discord.NotFound:
+                self.logger.warning(f"Webhook {webhook.id} in channel {channel.id} was deleted, replacing it")
+                self.forget_webhook(channel, webhook)
+            except discord.HTTPException as e:
+                self.logger.warning(f"Webhook send failed in channel {channel.id}, sending as the bot: {e}")
+                break
+        
+        await channel.send(embeds=embeds)
+        return "channel"
+    
+    async def get_webhook(self, delivery):
+        channel = delivery.channel
+        webhooks = self.get_channel_webhooks(channel)
+        wanted = self.get_webhook_count(channel.guild.id)
+        
+        if len(webhooks) < wanted:
+            async with delivery.creating:
+                if len(webhooks) < wanted and time.monotonic() >= delivery.create_after:
+                    await self.create_webhook(delivery, webhooks)
+        
+        if not webhooks:
+            return None
+        
+        delivery.next_webhook = (delivery.next_webhook + 1) % len(webhooks)
+        return webhooks[delivery.next_webhook]
+    
+    def get_channel_webhooks(self, channel):
+        webhooks = self.webhooks.get(channel.id)
+        if webhooks is not None:
+            return webhooks
+        
+        config = self.bot.config_manager.get_guild_config(channel.guild.id)
+        saved = config.get('log_webhooks', {}).get(str(channel.id), [])
+        webhooks = self.webhooks[channel.id] = [
+            discord.Webhook.partial(webhook_id, token, client=self.bot) for webhook_id, token in saved
+        ]
+        return webhooks
+    
+    async def create_webhook(self, delivery, webhooks):
+        channel = delivery.channel
+        
+        if not channel.permissions_for(channel.guild.me).manage_webhooks:
+            self.start_fallback(delivery, "missing Manage Webhooks permission")
+            return
+        
+        try:
+            webhook = await channel.create_webhook(name=WEBHOOK_NAME, reason="Log delivery")
+        except discord.HTTPException as e:
+            self.start_fallback(delivery, str(e))
+            return
+        
+        webhooks.append(webhook)
+        self.save_webhooks(channel, webhooks)
+        self.logger.info(f"Created log webhook {webhook.id} in channel {channel.id}")
+    
+    def forget_webhook(self, channel, webhook):
+        webhooks = self.webhooks.get(channel.id, [])
+        if webhook in webhooks:
+            webhooks.remove(webhook)
+            self.save_webhooks(channel, webhooks)
+    
+    def forget_channel(self, channel):
+        # The channel was deleted, and its webhooks with it.
+        self.channels.pop(channel.id, None)
+        self.webhooks.pop(channel.id, None)
+        
+        config = self.bot.config_manager.get_guild_config(channel.guild.id)
+        if str(channel.id) in config.get('log_webhooks', {}):
+            self.save_webhooks(channel, [])
+    
+    def save_webhooks(self, channel, webhooks):
+        config = self.bot.config_manager.get_guild_config(channel.guild.id)
+        
+        # Copied rather than updated in place: a guild config made from the
+        # defaults shares their nested dicts.
+        saved = dict(config.get('log_webhooks', {}))
+        if webhooks:
+            saved[str(channel.id)] = [[webhook.id, webhook.token] for webhook in webhooks]
+        else:
+            saved.pop(str(channel.id), None)
+        
+        config['log_webhooks'] = saved
+        self.bot.config_manager.save_guild_config(channel.guild.id, config)
+    
+    def start_fallback(self, delivery, reason):
+        delivery.create_after = time.monotonic() + FALLBACK_SECONDS
+        self.logger.warning(
+            f"Cannot create a log webhook in channel {delivery.channel.id} ({reason}); "
+            f"trying again in {FALLBACK_SECONDS // 60} minutes"
+        )
+    
+    async def flush(self, timeout):
+        # Waits for the senders to empty their channels, then stops them;
+        # returns the embeds that were never sent, as
+        # (channel, embed, event_name, event_time).
+        if self.tasks:
+            await asyncio.wait(set(self.tasks), timeout=timeout)
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        
+        unsent = []
+        for delivery in self.channels.values():
+            for embed, event_name, _, event_time in delivery.pending:
+                unsent.append((delivery.channel, embed, event_name, event_time))
+            delivery.pending.clear()
+        return unsent
@@ -1,37 +1,72 @@
 import asyncio
 import os
-import sys
+import signal
 import logging
 from bot.core import DiscordBot
+from bot.logger import BotLogger
 
 def setup_logging():
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('bot.log'),
-            logging.StreamHandler(sys.stdout)
-        ]
+    return BotLogger(
+        log_dir=os.getenv('LOG_DIR', 'logs'),
+        structured=os.getenv('LOG_FORMAT', 'text').lower() == 'json',
+        rotation=os.getenv('LOG_ROTATION', 'midnight'),
+        compression=os.getenv('LOG_COMPRESSION', 'gzip').lower(),
+        max_age_days=int(os.getenv('LOG_RETENTION_DAYS', 30))
     )
 
+def install_signal_handlers(stop_event):
+    loop = asyncio.get_running_loop()
+    
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            # Windows has no loop signal handlers; Ctrl-C still raises KeyboardInterrupt.
+            pass
+
+def install_profile_signal(bot):
+    # SIGUSR1 profiles the running bot for PROFILE_SECONDS and writes the
+    # report to the log directory.
+    if not hasattr(signal, 'SIGUSR1'):
+        return
+    
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, bot.request_profile)
+    except NotImplementedError:
+        pass
+
 async def main():
-    setup_logging()
+    bot_logger = setup_logging()
     
     token = os.getenv('DISCORD_BOT_TOKEN')
     if not token:
         logging.error("DISCORD_BOT_TOKEN environment variable is required")
+        bot_logger.stop()
         return
     
-    bot = DiscordBot()
+    bot = DiscordBot(bot_logger=bot_logger)
+    stop_event = asyncio.Event()
+    install_signal_handlers(stop_event)
+    install_profile_signal(bot)
+    
+    bot_task = asyncio.create_task(bot.start(token))
+    stop_task = asyncio.create_task(stop_event.wait())
     
     try:
-        await bot.start(token)
-    except KeyboardInterrupt:
+        await asyncio.wait({bot_task, stop_task}, return_when=asyncio.FIRST_COMPLETED)
+        
+        if stop_task.done():
+            logging.info("Shutdown requested")
+        elif bot_task.exception():
+            logging.error(f"Bot crashed: {bot_task.exception()}")
+    except (KeyboardInterrupt, asyncio.CancelledError):
         logging.info("Bot stopped by user")
-    except Exception as e:
-        logging.error(f"Bot crashed: {e}")
     finally:
-        await bot.close()
+        stop_task.cancel()
+        await bot.shutdown()
+        if not bot_task.done():
+            await asyncio.gather(bot_task, return_exceptions=True)
+        bot_logger.stop()
 
 if __name__ == "__main__":
     try:
@@ -21,7 +21,7 @@ def install_dependencies():
 
 def create_directories():
     """Create necessary directories"""
-    directories = ["config", "logs"]
+    directories = ["config", "logs", "data"]
     
     for directory in directories:
         if not os.path.exists(directory):
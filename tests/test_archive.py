@@ -0,0 +1,154 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from bot.archive import AttachmentArchiver
+
+class StubConfigManager:
+    def __init__(self, config):
+        self.config = config
+    
+    def get_guild_config(self, guild_id):
+        return self.config
+
+def make_attachment(attachment_id, url, size=0):
+    return SimpleNamespace(id=attachment_id, url=url, filename=f"file-{attachment_id}.bin", size=size)
+
+def make_message(message_id, guild_id, attachments):
+    return SimpleNamespace(id=message_id, guild=SimpleNamespace(id=guild_id), attachments=attachments)
+
+class AttachmentArchiverTest(unittest.IsolatedAsyncioTestCase):
+    # The archiver downloads from a local aiohttp server standing in for
+    # Discord's CDN.
+    async def asyncSetUp(self):
+        self.bodies = {}
+        self.gate = None
+        
+        app = web.Application()
+        app.router.add_get("/{name}", self.handle_file)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        
+        self.directory = tempfile.TemporaryDirectory()
+        self.config = {"archive_attachments": True, "archive_quota_mb": 100}
+        self.archiver = self.create_archiver()
+        self.archiver.start()
+    
+    async def asyncTearDown(self):
+        await self.archiver.stop()
+        await self.server.close()
+        self.directory.cleanup()
+    
+    def create_archiver(self, max_file_size=25 * 1024 * 1024):
+        bot = SimpleNamespace(config_manager=StubConfigManager(self.config))
+        return AttachmentArchiver(bot, root=self.directory.name, concurrency=2, max_file_size=max_file_size)
+    
+    async def handle_file(self, request):
+        name = request.match_info["name"]
+        if name not in self.bodies:
+            return web.Response(status=404)
+        if self.gate:
+            await self.gate.wait()
+        return web.Response(body=self.bodies[name])
+    
+    def url(self, name):
+        return str(self.server.make_url(f"/{name}"))
+    
+    def stored_files(self):
+        files = []
+        for directory, _, filenames in os.walk(self.directory.name):
+            if os.path.basename(directory) == "tmp":
+                continue
+            files.extend(name for name in filenames if not name.startswith("index.jsonl"))
+        return files
+    
+    def temp_files(self):
+        return os.listdir(os.path.join(self.directory.name, "tmp"))
+    
+    async def test_stores_identical_content_once(self):
+        self.bodies["a"] = self.bodies["b"] = b"x" * 1000
+        
+        first = await self.archiver.archive(make_attachment(1, self.url("a")), 10, 100)
+        second = await self.archiver.archive(make_attachment(2, self.url("b")), 11, 100)
+        
+        self.assertEqual(first, "stored")
+        self.assertEqual(second, "duplicate")
+        self.assertEqual(len(self.stored_files()), 1)
+        self.assertEqual(self.archiver.get_stats()["attachments"], 2)
+        self.assertEqual(self.archiver.get_stats()["bytes"], 2000)
+        self.assertEqual(self.temp_files(), [])
+    
+    async def test_stops_at_size_cap(self):
+        await self.archiver.stop()
+        self.archiver = self.create_archiver(max_file_size=64 * 1024)
+        self.archiver.start()
+        # The attachment claims to be small, but the download is not.
+        self.bodies["big"] = b"x" * (256 * 1024)
+        
+        result = await self.archiver.archive(make_attachment(1, self.url("big"), size=10), 10, 100)
+        
+        self.assertEqual(result, "too_large")
+        self.assertEqual(self.stored_files(), [])
+        self.assertEqual(self.temp_files(), [])
+        self.assertEqual(self.archiver.get_stats()["attachments"], 0)
+    
+    async def test_non_200_is_a_failure(self):
+        result = await self.archiver.archive(make_attachment(1, self.url("missing")), 10, 100)
+        
+        self.assertEqual(result, "failed")
+        self.assertEqual(self.stored_files(), [])
+        self.assertEqual(self.archiver.get_stats()["attachments"], 0)
+    
+    async def test_evicts_oldest_over_quota(self):
+        self.config["archive_quota_mb"] = 1
+        self.bodies["a"] = b"a" * (600 * 1024)
+        self.bodies["b"] = b"b" * (600 * 1024)
+        
+        await self.archiver.archive(make_attachment(1, self.url("a")), 10, 100)
+        await self.archiver.archive(make_attachment(2, self.url("b")), 11, 100)
+        
+        self.assertEqual(list(self.archiver.guild_entries[100]), [2])
+        self.assertEqual(self.archiver.get_stats()["bytes"], 600 * 1024)
+        self.assertEqual(len(self.stored_files()), 1)
+        self.assertEqual(self.archiver.get_files(SimpleNamespace(id=10, guild=None)), [])
+    
+    async def test_index_survives_restart(self):
+        self.bodies["a"] = b"a" * 100
+        self.bodies["b"] = b"b" * 200
+        await self.archiver.archive(make_attachment(1, self.url("a")), 10, 100)
+        await self.archiver.archive(make_attachment(2, self.url("b")), 11, 100)
+        self.archiver.release(10)
+        await self.archiver.stop()
+        
+        self.archiver = self.create_archiver()
+        self.archiver.start()
+        
+        self.assertEqual(self.archiver.get_stats()["attachments"], 1)
+        self.assertEqual(self.archiver.get_stats()["bytes"], 200)
+        self.assertEqual([entry.attachment_id for entry in self.archiver.by_message[11]], [2])
+        self.assertNotIn(10, self.archiver.by_message)
+    
+    async def test_delete_during_download_releases_entry(self):
+        self.bodies["a"] = b"a" * 1000
+        self.gate = asyncio.Event()
+        message = make_message(10, 100, [make_attachment(1, self.url("a"), size=1000)])
+        
+        self.archiver.submit(message)
+        await asyncio.sleep(0.05)
+        # The message is deleted while its attachment is still downloading.
+        self.archiver.release(message.id)
+        self.gate.set()
+        await asyncio.wait_for(self.archiver.queue.join(), 5)
+        
+        self.assertEqual(self.archiver.get_stats()["attachments"], 0)
+        self.assertEqual(self.stored_files(), [])
+        self.assertEqual(self.archiver.in_flight, {})
+        self.assertEqual(self.archiver.released, set())
+
+if __name__ == "__main__":
+    unittest.main()
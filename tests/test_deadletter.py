@@ -0,0 +1,93 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+
+import aiohttp
+import discord
+
+from bot.deadletter import DeadLetterQueue
+
+class StubChannel:
+    def __init__(self, channel_id, guild_id):
+        self.id = channel_id
+        self.guild = SimpleNamespace(id=guild_id)
+        self.sent = []
+        self.on_send = None
+        self.error = None
+    
+    async def send(self, embeds):
+        if self.on_send:
+            self.on_send()
+        if self.error:
+            raise self.error
+        self.sent.append(embeds)
+
+class DeadLetterQueueTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.channel = StubChannel(10, 100)
+        self.bot = SimpleNamespace(get_channel=lambda channel_id: self.channel)
+        self.queue = DeadLetterQueue(self.bot, path=os.path.join(self.directory.name, "dead_letters.jsonl"), max_size=2)
+        self.queue.start()
+    
+    async def asyncTearDown(self):
+        await self.queue.stop()
+        self.directory.cleanup()
+    
+    def add(self, title):
+        self.queue.add(self.channel, discord.Embed(title=title), "message_delete", aiohttp.ClientConnectionError())
+    
+    async def test_letter_dropped_during_retry(self):
+        self.add("first")
+        self.add("second")
+        letters = list(self.queue.letters.values())
+        # A new failure arrives while the retry is in flight and pushes the
+        # oldest letter out.
+        self.channel.on_send = lambda: self.add("third")
+        
+        self.assertTrue(await self.queue.retry_batch(10, letters))
+        
+        self.assertEqual([embed.title for embed in self.channel.sent[0]], ["first", "second"])
+        self.assertEqual([letter.embed.title for letter in self.queue.letters.values()], ["third"])
+    
+    async def test_letter_dropped_during_failed_retry(self):
+        self.add("first")
+        self.add("second")
+        letters = list(self.queue.letters.values())
+        self.channel.on_send = lambda: self.add("third")
+        self.channel.error = aiohttp.ClientConnectionError()
+        
+        self.assertFalse(await self.queue.retry_batch(10, letters))
+        
+        self.assertEqual([letter.embed.title for letter in self.queue.letters.values()], ["second", "third"])
+        self.assertEqual(letters[0].attempts, 1)
+        self.assertEqual(letters[1].attempts, 2)
+    
+    async def test_load_skips_malformed_records(self):
+        path = os.path.join(self.directory.name, "old.jsonl")
+        now = time.time()
+        records = [
+            ["add", 1, 100, 10, "message_delete", {"title": "kept"}, now, None, 1],
+            ["add", 2, 100, 10, "message_delete", {"title": "truncated"}],
+            ["add", 3, 100, 10, "message_delete", "not an embed", now, None, 1],
+            ["add", 4, 100, 10, "message_delete", {"color": "red"}, now, None, 1],
+            ["remove"],
+            {"add": 5},
+            7
+        ]
+        with open(path, 'w', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+            f.write('["add", 6, 100\n')
+        
+        queue = DeadLetterQueue(self.bot, path=path)
+        queue.start()
+        await queue.stop()
+        
+        self.assertEqual([letter.embed.title for letter in queue.letters.values()], ["kept"])
+
+if __name__ == "__main__":
+    unittest.main()
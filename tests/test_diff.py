@@ -0,0 +1,35 @@
+import random
+import unittest
+
+from bot.diff import diff_words, render_diff
+
+def count_markers(text, marker):
+    # Escaped marker characters in the text do not open or close anything.
+    return text.replace("\\" + marker[0], "").count(marker)
+
+class RenderDiffTest(unittest.TestCase):
+    def test_whitespace_changes_are_shown(self):
+        self.assertEqual(render_diff(diff_words("a\nb", "a\n\nb")), "a~~[1 newline]~~**[2 newlines]**b")
+        self.assertIn("[2 spaces]", render_diff(diff_words("one two", "one  two")))
+    
+    def test_limit_keeps_markers_closed(self):
+        rng = random.Random(1)
+        words = ["alpha", "beta*", "gamma_", "delta~~", "epsilon"]
+        for _ in range(500):
+            before = " ".join(rng.choice(words) for _ in range(rng.randrange(1, 600)))
+            after = " ".join(rng.choice(words) for _ in range(rng.randrange(1, 600)))
+            rendered = render_diff(diff_words(before, after), limit=1024)
+            
+            self.assertLessEqual(len(rendered), 1024)
+            self.assertEqual(count_markers(rendered, "~~") % 2, 0, rendered)
+            self.assertEqual(count_markers(rendered, "**") % 2, 0, rendered)
+    
+    def test_limit_cuts_inside_a_long_change(self):
+        rendered = render_diff(diff_words("start end", "start " + "word " * 500 + "end"), limit=200)
+        
+        self.assertLessEqual(len(rendered), 200)
+        self.assertTrue(rendered.startswith("start **word"))
+        self.assertTrue(rendered.endswith("** …"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import time
+import unittest
+
+from bot.metrics import MAX_PENDING_SAMPLES, PipelineStats
+
+class PipelineStatsTest(unittest.TestCase):
+    def test_fold_builds_windows(self):
+        stats = PipelineStats()
+        for index in range(10):
+            stats.record_event(1)
+            stats.record_handler(1, 0.002)
+        stats.record_event(None)
+        stats.record_drop(2)
+        stats.record_send(2, 0.1)
+        
+        # Nothing reaches the windows until they are folded.
+        self.assertEqual(stats.total.events.total(), 0)
+        stats.fold()
+        
+        self.assertEqual(stats.total.events.total(), 11)
+        self.assertEqual(stats.guilds[1].events.total(), 10)
+        self.assertEqual(stats.guilds[2].dropped.total(), 1)
+        self.assertEqual(stats.guilds[1].handler_latency.count(), 10)
+        self.assertAlmostEqual(stats.guilds[1].handler_latency.percentiles((0.5,))[0], 0.002, delta=0.0001)
+        self.assertAlmostEqual(stats.total.send_latency.percentiles((0.5,))[0], 0.1, delta=0.005)
+    
+    def test_samples_fold_when_pending_is_full(self):
+        stats = PipelineStats()
+        for index in range(MAX_PENDING_SAMPLES + 1):
+            stats.record_handler(1, 0.001)
+        
+        self.assertEqual(stats.total.handler_latency.count(), MAX_PENDING_SAMPLES)
+        self.assertEqual(len(stats.handler_times), 1)
+    
+    def test_old_slots_expire_and_idle_guilds_are_forgotten(self):
+        stats = PipelineStats()
+        now = time.monotonic()
+        stats.record_event(1)
+        stats.fold(now)
+        self.assertEqual(stats.total.events.total(now), 1)
+        
+        later = now + 2 * stats.window
+        stats.fold(later)
+        
+        self.assertEqual(stats.total.events.total(later), 0)
+        self.assertNotIn(1, stats.guilds)
+    
+    def test_counts_land_in_the_slot_they_were_recorded_in(self):
+        stats = PipelineStats()
+        now = time.monotonic()
+        stats.record_event(1)
+        # Folded a slot late: the event still leaves the window a full
+        # window after its own slot, not after the fold.
+        stats.fold(stats.slot_end + stats.slot_seconds)
+        
+        self.assertEqual(stats.total.events.total(now + stats.window - stats.slot_seconds), 1)
+        self.assertEqual(stats.total.events.total(now + stats.window + stats.slot_seconds), 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+import aiohttp
+import discord
+
+from bot.deadletter import DeadLetterQueue
+from bot.webhooks import MAX_PENDING_EMBEDS, ChannelDelivery, WebhookPool
+
+class StubEventHandler:
+    def __init__(self):
+        self.failures = []
+        self.sent = []
+    
+    def record_send_failure(self, channel, error, event_name, description):
+        self.failures.append((channel.id, event_name))
+    
+    def record_sent(self, channel, event_name, event_time):
+        self.sent.append((channel.id, event_name))
+
+class WebhookPoolTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.event_handler = StubEventHandler()
+        self.bot = SimpleNamespace(event_handler=self.event_handler)
+        self.bot.dead_letters = DeadLetterQueue(self.bot, path=os.path.join(self.directory.name, "dead_letters.jsonl"))
+        self.bot.dead_letters.start()
+        self.pool = WebhookPool(self.bot)
+        self.channel = SimpleNamespace(id=10, guild=SimpleNamespace(id=100))
+    
+    async def asyncTearDown(self):
+        await self.bot.dead_letters.stop()
+        self.directory.cleanup()
+    
+    async def test_failed_batch_goes_to_dead_letters(self):
+        async def send_embeds(delivery, embeds):
+            raise aiohttp.ClientConnectionError("connection reset")
+        
+        self.pool.send_embeds = send_embeds
+        batch = [(discord.Embed(title=f"entry {index}"), "message_delete", "message delete", None) for index in range(3)]
+        
+        await self.pool.send_batch(ChannelDelivery(self.channel), batch)
+        
+        self.assertEqual(self.event_handler.failures, [(10, "message_delete")] * 3)
+        self.assertEqual(self.event_handler.sent, [])
+        letters = list(self.bot.dead_letters.letters.values())
+        self.assertEqual([letter.embed.title for letter in letters], ["entry 0", "entry 1", "entry 2"])
+        self.assertTrue(all(letter.channel_id == 10 for letter in letters))
+    
+    async def test_flush_hands_back_unsent_embeds(self):
+        sent = asyncio.Event()
+        
+        async def send_embeds(delivery, embeds):
+            sent.set()
+            await asyncio.sleep(10)
+        
+        self.pool.send_embeds = send_embeds
+        self.pool.get_webhook_count = lambda guild_id: 1
+        for index in range(3):
+            await self.pool.deliver(self.channel, discord.Embed(title=f"entry {index}"), "member_join", "member join")
+        await sent.wait()
+        
+        unsent = await self.pool.flush(0.05)
+        
+        # The batch cut off mid-send comes back first, then what was queued.
+        self.assertEqual([embed.title for _, embed, _, _ in unsent], ["entry 0", "entry 1", "entry 2"])
+        self.assertTrue(all(channel is self.channel and event_name == "member_join" for channel, _, event_name, _ in unsent))
+        self.assertEqual(self.pool.tasks, set())
+    
+    async def test_full_channel_drops_instead_of_waiting(self):
+        async def send_embeds(delivery, embeds):
+            await asyncio.sleep(10)
+        
+        self.pool.send_embeds = send_embeds
+        self.pool.get_webhook_count = lambda guild_id: 1
+        await self.pool.deliver(self.channel, discord.Embed(title="first"), "message", "message")
+        await asyncio.sleep(0)
+        
+        for index in range(MAX_PENDING_EMBEDS + 5):
+            await asyncio.wait_for(
+                self.pool.deliver(self.channel, discord.Embed(title=str(index)), "message", "message"), 1
+            )
+        
+        self.assertEqual(len(self.pool.channels[10].pending), MAX_PENDING_EMBEDS)
+        self.assertEqual(self.pool.dropped, 5)
+        await self.pool.flush(0)
+
+if __name__ == "__main__":
+    unittest.main()